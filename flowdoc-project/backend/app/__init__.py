@@ -3,7 +3,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from redis import Redis
-import boto3
+from .services.aws_clients import registry as aws_clients
 
 # Initialize extensions
 db = SQLAlchemy()
@@ -31,17 +31,21 @@ def create_app(config=None):
         password=app.config['REDIS_PASSWORD']
     )
     
-    # Initialize AWS clients
-    app.s3 = boto3.client('s3')
-    app.textract = boto3.client('textract')
+    # Configure AWS clients; each is built on first use, not at startup
+    aws_clients.configure(
+        max_pool_connections=app.config.get('AWS_MAX_POOL_CONNECTIONS'),
+        region_name=app.config.get('AWS_REGION')
+    )
     
     # Register blueprints
     from .api.auth import auth_bp
     from .api.documents import documents_bp
     from .api.admin import admin_bp
+    from .api.health import health_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(documents_bp, url_prefix='/api/documents')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    app.register_blueprint(health_bp, url_prefix='/api/health')
     
     return app
\ No newline at end of file
@@ -1,5 +1,7 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required
+import json
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.utils import secure_filename
 from ..services.document_service import DocumentService
 
 documents_bp = Blueprint('documents', __name__)
@@ -20,14 +22,56 @@ def upload_document():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@documents_bp.route('/upload/presign', methods=['POST'])
+@jwt_required()
+def presign_upload():
+    data = request.get_json() or {}
+    filename = secure_filename(data.get('filename', ''))
+    if not filename:
+        return jsonify({'error': 'No filename provided'}), 400
+
+    try:
+        result = document_service.create_presigned_upload(
+            get_jwt_identity(),
+            filename,
+            current_app.config['MAX_CONTENT_LENGTH'],
+            data.get('content_type'),
+            int(data['size']) if data.get('size') is not None else None
+        )
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@documents_bp.route('/upload/complete', methods=['POST'])
+@jwt_required()
+def complete_upload():
+    data = request.get_json() or {}
+    if not data.get('s3_key'):
+        return jsonify({'error': 'No s3_key provided'}), 400
+
+    try:
+        result = document_service.complete_upload(
+            get_jwt_identity(),
+            data['s3_key'],
+            json.dumps(data.get('metadata', {})),
+            current_app.config['MAX_CONTENT_LENGTH'],
+            data.get('upload_id'),
+            data.get('parts')
+        )
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @documents_bp.route('/', methods=['GET'])
-@jwt_required
+@jwt_required()
 def get_documents():
-    page = request.args.get('page', 1, type=int)
-    limit = request.args.get('limit', 10, type=int)
+    cursor = request.args.get('cursor')
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 100)
     
     try:
-        documents = document_service.get_documents(page, limit)
+        documents = document_service.get_documents(get_jwt_identity(), limit, cursor)
         return jsonify(documents), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
@@ -0,0 +1,12 @@
+from flask import Blueprint, jsonify
+from ..services.aws_clients import registry
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('', methods=['GET'])
+def health():
+    # Per process: each gunicorn worker has its own clients and pools
+    return jsonify({
+        'ok': True,
+        'aws_pools': registry.stats()
+    }), 200
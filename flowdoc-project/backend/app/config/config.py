@@ -15,6 +15,7 @@ class Config:
 
     # AWS
     AWS_REGION = 'us-west-2'
+    AWS_MAX_POOL_CONNECTIONS = 50
     S3_BUCKET = 'flowdoc-documents'
     
     # JWT
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .. import db
@@ -18,4 +18,9 @@ class Document(db.Model):
     # Relationships
     owner = relationship("User", back_populates="documents")
     shares = relationship("DocumentShare", back_populates="document")
-    ocr_results = relationship("OCRResult", back_populates="document")
\ No newline at end of file
+    ocr_results = relationship("OCRResult", back_populates="document")
+
+    # Keyset pagination: newest first per owner
+    __table_args__ = (
+        Index('ix_documents_owner_created', 'owner_id', 'created_at', 'id'),
+    )
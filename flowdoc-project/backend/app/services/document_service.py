@@ -1,13 +1,27 @@
-import boto3
 from botocore.exceptions import ClientError
-from typing import BinaryIO, Dict, Any
+from typing import BinaryIO, Dict, Any, List, Optional
 import json
+import math
+import uuid
+from sqlalchemy import tuple_
+from ..utils.pagination import decode_cursor, encode_cursor
+from .aws_clients import get_client
+from ..models.document import Document
 
 class DocumentService:
     def __init__(self):
-        self.s3 = boto3.client('s3')
-        self.textract = boto3.client('textract')
         self.bucket_name = 'flowdoc-documents'
+        self.part_size = 8 * 1024 * 1024
+        self.presigned_expires_in = 900
+
+    # Built on first use, so creating the service at import time is cheap
+    @property
+    def s3(self):
+        return get_client('s3')
+
+    @property
+    def textract(self):
+        return get_client('textract')
 
     def process_document(self, file: BinaryIO, metadata: str) -> Dict[str, Any]:
         try:
@@ -27,6 +41,148 @@ class DocumentService:
         except Exception as e:
             raise Exception(f"Document processing failed: {str(e)}")
 
+    def create_presigned_upload(self, owner_id: int, filename: str, max_size: int,
+                                content_type: Optional[str] = None,
+                                size: Optional[int] = None) -> Dict[str, Any]:
+        try:
+            s3_key = self._new_upload_key(owner_id, filename)
+            content_type = content_type or 'application/octet-stream'
+
+            # Large files go up in parallel parts; everything else is a single POST
+            if size is not None and size > self.part_size:
+                upload_id = self.s3.create_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    ContentType=content_type
+                )['UploadId']
+                return {
+                    's3_key': s3_key,
+                    'method': 'MULTIPART',
+                    'upload_id': upload_id,
+                    'part_size': self.part_size,
+                    'parts': [
+                        {
+                            'part_number': part_number,
+                            'url': self.s3.generate_presigned_url(
+                                'upload_part',
+                                Params={
+                                    'Bucket': self.bucket_name,
+                                    'Key': s3_key,
+                                    'UploadId': upload_id,
+                                    'PartNumber': part_number
+                                },
+                                ExpiresIn=self.presigned_expires_in
+                            )
+                        }
+                        for part_number in range(1, math.ceil(size / self.part_size) + 1)
+                    ]
+                }
+
+            post = self.s3.generate_presigned_post(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                Fields={'Content-Type': content_type},
+                Conditions=[
+                    {'Content-Type': content_type},
+                    ['content-length-range', 1, max_size]
+                ],
+                ExpiresIn=self.presigned_expires_in
+            )
+            return {
+                's3_key': s3_key,
+                'method': 'POST',
+                'url': post['url'],
+                'fields': post['fields']
+            }
+        except ClientError as e:
+            raise Exception(f"Presigned upload failed: {str(e)}")
+
+    def complete_upload(self, owner_id: int, s3_key: str, metadata: str, max_size: int,
+                        upload_id: Optional[str] = None,
+                        parts: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        try:
+            # Only keys handed out to this user by create_presigned_upload
+            if not s3_key.startswith(self._upload_key(owner_id, '')):
+                raise ValueError("Upload not found")
+
+            if upload_id:
+                self.s3.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    UploadId=upload_id,
+                    MultipartUpload={
+                        'Parts': sorted(
+                            ({'ETag': part['etag'], 'PartNumber': int(part['part_number'])}
+                             for part in parts or []),
+                            key=lambda part: part['PartNumber']
+                        )
+                    }
+                )
+
+            head = self.s3.head_object(Bucket=self.bucket_name, Key=s3_key)
+            if head['ContentLength'] > max_size:
+                # Multipart part URLs can't enforce a size limit, so check it here
+                self.s3.delete_object(Bucket=self.bucket_name, Key=s3_key)
+                raise ValueError("File is too large")
+
+            filename = s3_key.rsplit('/', 1)[-1]
+            if self._is_ocr_supported(filename):
+                self._start_ocr_job(s3_key)
+
+            return {
+                's3_key': s3_key,
+                'filename': filename,
+                'size': head['ContentLength'],
+                'metadata': json.loads(metadata)
+            }
+        except Exception as e:
+            raise Exception(f"Document processing failed: {str(e)}")
+
+    def get_documents(self, owner_id: int, limit: int,
+                      cursor: Optional[str] = None) -> Dict[str, Any]:
+        query = Document.query.filter(Document.owner_id == owner_id)
+
+        if cursor:
+            created_at, last_id = decode_cursor(cursor)
+            # Row comparison seeks straight into the (owner_id, created_at, id) index
+            query = query.filter(
+                tuple_(Document.created_at, Document.id) < tuple_(created_at, last_id)
+            )
+
+        # One extra row tells us whether there is a next page
+        documents = query.order_by(
+            Document.created_at.desc(),
+            Document.id.desc()
+        ).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = encode_cursor(documents[-1].created_at, documents[-1].id)
+
+        return {
+            'documents': [
+                {
+                    'id': document.id,
+                    'filename': document.filename,
+                    's3_key': document.s3_key,
+                    'mime_type': document.mime_type,
+                    'size': document.size,
+                    'created_at': document.created_at.isoformat()
+                }
+                for document in documents
+            ],
+            'next_cursor': next_cursor
+        }
+
+    def _upload_key(self, owner_id: int, filename: str) -> str:
+        # Per user, so one user can neither overwrite nor claim another's upload
+        return f"users/{owner_id}/documents/{filename}"
+
+    def _new_upload_key(self, owner_id: int, filename: str) -> str:
+        # Unique, so uploading the same filename twice doesn't overwrite the first
+        return self._upload_key(owner_id, f"{uuid.uuid4().hex}/{filename}")
+
     def _is_ocr_supported(self, filename: str) -> bool:
         supported_extensions = ['.pdf', '.png', '.jpg', '.jpeg', '.tiff']
         return any(filename.lower().endswith(ext) for ext in supported_extensions)
@@ -20,9 +20,15 @@ class DocumentService {
         }
     }
 
-    static async getDocumentList(page = 1, limit = 10) {
+    // Pass the previous response's next_cursor to fetch the following page
+    static async getDocumentList(cursor = null, limit = 10) {
+        const params = { limit };
+        if (cursor) {
+            params.cursor = cursor;
+        }
+
         try {
-            const response = await axios.get(`/api/documents?page=${page}&limit=${limit}`);
+            const response = await axios.get('/api/documents', { params });
             return response.data;
         } catch (error) {
             console.error('Failed to fetch documents:', error);
@@ -30,6 +36,17 @@ class DocumentService {
         }
     }
 
+    // Counts by status, served from maintained counters rather than scans
+    static async getDocumentStats() {
+        try {
+            const response = await axios.get('/api/documents/stats');
+            return response.data;
+        } catch (error) {
+            console.error('Failed to fetch document stats:', error);
+            throw error;
+        }
+    }
+
     static async getDocumentDetails(documentId) {
         try {
             const response = await axios.get(`/api/documents/${documentId}`);
@@ -40,6 +57,22 @@ class DocumentService {
         }
     }
 
+    // Returns an object URL for an <img>; revoke it when the image is removed.
+    // The browser cache revalidates with the API's ETag, so repeats cost a 304.
+    static async getDocumentThumbnail(documentId, pageNumber = null) {
+        const path = pageNumber
+            ? `/api/documents/${documentId}/previews/${pageNumber}`
+            : `/api/documents/${documentId}/thumbnail`;
+
+        try {
+            const response = await axios.get(path, { responseType: 'blob' });
+            return URL.createObjectURL(response.data);
+        } catch (error) {
+            console.error('Failed to fetch document preview:', error);
+            throw error;
+        }
+    }
+
     static async shareDocument(documentId, shareConfig) {
         try {
             const response = await axios.post(`/api/documents/${documentId}/share`, shareConfig);
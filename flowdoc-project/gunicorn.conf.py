@@ -0,0 +1,45 @@
+"""
+Flowdoc gunicorn settings, loaded automatically from the working directory
+"""
+import os
+import shutil
+
+# Import the app once in the master and fork workers from it: workers start
+# faster and share the imported modules' memory. Off by default, since code
+# changes then need a full restart rather than a HUP.
+preload_app = os.getenv('FLOWDOC_GUNICORN_PRELOAD', 'false').lower() == 'true'
+
+def on_starting(server):
+    # Metric files left by a previous master would be merged into this one's
+    metrics_dir = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir)
+
+def when_ready(server):
+    # Metrics get their own port, which only Prometheus can reach
+    metrics_port = int(os.getenv('FLOWDOC_METRICS_PORT', 0))
+    if metrics_port:
+        from src.core.metrics import serve_metrics
+        serve_metrics(metrics_port)
+
+def child_exit(server, worker):
+    # Imported here, not at the top: importing src.core.metrics creates files
+    # in PROMETHEUS_MULTIPROC_DIR, which on_starting hasn't created yet when
+    # this config is loaded
+    from src.core.metrics import child_exit as mark_process_dead
+    mark_process_dead(server, worker)
+
+def post_fork(server, worker):
+    # With preload_app the master may have opened database connections;
+    # a worker must never reuse a socket its siblings share. boto3 clients
+    # and Redis pools already reset themselves when the pid changes.
+    if preload_app:
+        from src import db
+        with worker.app.wsgi().app_context():
+            db.engine.dispose(close=False)
+
+def post_worker_init(worker):
+    # Open connections before the readiness probe lets traffic in
+    from src.services.health import health_checker
+    health_checker.start_warm_up(worker.wsgi)
@@ -0,0 +1,37 @@
+"""add assignment and submission foreign key indexes
+
+Revision ID: 3c8e1f5a7b2d
+Revises: 9257092c8a8b
+Create Date: 2026-10-18 20:31:07.552914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c8e1f5a7b2d'
+down_revision = '9257092c8a8b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Eager loads look these rows up by foreign key, a page of parents at a time
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_document_assignments_document_id'), 'document_assignments',
+                        ['document_id'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_document_assignments_user_id'), 'document_assignments',
+                        ['user_id'], unique=False, postgresql_concurrently=True)
+        op.create_index(op.f('ix_document_submissions_document_id'), 'document_submissions',
+                        ['document_id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_document_submissions_document_id'), table_name='document_submissions',
+                      postgresql_concurrently=True)
+        op.drop_index(op.f('ix_document_assignments_user_id'), table_name='document_assignments',
+                      postgresql_concurrently=True)
+        op.drop_index(op.f('ix_document_assignments_document_id'), table_name='document_assignments',
+                      postgresql_concurrently=True)
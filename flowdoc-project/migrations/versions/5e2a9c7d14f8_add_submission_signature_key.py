@@ -0,0 +1,32 @@
+"""add submission signature key
+
+Revision ID: 5e2a9c7d14f8
+Revises: b71d04e9c3a6
+Create Date: 2026-10-18 21:14:42.208317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2a9c7d14f8'
+down_revision = 'b71d04e9c3a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('document_submissions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('signature_key', sa.String(length=500), nullable=True))
+        batch_op.add_column(sa.Column('signature_hash', sa.String(length=64), nullable=True))
+
+    # Existing signatures stay inline until `flask backfill-signatures` moves
+    # them to the signature bucket in batches; S3 uploads don't belong in a
+    # schema migration's transaction
+
+
+def downgrade():
+    with op.batch_alter_table('document_submissions', schema=None) as batch_op:
+        batch_op.drop_column('signature_hash')
+        batch_op.drop_column('signature_key')
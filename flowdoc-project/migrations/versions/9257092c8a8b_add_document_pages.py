@@ -0,0 +1,39 @@
+"""add document pages
+
+Revision ID: 9257092c8a8b
+Revises: e6d98415441e
+Create Date: 2026-10-18 20:02:41.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9257092c8a8b'
+down_revision = 'e6d98415441e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('document_pages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('document_id', sa.Integer(), nullable=False),
+    sa.Column('page_number', sa.Integer(), nullable=False),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed("to_tsvector('english', text)", persisted=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('document_id', 'page_number', name='uq_document_pages_document_page')
+    )
+    op.create_index('ix_document_pages_search_vector', 'document_pages', ['search_vector'],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_document_pages_search_vector', table_name='document_pages',
+                  postgresql_using='gin')
+    op.drop_table('document_pages')
@@ -0,0 +1,31 @@
+"""add pending assignment due date index
+
+Revision ID: a84c3f0e6d52
+Revises: 5e2a9c7d14f8
+Create Date: 2026-10-18 21:02:41.873016
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a84c3f0e6d52'
+down_revision = '5e2a9c7d14f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Partial, so completed assignments (most of the table) aren't indexed
+    with op.get_context().autocommit_block():
+        op.create_index('ix_document_assignments_pending_due', 'document_assignments',
+                        ['due_date', 'id'], unique=False,
+                        postgresql_where=sa.text("status = 'pending' AND due_date IS NOT NULL"),
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_document_assignments_pending_due', table_name='document_assignments',
+                      postgresql_concurrently=True)
@@ -0,0 +1,33 @@
+"""add status counters
+
+Revision ID: b71d04e9c3a6
+Revises: 3c8e1f5a7b2d
+Create Date: 2026-10-18 20:52:19.730461
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71d04e9c3a6'
+down_revision = '3c8e1f5a7b2d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('status_counters',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('scope', sa.String(length=30), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('shard', sa.SmallInteger(), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('user_id', 'scope', 'status', 'shard')
+    )
+    # Counters start empty; run `flask reconcile-counters` once after upgrading
+
+
+def downgrade():
+    op.drop_table('status_counters')
@@ -0,0 +1,42 @@
+"""add document search status
+
+Revision ID: c5f81e2d9a47
+Revises: a84c3f0e6d52
+Create Date: 2026-10-18 22:31:09.514376
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5f81e2d9a47'
+down_revision = 'a84c3f0e6d52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('search_status', sa.String(length=20), nullable=True))
+
+    # Documents that already have pages are done; the rest, including blank
+    # ones, get one more pass from the search indexer
+    op.execute(
+        "UPDATE documents SET search_status = 'indexed' "
+        "WHERE EXISTS (SELECT 1 FROM document_pages WHERE document_pages.document_id = documents.id)"
+    )
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_documents_search_pending', 'documents', ['id'], unique=False,
+                        postgresql_where=sa.text("ocr_status = 'completed' AND search_status IS NULL"),
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_documents_search_pending', table_name='documents',
+                      postgresql_concurrently=True)
+
+    with op.batch_alter_table('documents', schema=None) as batch_op:
+        batch_op.drop_column('search_status')
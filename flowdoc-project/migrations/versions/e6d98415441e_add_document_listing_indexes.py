@@ -0,0 +1,35 @@
+"""add document listing indexes
+
+Revision ID: e6d98415441e
+Revises: d261d39c22ed
+Create Date: 2026-10-18 19:49:23.314989
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6d98415441e'
+down_revision = 'd261d39c22ed'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Built concurrently so a large documents table stays writable
+    with op.get_context().autocommit_block():
+        op.create_index('ix_documents_user_created', 'documents',
+                        ['user_id', 'created_at', 'id'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index('ix_documents_user_status_created', 'documents',
+                        ['user_id', 'status', 'created_at', 'id'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_documents_user_status_created', table_name='documents',
+                      postgresql_concurrently=True)
+        op.drop_index('ix_documents_user_created', table_name='documents',
+                      postgresql_concurrently=True)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Flowdoc Form Extraction Benchmark
+Times FormExtractor on synthetic documents (1,000 pages by default)
+while the document and its pages grow, fits the scaling exponent of time
+against line count (1.0 is linear), and checks that every planted field
+is found. Small sizes are also run through a pairwise pure-Python pairing
+for comparison.
+
+    python scripts/benchmarks/bench_forms.py --pages 1000 --lines 25,50,100,200,400
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, PROJECT_ROOT)
+os.environ.setdefault('FLOWDOC_DATABASE_URL', 'sqlite://')
+
+
+def synthetic_page(page: int, lines: int) -> tuple:
+    """(blocks, planted field count) for one page of about ``lines`` lines
+
+    Rows cycle through a label with its value beside it, two such pairs
+    side by side, a label with its value below, an inline "Label: value"
+    line and a paragraph line.
+    """
+    from src.services.textract import TextractBlock
+
+    layouts = [
+        [(0.08, 'label'), (0.35, 'value')],
+        [(0.08, 'label'), (0.25, 'value'), (0.55, 'label'), (0.72, 'value')],
+        [(0.08, 'label'), (0.08, 'below')],
+        [(0.08, 'inline')],
+        [(0.08, 'text')]
+    ]
+    rows = []
+    count = 0
+    while count < lines:
+        row = layouts[len(rows) % len(layouts)]
+        rows.append(row)
+        count += len(row)
+
+    spacing = 0.9 / len(rows)
+    height = min(0.012, spacing * 0.35)
+    blocks, fields = [], 0
+    for index, row in enumerate(rows):
+        top = 0.05 + index * spacing
+        for left, kind in row:
+            # A value under its label sits one line further down in the same row slot
+            line_top = top + height * 1.3 if kind == 'below' else top
+            text = {
+                'label': f"Field {index}{'ab'[left > 0.5]}:",
+                'value': f'value {page}-{index}',
+                'below': f'value {page}-{index} below',
+                'inline': f'Reference {index}: R{page:05d}{index:04d}',
+                'text': 'Lorem ipsum dolor sit amet, consectetur adipiscing elit'
+            }[kind]
+            fields += kind in ('label', 'inline')
+            blocks.append(TextractBlock(f'{page}-{len(blocks)}', 'LINE', text, 98.5,
+                                        page, left, line_top, 0.15, height))
+    return blocks, fields
+
+
+def document(pages: int, lines: int) -> tuple:
+    generated = [synthetic_page(page, lines) for page in range(1, pages + 1)]
+    return [blocks for blocks, _ in generated], sum(fields for _, fields in generated)
+
+
+def extract(pages: list) -> dict:
+    from src.services.forms import FormExtractor
+
+    extractor = FormExtractor()
+    for page_number, blocks in enumerate(pages, 1):
+        extractor.add_page(page_number, blocks)
+    return extractor.result()
+
+
+def pairwise(pages: list) -> int:
+    """Every label against every line of its page, in Python"""
+    found = 0
+    for blocks in pages:
+        for label in blocks:
+            if not label.text.endswith(':'):
+                continue
+            best = None
+            for value in blocks:
+                if value is label or value.text.endswith(':'):
+                    continue
+                gap = value.left - (label.left + label.width)
+                if abs((value.top + value.height / 2) - (label.top + label.height / 2)) <= label.height / 2 \
+                        and 0 <= gap <= 0.5 and (best is None or gap < best):
+                    best = gap
+            found += best is not None
+    return found
+
+
+def timed(run, *args) -> tuple:
+    started = time.perf_counter()
+    result = run(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=1000)
+    parser.add_argument('--lines', default='25,50,100,200,400', help='Lines per page to sweep')
+    parser.add_argument('--pairwise-max-lines', type=int, default=200,
+                        help='Largest lines-per-page also run through the pairwise pairing')
+    args = parser.parse_args()
+
+    sweeps = [(args.pages // 8, 50), (args.pages // 4, 50), (args.pages // 2, 50)]
+    sweeps += [(args.pages, int(lines)) for lines in args.lines.split(',')]
+
+    print(f"{'pages':>7}{'lines/page':>12}{'lines':>10}{'fields':>9}{'found':>9}"
+          f"{'seconds':>10}{'us/line':>10}{'pairwise s':>12}")
+    extract(document(2, 50)[0])  # warm up imports and NumPy
+    sizes, seconds = [], []
+    for pages, lines in sweeps:
+        blocks, planted = document(pages, lines)
+        total = sum(len(page) for page in blocks)
+        elapsed, schema = timed(extract, blocks)
+        row = (f"{pages:>7}{lines:>12}{total:>10}{planted:>9}{len(schema['fields']):>9}"
+               f"{elapsed:>10.3f}{elapsed / total * 1e6:>10.2f}")
+        if lines <= args.pairwise_max_lines:
+            row += f"{timed(pairwise, blocks)[0]:>12.3f}"
+        print(row)
+        sizes.append(total)
+        seconds.append(elapsed)
+
+    exponent = np.polyfit(np.log(sizes), np.log(seconds), 1)[0]
+    print(f"\ntime ~ lines^{exponent:.2f} "
+          f"({'near-linear' if exponent < 1.15 else 'superlinear'}; pairwise pairing is ~lines^2 per page)")
+
+
+if __name__ == '__main__':
+    main()
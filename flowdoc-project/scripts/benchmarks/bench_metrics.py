@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Flowdoc Metrics Overhead Benchmark
+Measures what src/core/metrics.py adds to a request, an SQL statement and
+a Redis command, by timing the same work with and without instrumentation.
+Runs against in-memory SQLite; pass --redis-url to include Redis.
+
+    python scripts/benchmarks/bench_metrics.py --requests 20000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from flask import Flask, jsonify
+from sqlalchemy import create_engine, text
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, PROJECT_ROOT)
+
+QUERIES_PER_REQUEST = 3
+
+
+def build_app(engine, instrumented: bool) -> Flask:
+    """A route shaped like a typical API call: a few queries, a JSON body"""
+    from src.core.metrics import init_metrics
+
+    app = Flask(f"bench-{'on' if instrumented else 'off'}")
+    app.config['METRICS_ENABLED'] = instrumented
+
+    @app.route('/documents/<int:document_id>')
+    def get_document(document_id):
+        with engine.connect() as conn:
+            for _ in range(QUERIES_PER_REQUEST):
+                conn.execute(text("SELECT :id"), {'id': document_id}).scalar()
+        return jsonify({'id': document_id})
+
+    init_metrics(app)
+    return app
+
+
+def per_call_us(run, count: int, repeat: int) -> float:
+    """Median microseconds per call over `repeat` runs of `count` calls"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(count)
+        samples.append((time.perf_counter() - start) / count * 1_000_000)
+    return statistics.median(samples)
+
+
+def bench_requests(engine, instrumented: bool, count: int, repeat: int) -> float:
+    client = build_app(engine, instrumented).test_client()
+
+    def run(n):
+        for i in range(n):
+            client.get(f'/documents/{i}')
+
+    run(100)
+    return per_call_us(run, count, repeat)
+
+
+def bench_queries(engine, count: int, repeat: int) -> float:
+    def run(n):
+        with engine.connect() as conn:
+            for i in range(n):
+                conn.execute(text("SELECT :id"), {'id': i}).scalar()
+
+    return per_call_us(run, count, repeat)
+
+
+def bench_redis(redis_client, count: int, repeat: int) -> float:
+    def run(n):
+        for i in range(n):
+            redis_client.get('flowdoc:bench')
+
+    return per_call_us(run, count, repeat)
+
+
+def report(name: str, baseline: float, instrumented: float) -> None:
+    overhead = instrumented - baseline
+    print(f"{name:<10}{baseline:>12.1f}{instrumented:>12.1f}{overhead:>12.1f}{overhead / baseline:>10.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20_000)
+    parser.add_argument('--queries', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--redis-url', help='e.g. redis://localhost:6379/15')
+    args = parser.parse_args()
+
+    from src.core.metrics import InstrumentedRedis, instrument_sqlalchemy
+
+    engine = create_engine('sqlite://')
+
+    # SQL listeners are process-wide once added, so measure without them first
+    query_baseline = bench_queries(engine, args.queries, args.repeat)
+    request_baseline = bench_requests(engine, False, args.requests, args.repeat)
+    instrument_sqlalchemy()
+    query_instrumented = bench_queries(engine, args.queries, args.repeat)
+    request_instrumented = bench_requests(engine, True, args.requests, args.repeat)
+
+    print(f"{'':<10}{'off us':>12}{'on us':>12}{'added us':>12}{'added':>10}")
+    report('request', request_baseline, request_instrumented)
+    report('query', query_baseline, query_instrumented)
+
+    if args.redis_url:
+        import redis
+        report(
+            'redis',
+            bench_redis(redis.Redis.from_url(args.redis_url), args.queries, args.repeat),
+            bench_redis(InstrumentedRedis.from_url(args.redis_url), args.queries, args.repeat)
+        )
+
+
+if __name__ == '__main__':
+    main()
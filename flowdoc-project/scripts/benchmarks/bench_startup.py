@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Flowdoc Startup Benchmark
+Times a cold worker start in fresh interpreters: importing the app,
+create_app(), the first request, and the first AWS client (deferred
+until used). Also lists the slowest top-level imports from
+``python -X importtime``. With --record the medians are appended as one
+JSON line per run, so startup can be tracked across commits.
+
+    python scripts/benchmarks/bench_startup.py --runs 10 --record startup.jsonl
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+PHASES = ('import', 'create_app', 'first_request', 'first_aws_client')
+
+# Runs in a fresh interpreter; prints one JSON object of phase timings
+COLD_START = """
+import json, time
+started = time.perf_counter()
+timings = {}
+
+from src import create_app
+timings['import'] = time.perf_counter() - started
+
+mark = time.perf_counter()
+app = create_app()
+timings['create_app'] = time.perf_counter() - mark
+
+mark = time.perf_counter()
+app.test_client().get('/health/live')
+timings['first_request'] = time.perf_counter() - mark
+
+mark = time.perf_counter()
+from src.services.clients import get_client
+get_client('s3')
+timings['first_aws_client'] = time.perf_counter() - mark
+
+print(json.dumps(timings))
+"""
+
+
+def environment() -> dict:
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT)
+    # Nothing here connects; these only have to parse
+    env.setdefault('FLOWDOC_DATABASE_URL', 'sqlite://')
+    env.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+    return env
+
+
+def cold_start() -> dict:
+    result = subprocess.run(
+        [sys.executable, '-c', COLD_START],
+        cwd=PROJECT_ROOT, env=environment(), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(count: int) -> list:
+    """(module, cumulative ms) of the slowest top-level imports"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', COLD_START],
+        cwd=PROJECT_ROOT, env=environment(), capture_output=True, text=True, check=True
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        if not name.startswith('  '):
+            imports.append((name.strip(), int(cumulative) / 1000))
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:count]
+
+
+def git_revision() -> str:
+    result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                            cwd=PROJECT_ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--imports', type=int, default=15, help='Slowest imports to list')
+    parser.add_argument('--record', help='Append the medians as a JSON line to this file')
+    args = parser.parse_args()
+
+    samples = [cold_start() for _ in range(args.runs)]
+    medians = {phase: statistics.median(sample[phase] for sample in samples) for phase in PHASES}
+    ready = medians['import'] + medians['create_app'] + medians['first_request']
+
+    print(f"{'phase':<20}{'median ms':>12}")
+    for phase in PHASES:
+        print(f"{phase:<20}{medians[phase] * 1000:>12.1f}")
+    print(f"{'to first request':<20}{ready * 1000:>12.1f}")
+
+    print(f"\n{'slowest imports':<40}{'ms':>10}")
+    for name, cumulative_ms in slowest_imports(args.imports):
+        print(f"{name:<40}{cumulative_ms:>10.1f}")
+
+    if args.record:
+        with open(args.record, 'a') as record:
+            record.write(json.dumps({
+                'revision': git_revision(),
+                'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'runs': args.runs,
+                'python': sys.version.split()[0],
+                'ms': {phase: round(value * 1000, 1) for phase, value in medians.items()}
+            }) + '\n')
+
+
+if __name__ == '__main__':
+    main()
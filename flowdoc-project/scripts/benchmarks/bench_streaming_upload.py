@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Flowdoc Streaming Upload Benchmark
+Compares peak RSS and throughput of buffered vs. streamed S3 uploads
+against a local S3 stand-in (moto server, or MinIO via --endpoint-url).
+
+    python scripts/benchmarks/bench_streaming_upload.py --size-mb 16 --concurrency 1 10 100
+"""
+
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+BUCKET = 'flowdoc-benchmark'
+MB = 1024 * 1024
+
+
+class SyntheticStream:
+    """File-like request body that produces bytes without holding them in memory"""
+
+    _block = bytes(range(256)) * 4096  # 1MB
+
+    def __init__(self, size: int):
+        self.remaining = size
+
+    def read(self, size: int = -1) -> bytes:
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        # Mimic a socket: never hand back more than 64KB at a time
+        size = min(size, 64 * 1024)
+        self.remaining -= size
+        return self._block[:size]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB (Linux reports KB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_worker(mode: str, concurrency: int, size: int) -> dict:
+    """Upload `concurrency` files in parallel and report resource usage"""
+    sys.path.insert(0, PROJECT_ROOT)
+    from src.services.aws import AWSService
+
+    service = AWSService()
+    baseline_rss = peak_rss_mb()
+
+    def upload(index: int) -> None:
+        filename = f"bench-{mode}-{concurrency}-{index}.pdf"
+        if mode == 'buffered':
+            # What Werkzeug does for multipart form uploads: the whole body is read first
+            body = io.BytesIO()
+            stream = SyntheticStream(size)
+            while True:
+                chunk = stream.read(MB)
+                if not chunk:
+                    break
+                body.write(chunk)
+            body.seek(0)
+            service.upload_file(body, 0, filename)
+        else:
+            service.upload_stream(SyntheticStream(size), 0, filename)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(upload, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'mode': mode,
+        'concurrency': concurrency,
+        'size_mb': size / MB,
+        'elapsed_s': round(elapsed, 3),
+        'mb_per_s': round(concurrency * size / MB / elapsed, 2),
+        'baseline_rss_mb': round(baseline_rss, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def start_moto_server(port: int) -> str:
+    """Start an in-process moto S3 server and return its endpoint"""
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(port=port)
+    server.start()
+    return f"http://127.0.0.1:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=16)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--mode', choices=['stream', 'buffered', 'both'], default='both')
+    parser.add_argument('--endpoint-url', help='Existing S3-compatible endpoint, e.g. MinIO')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    size = args.size_mb * MB
+
+    if args.worker:
+        print(json.dumps(run_worker(args.mode, args.concurrency[0], size)))
+        return
+
+    endpoint = args.endpoint_url or start_moto_server(args.port)
+    env = dict(
+        os.environ,
+        AWS_ENDPOINT_URL=endpoint,
+        AWS_ACCESS_KEY_ID=os.getenv('AWS_ACCESS_KEY_ID', 'testing'),
+        AWS_SECRET_ACCESS_KEY=os.getenv('AWS_SECRET_ACCESS_KEY', 'testing'),
+        AWS_DEFAULT_REGION=os.getenv('AWS_DEFAULT_REGION', 'us-west-2'),
+        S3_BUCKET=BUCKET,
+    )
+
+    import boto3
+    s3 = boto3.client('s3', endpoint_url=endpoint, region_name=env['AWS_DEFAULT_REGION'],
+                      aws_access_key_id=env['AWS_ACCESS_KEY_ID'],
+                      aws_secret_access_key=env['AWS_SECRET_ACCESS_KEY'])
+    try:
+        s3.create_bucket(Bucket=BUCKET, CreateBucketConfiguration={
+            'LocationConstraint': env['AWS_DEFAULT_REGION']
+        })
+    except s3.exceptions.BucketAlreadyOwnedByYou:
+        pass
+
+    modes = ['buffered', 'stream'] if args.mode == 'both' else [args.mode]
+    print(f"{'mode':<10}{'conc':>6}{'MB/s':>10}{'peak RSS MB':>14}{'baseline MB':>14}")
+    for mode in modes:
+        for concurrency in args.concurrency:
+            # One process per run so ru_maxrss reflects only that run
+            output = subprocess.run(
+                [sys.executable, __file__, '--worker', '--mode', mode,
+                 '--concurrency', str(concurrency), '--size-mb', str(args.size_mb)],
+                env=env, check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:<10}{concurrency:>6}{result['mb_per_s']:>10}"
+                  f"{result['peak_rss_mb']:>14}{result['baseline_rss_mb']:>14}")
+
+
+if __name__ == '__main__':
+    main()
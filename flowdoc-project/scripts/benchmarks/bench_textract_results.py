@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Flowdoc Textract Results Benchmark
+Compares peak memory, time-to-first-block and total time of
+get_textract_results against the streaming iter_textract_results, using a
+fake Textract client with per-call latency and realistic block payloads.
+
+    python scripts/benchmarks/bench_textract_results.py --pages 300 --latency-ms 80
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, PROJECT_ROOT)
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+
+
+def make_block(block_type: str, page: int, text: str) -> dict:
+    """A block shaped like the ones get_document_text_detection returns"""
+    return {
+        'BlockType': block_type,
+        'Confidence': 99.1,
+        'Text': text,
+        'TextType': 'PRINTED',
+        'Geometry': {
+            'BoundingBox': {'Width': 0.12, 'Height': 0.01, 'Left': 0.1, 'Top': 0.2},
+            'Polygon': [{'X': 0.1, 'Y': 0.2}, {'X': 0.22, 'Y': 0.2},
+                        {'X': 0.22, 'Y': 0.21}, {'X': 0.1, 'Y': 0.21}],
+        },
+        'Id': str(uuid.uuid4()),
+        'Relationships': [{'Type': 'CHILD', 'Ids': [str(uuid.uuid4()) for _ in range(6)]}],
+        'Page': page,
+    }
+
+
+class FakeTextractClient:
+    """Serves a synthetic multi-page job, one response page per call"""
+
+    def __init__(self, pages: int, lines_per_page: int, latency: float):
+        self.pages = pages
+        self.lines_per_page = lines_per_page
+        self.latency = latency
+
+    def get_document_text_detection(self, JobId, NextToken=None, MaxResults=1000):
+        time.sleep(self.latency)
+        page = int(NextToken or 1)
+        blocks = [make_block('PAGE', page, None)]
+        for line in range(self.lines_per_page):
+            blocks.append(make_block('LINE', page, f"Line {line} of page {page}: lorem ipsum"))
+            for word in range(6):
+                blocks.append(make_block('WORD', page, f"word{word}"))
+        response = {'JobStatus': 'SUCCEEDED', 'Blocks': blocks,
+                    'DocumentMetadata': {'Pages': self.pages}}
+        if page < self.pages:
+            response['NextToken'] = str(page + 1)
+        return response
+
+
+def measure(name: str, run) -> None:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    first_block_at, count = run(start)
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<28}{count:>10}{first_block_at * 1000:>12.1f}{total:>10.2f}"
+          f"{peak / 1024 / 1024:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=300)
+    parser.add_argument('--lines-per-page', type=int, default=40)
+    parser.add_argument('--latency-ms', type=float, default=80)
+    args = parser.parse_args()
+
+    from src.services.aws import AWSService
+
+    # textract_client is a read-only property; override it on a subclass
+    service = type('BenchAWSService', (AWSService,), {
+        'textract_client': FakeTextractClient(args.pages, args.lines_per_page, args.latency_ms / 1000)
+    })()
+
+    def legacy(start):
+        result = service.get_textract_results('bench')
+        # Nothing is usable until every page has been fetched
+        return time.perf_counter() - start, len(result['blocks'])
+
+    def streamed_retained(start):
+        first, blocks = None, []
+        for page in service.iter_textract_results('bench'):
+            first = first or time.perf_counter() - start
+            blocks.extend(page)
+        return first, len(blocks)
+
+    def streamed(start):
+        first, count = None, 0
+        for page in service.iter_textract_results('bench'):
+            first = first or time.perf_counter() - start
+            count += len(page)
+        return first, count
+
+    print(f"{'variant':<28}{'blocks':>10}{'first ms':>12}{'total s':>10}{'peak MB':>12}")
+    measure('get_textract_results', legacy)
+    measure('iter (all blocks kept)', streamed_retained)
+    measure('iter (page at a time)', streamed)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,51 +1,65 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
-import redis
-import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 db = SQLAlchemy()
-migrate = Migrate()
 jwt = JWTManager()
 cors = CORS()
 
 def create_app():
     """Application factory function"""
     app = Flask(__name__)
+    # Lets the batch upload take a larger body than MAX_CONTENT_LENGTH
+    from src.utils.uploads import FlowdocRequest
+    app.request_class = FlowdocRequest
     
     # Configuration
     app.config.from_object('src.core.config.Config')
     
     # Initialize extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+    from src.services.counters import register_counter_events
+    register_counter_events(db.session)
+    from src.services.identity import register_identity_events
+    register_identity_events(db.session)
     jwt.init_app(app)
+    from src.utils.auth import init_auth
+    init_auth(jwt)
     cors.init_app(app)
     
-    # Initialize Redis
-    app.redis = redis.Redis(
-        host=os.getenv('REDIS_HOST', 'localhost'),
-        port=int(os.getenv('REDIS_PORT', 6379)),
-        db=int(os.getenv('REDIS_DB', 0)),
-        decode_responses=True
-    )
+    # Redis is built on first use, Flask-Migrate only for `flask db`
+    from src.core.extensions import init_migrate, init_redis
+    init_migrate(app, db)
+    init_redis(app)
     
     # Register blueprints
     from src.api.routes.auth import auth_bp
     from src.api.routes.documents import documents_bp
     from src.api.routes.workflows import workflows_bp
+    from src.api.routes.admin import admin_bp
+    from src.api.routes.health import health_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/v1/auth')
     app.register_blueprint(documents_bp, url_prefix='/api/v1/documents')
     app.register_blueprint(workflows_bp, url_prefix='/api/v1/workflows')
+    app.register_blueprint(admin_bp, url_prefix='/api/v1/admin')
+    # Unversioned: probed by Kubernetes and Docker, not API clients
+    app.register_blueprint(health_bp, url_prefix='/health')
     
     # Register error handlers
     from src.api.errors import register_error_handlers
     register_error_handlers(app)
     
+    # Request, SQL, AWS and Redis timing, served on /metrics
+    from src.core.metrics import init_metrics
+    init_metrics(app)
+    
+    # Register CLI commands
+    from src.commands import register_commands
+    register_commands(app)
+    
     return app
\ No newline at end of file
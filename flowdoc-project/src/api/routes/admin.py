@@ -0,0 +1,19 @@
+"""
+Flowdoc Admin Routes
+"""
+from flask import Blueprint, jsonify
+from src.services import counters
+from src.utils.auth import admin_required
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/stats', methods=['GET'])
+@admin_required
+def get_stats():
+    """Document and assignment totals by status across all users"""
+    counts = counters.user_counts(counters.ALL_USERS)
+    return jsonify({
+        'documents': counts.get('documents', {}),
+        'assignments': counts.get('assignments', {}),
+        'overdue_assignments': counts.get(counters.OVERDUE_SCOPE, {}).get(counters.OVERDUE_STATUS, 0)
+    })
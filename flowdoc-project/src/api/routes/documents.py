@@ -1,16 +1,23 @@
 """
 Flowdoc API Routes
 """
-from flask import Blueprint, request, jsonify
+import json
+from datetime import datetime, timezone
+from flask import Blueprint, Response, current_app, redirect, request, jsonify, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.utils import secure_filename
+from src.services import counters, events
 from src.services.document import DocumentService
 from src.api.schemas.document import DocumentSchema
+from src.utils.archive import zip_entries
+from src.utils.uploads import max_content_length, stream_size
 
 documents_bp = Blueprint('documents', __name__)
 document_schema = DocumentSchema()
+document_service = DocumentService()
 
 @documents_bp.route('/documents', methods=['POST'])
-@jwt_required
+@jwt_required()
 def upload_document():
     """Upload a new document"""
     if 'file' not in request.files:
@@ -20,27 +27,437 @@ def upload_document():
     user_id = get_jwt_identity()
     
     try:
-        result = DocumentService.process_uploaded_document(file, user_id)
+        result = document_service.process_uploaded_document(file, user_id)
         return jsonify(document_schema.dump(result)), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+@documents_bp.route('/documents/batch', methods=['POST'])
+@max_content_length('BATCH_MAX_CONTENT_LENGTH')
+@jwt_required()
+def upload_batch():
+    """Upload many documents, as separate files and/or ZIP archives"""
+    files = request.files.getlist('files')
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    
+    priority = request.args.get('priority', 'bulk')
+    if priority not in ('interactive', 'bulk'):
+        return jsonify({'error': 'Invalid priority'}), 400
+    
+    allowed_extensions = current_app.config['ALLOWED_EXTENSIONS']
+    max_files = current_app.config['BATCH_MAX_FILES']
+    # The batch as a whole may be larger, but each document keeps the usual limit
+    max_size = current_app.config['MAX_CONTENT_LENGTH']
+    entries, rejected = [], []
+    try:
+        for file in files:
+            filename = secure_filename(file.filename or '')
+            extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+            if extension == 'zip':
+                archive_entries, archive_rejected = zip_entries(
+                    file.stream,
+                    allowed_extensions,
+                    max_files,
+                    max_size
+                )
+                entries.extend(archive_entries)
+                rejected.extend(archive_rejected)
+            elif extension in allowed_extensions and stream_size(file.stream) > max_size:
+                rejected.append((filename, 'File is too large'))
+            elif extension in allowed_extensions:
+                entries.append((filename, file.content_type, lambda file=file: file.stream))
+            else:
+                rejected.append((filename, 'File type not allowed'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if len(entries) > max_files:
+        return jsonify({'error': f"A batch holds at most {max_files} files"}), 400
+    
+    try:
+        result = document_service.process_batch(entries, get_jwt_identity(), priority)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    
+    result['results'].extend(
+        {'filename': filename, 'status': 'failed', 'error': reason}
+        for filename, reason in rejected
+    )
+    result['total'] += len(rejected)
+    result['failed'] += len(rejected)
+    # 207: some items may have failed; each result carries its own status
+    return jsonify(result), 207 if result['failed'] else 201
+
+@documents_bp.route('/documents', methods=['GET'])
+@jwt_required()
+def list_documents():
+    """List documents, newest first, using an opaque next-page cursor"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    status = request.args.get('status')
+    statuses = status.split(',') if status else None
+    
+    try:
+        result = document_service.list_documents(
+            get_jwt_identity(),
+            limit,
+            request.args.get('cursor'),
+            statuses
+        )
+        return jsonify({
+            'documents': document_schema.dump(result['documents'], many=True),
+            'next_cursor': result['next_cursor']
+        })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@documents_bp.route('/documents/dashboard', methods=['GET'])
+@jwt_required()
+def get_dashboard():
+    """List documents with their assignees and submission counts"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    
+    try:
+        result = document_service.get_dashboard(
+            get_jwt_identity(),
+            limit,
+            request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'documents': [
+            dict(
+                document_schema.dump(item['document']),
+                submission_count=item['submission_count'],
+                thumbnail_url=url_for('documents.get_preview', document_id=item['document'].id),
+                assignees=[
+                    {
+                        'user_id': assignment.user_id,
+                        'name': assignment.user.name,
+                        'email': assignment.user.email,
+                        'status': assignment.status,
+                        'due_date': assignment.due_date.isoformat() if assignment.due_date else None
+                    }
+                    for assignment in item['document'].assignments
+                ]
+            )
+            for item in result['documents']
+        ],
+        'next_cursor': result['next_cursor']
+    })
+
+@documents_bp.route('/documents/stats', methods=['GET'])
+@jwt_required()
+def get_stats():
+    """The current user's document and assignment counts by status"""
+    counts = counters.user_counts(get_jwt_identity())
+    return jsonify({
+        'documents': counts.get('documents', {}),
+        'assignments': counts.get('assignments', {}),
+        'overdue_assignments': counts.get(counters.OVERDUE_SCOPE, {}).get(counters.OVERDUE_STATUS, 0)
+    })
+
+@documents_bp.route('/documents/search', methods=['GET'])
+@jwt_required()
+def search_documents():
+    """Search document contents, best matches first"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+    
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    offset = min(max(request.args.get('offset', 0, type=int), 0), 10000)
+    
+    result = document_service.search_documents(get_jwt_identity(), query, limit, offset)
+    return jsonify({
+        'results': [
+            {
+                'document': document_schema.dump(item['document']),
+                'page': item['page'],
+                'rank': item['rank'],
+                'snippet': item['snippet']
+            }
+            for item in result['results']
+        ],
+        'next_offset': result['next_offset']
+    })
+
+@documents_bp.route('/documents/stream', methods=['PUT'])
+@jwt_required()
+def stream_document():
+    """Upload a new document by streaming the raw request body to S3"""
+    filename = secure_filename(request.headers.get('X-Filename') or request.args.get('filename', ''))
+    if not filename:
+        return jsonify({'error': 'No filename provided'}), 400
+    
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension not in current_app.config['ALLOWED_EXTENSIONS']:
+        return jsonify({'error': 'File type not allowed'}), 400
+    
+    # A generic body type means the client didn't say; derive it from the filename
+    content_type = request.mimetype
+    if content_type in ('', 'application/octet-stream'):
+        content_type = None
+    
+    try:
+        result = document_service.process_streamed_document(
+            request.stream,
+            get_jwt_identity(),
+            filename,
+            content_type
+        )
+        return jsonify(document_schema.dump(result)), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@documents_bp.route('/documents/uploads', methods=['POST'])
+@jwt_required()
+def create_upload():
+    """Get presigned S3 upload instructions for a new document"""
+    data = request.get_json() or {}
+    filename = secure_filename(data.get('filename', ''))
+    if not filename:
+        return jsonify({'error': 'No filename provided'}), 400
+    
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension not in current_app.config['ALLOWED_EXTENSIONS']:
+        return jsonify({'error': 'File type not allowed'}), 400
+    
+    try:
+        result = document_service.create_upload(
+            get_jwt_identity(),
+            filename,
+            current_app.config['MAX_CONTENT_LENGTH'],
+            data.get('content_type'),
+            int(data['size']) if data.get('size') is not None else None
+        )
+        return jsonify(result), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@documents_bp.route('/documents/uploads/complete', methods=['POST'])
+@jwt_required()
+def complete_upload():
+    """Register a document the client has uploaded directly to S3"""
+    data = request.get_json() or {}
+    if not data.get('s3_key'):
+        return jsonify({'error': 'No s3_key provided'}), 400
+    
+    try:
+        result = document_service.complete_upload(
+            get_jwt_identity(),
+            data['s3_key'],
+            current_app.config['MAX_CONTENT_LENGTH'],
+            data.get('upload_id'),
+            data.get('parts')
+        )
+        return jsonify(document_schema.dump(result)), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@documents_bp.route('/documents/events', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def document_events():
+    """Stream document status changes as server-sent events
+    
+    EventSource can't set headers, so the token may also be passed as ?jwt=.
+    Serve this route from gevent workers (see the flowdoc-events deployment).
+    """
+    return Response(
+        events.stream(get_jwt_identity()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 @documents_bp.route('/documents/<int:document_id>', methods=['GET'])
-@jwt_required
+@jwt_required()
 def get_document(document_id):
     """Get document details"""
     try:
-        document = DocumentService.get_document(document_id, get_jwt_identity())
-        return jsonify(document_schema.dump(document))
+        document = document_service.get_document_detail(
+            document_id,
+            get_jwt_identity(),
+            document_schema.dump
+        )
+        if document is None:
+            return jsonify({'error': 'Document not found'}), 404
+        return jsonify(document)
     except Exception as e:
         return jsonify({'error': str(e)}), 404
 
 @documents_bp.route('/documents/<int:document_id>/process', methods=['POST'])
-@jwt_required
+@jwt_required()
 def process_document(document_id):
     """Start document processing"""
+    priority = request.args.get('priority', 'interactive')
+    if priority not in ('interactive', 'bulk'):
+        return jsonify({'error': 'Invalid priority'}), 400
+    
+    try:
+        result = document_service.start_processing(document_id, get_jwt_identity(), priority)
+        return jsonify(result), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@documents_bp.route('/documents/<int:document_id>/assignments', methods=['POST'])
+@jwt_required()
+def assign_document(document_id):
+    """Assign a document to many users at once, with an optional ISO 8601 due_date"""
+    data = request.get_json() or {}
+    user_ids = data.get('user_ids')
+    if not isinstance(user_ids, list) or not all(isinstance(user_id, int) for user_id in user_ids):
+        return jsonify({'error': 'user_ids must be a list of user ids'}), 400
+    
+    due_date = None
+    if data.get('due_date'):
+        try:
+            due_date = datetime.fromisoformat(data['due_date'])
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid due_date'}), 400
+        if due_date.tzinfo is not None:
+            # Stored as naive UTC, like every other timestamp
+            due_date = due_date.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    try:
+        result = document_service.assign_users(document_id, get_jwt_identity(), user_ids, due_date)
+        return jsonify(result), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@documents_bp.route('/documents/<int:document_id>/submissions', methods=['POST'])
+@jwt_required()
+def submit_document(document_id):
+    """Submit form data and an optional base64 signature image"""
+    data = request.get_json() or {}
+    
+    try:
+        submission = document_service.submit_document(
+            document_id,
+            get_jwt_identity(),
+            data.get('form_data'),
+            data.get('signature')
+        )
+        return jsonify({
+            'id': submission.id,
+            'document_id': submission.document_id,
+            'status': submission.status,
+            'signature_hash': submission.signature_hash,
+            'submitted_at': submission.submitted_at.isoformat()
+        }), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+@documents_bp.route('/documents/<int:document_id>/submissions/<int:submission_id>/signature', methods=['GET'])
+@jwt_required()
+def get_signature(document_id, submission_id):
+    """Get a submission's signature image
+    
+    Redirects to a presigned S3 URL; with ?stream=1 the image is proxied
+    through the API in chunks instead.
+    """
+    submission = document_service.get_submission(document_id, submission_id, get_jwt_identity())
+    if submission is None:
+        return jsonify({'error': 'Submission not found'}), 404
+    
+    signature_store = document_service.signature_store
+    if submission.signature_key and not request.args.get('stream', type=int):
+        return redirect(signature_store.url(submission))
+    
+    signature = signature_store.open(submission)
+    if signature is None:
+        return jsonify({'error': 'Signature not found'}), 404
+    return Response(
+        signature['chunks'],
+        mimetype=signature['content_type'],
+        headers={
+            'Content-Length': str(signature['size']),
+            'Cache-Control': 'private, max-age=3600'
+        }
+    )
+
+@documents_bp.route('/documents/<int:document_id>/thumbnail', methods=['GET'])
+@documents_bp.route('/documents/<int:document_id>/previews/<int:page_number>', methods=['GET'])
+@jwt_required()
+def get_preview(document_id, page_number=None):
+    """Get a document's first-page thumbnail or a page preview as JPEG
+    
+    Previews are rendered after upload; until then this returns 404. The
+    response carries an ETag, and a request whose If-None-Match matches it
+    gets an empty 304.
+    """
+    document = document_service.get_document(document_id, get_jwt_identity())
+    if document is None:
+        return jsonify({'error': 'Document not found'}), 404
+    
+    preview_store = document_service.preview_store
+    preview = preview_store.get(document.s3_key, page_number, request.if_none_match)
+    if preview is None:
+        if page_number is None or page_number == 1:
+            # Not rendered yet, or never queued; ask the renderer for it
+            preview_store.request(document.s3_key)
+        return jsonify({'error': 'Preview not available'}), 404
+    
+    if preview['body'] is None:
+        response = Response(status=304)
+    else:
+        response = Response(preview['body'], mimetype='image/jpeg')
+    response.set_etag(preview['etag'])
+    # Previews of a blob never change; the ETag covers revalidation after max-age
+    response.headers['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+def _ocr_pending():
+    """202 for OCR results that are queued to be stored; the client retries"""
+    response = jsonify({'status': 'pending', 'message': 'OCR results are being prepared'})
+    response.status_code = 202
+    response.headers['Retry-After'] = '5'
+    return response
+
+@documents_bp.route('/documents/<int:document_id>/ocr', methods=['GET'])
+@jwt_required()
+def get_ocr_summary(document_id):
+    """List the pages of a document's OCR results"""
     try:
-        result = DocumentService.start_processing(document_id, get_jwt_identity())
-        return jsonify(result)
+        artifact = document_service.get_ocr_artifact(document_id, get_jwt_identity())
+        if artifact is None:
+            return _ocr_pending()
+        return jsonify(artifact.summary())
     except Exception as e:
-        return jsonify({'error': str(e)}), 400
\ No newline at end of file
+        return jsonify({'error': str(e)}), 404
+
+@documents_bp.route('/documents/<int:document_id>/ocr/pages/<int:page_number>', methods=['GET'])
+@jwt_required()
+def get_ocr_page(document_id, page_number):
+    """Get the OCR blocks of a single page"""
+    try:
+        artifact = document_service.get_ocr_artifact(document_id, get_jwt_identity())
+        if artifact is None:
+            return _ocr_pending()
+        return jsonify(artifact.read_page(page_number).to_dict())
+    except KeyError:
+        return jsonify({'error': 'Page not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 404
+
+@documents_bp.route('/documents/<int:document_id>/ocr/export', methods=['GET'])
+@jwt_required()
+def export_ocr(document_id):
+    """Export all OCR blocks as JSON lines, one page per line"""
+    try:
+        artifact = document_service.get_ocr_artifact(document_id, get_jwt_identity())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 404
+    if artifact is None:
+        return _ocr_pending()
+    
+    # Pages are read from S3 as the response is written
+    return Response(
+        (json.dumps(page.to_dict(), separators=(',', ':')) + '\n' for page in artifact.iter_pages()),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename="document-{document_id}-ocr.jsonl"'}
+    )
@@ -0,0 +1,30 @@
+"""
+Flowdoc Health Routes
+"""
+from flask import Blueprint, current_app, jsonify
+from src.services.health import health_checker
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('', methods=['GET'])
+def health():
+    """Dependency report, for people and the Docker HEALTHCHECK"""
+    app = current_app._get_current_object()
+    report = health_checker.readiness(app)
+    report['version'] = app.config['VERSION']
+    return jsonify(report), 200 if report['ok'] else 503
+
+@health_bp.route('/live', methods=['GET'])
+def live():
+    """Liveness: the worker is serving requests
+    
+    Deliberately checks no dependencies, so an outage elsewhere never
+    gets healthy pods restarted.
+    """
+    return jsonify({'ok': True})
+
+@health_bp.route('/ready', methods=['GET'])
+def ready():
+    """Readiness: warmed up, and Postgres, Redis and S3 are reachable"""
+    report = health_checker.readiness(current_app._get_current_object())
+    return jsonify(report), 200 if report['ok'] else 503
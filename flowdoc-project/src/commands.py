@@ -0,0 +1,81 @@
+"""
+Flowdoc CLI Commands
+"""
+import click
+
+def register_commands(app):
+    """Register background worker commands with the Flask CLI"""
+    
+    @app.cli.command('ocr-scheduler')
+    @click.option('--poll-interval', default=1.0, help='Seconds to wait when nothing was submitted')
+    def ocr_scheduler(poll_interval):
+        """Submit queued OCR jobs to Textract within rate limits"""
+        from src.services.scheduler import OCRScheduler
+        OCRScheduler().run(poll_interval)
+    
+    @app.cli.command('ocr-completions')
+    @click.option('--workers', default=0, help='Processes parsing OCR results; 0 uses one per core')
+    @click.option('--poll-interval', default=1.0, help='Seconds to wait when nothing was received')
+    def ocr_completions(workers, poll_interval):
+        """Apply finished Textract jobs to their documents"""
+        from src.services.ocr_completions import OCRCompletionConsumer
+        OCRCompletionConsumer(workers=workers or None).run(poll_interval)
+    
+    @app.cli.command('render-previews')
+    @click.option('--workers', default=0, help='Rendering processes; 0 uses one per core')
+    @click.option('--poll-interval', default=1.0, help='Seconds to wait when nothing is queued')
+    def render_previews(workers, poll_interval):
+        """Render page thumbnails and previews of uploaded documents"""
+        from src.services.previews import PreviewRenderer
+        PreviewRenderer(workers=workers or None).run(poll_interval)
+    
+    @app.cli.command('outbox-dispatcher')
+    @click.option('--poll-interval', default=0.5, help='Seconds to wait when the outbox is empty')
+    def outbox_dispatcher(poll_interval):
+        """Deliver queued workflow events to n8n"""
+        from src.services.outbox import OutboxDispatcher
+        OutboxDispatcher().run(poll_interval)
+    
+    @app.cli.command('search-indexer')
+    @click.option('--poll-interval', default=5.0, help='Seconds to wait when nothing was indexed')
+    def search_indexer(poll_interval):
+        """Index the OCR text of completed documents for search"""
+        from src.services.search import SearchIndexer
+        SearchIndexer().run(poll_interval)
+    
+    @app.cli.command('extract-forms')
+    @click.option('--batch-size', default=100, help='Documents updated per transaction')
+    def extract_forms(batch_size):
+        """Fill form_schema for completed documents from their OCR artifacts"""
+        from src.services.forms import backfill
+        click.echo(backfill(batch_size=batch_size))
+    
+    @app.cli.command('overdue-scanner')
+    @click.option('--poll-interval', default=60.0, help='Seconds between scans')
+    @click.option('--once', is_flag=True, help='Run a single scan and exit')
+    def overdue_scanner(poll_interval, once):
+        """Emit workflow events for assignments that just became overdue"""
+        from src.services.overdue import OverdueScanner
+        scanner = OverdueScanner()
+        if once:
+            click.echo(scanner.scan())
+        else:
+            scanner.run(poll_interval)
+    
+    @app.cli.command('backfill-signatures')
+    @click.option('--batch-size', default=500, help='Submissions moved per transaction')
+    def backfill_signatures(batch_size):
+        """Move inline submission signatures to the signature bucket"""
+        from src.services.signatures import SignatureStore
+        click.echo(SignatureStore().backfill(batch_size))
+    
+    @app.cli.command('reconcile-counters')
+    @click.option('--interval', default=0.0, help='Repeat every this many seconds; 0 runs once')
+    def reconcile_counters(interval):
+        """Correct dashboard status counters from the documents and assignments tables"""
+        from src.services.counters import CounterReconciler
+        reconciler = CounterReconciler()
+        if interval:
+            reconciler.run(interval)
+        else:
+            click.echo(reconciler.reconcile())
@@ -19,32 +19,90 @@ class Config:
     # JWT
     JWT_SECRET_KEY = os.getenv('FLOWDOC_JWT_SECRET_KEY', 'your-jwt-secret-key')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=int(os.getenv('FLOWDOC_JWT_TOKEN_HOURS', 24)))
+    IDENTITY_CACHE_TTL = int(os.getenv('FLOWDOC_IDENTITY_CACHE_TTL', 300))
+    IDENTITY_LOCAL_TTL = float(os.getenv('FLOWDOC_IDENTITY_LOCAL_TTL', 30))
+    IDENTITY_LOCAL_SIZE = int(os.getenv('FLOWDOC_IDENTITY_LOCAL_SIZE', 10000))
     
     # AWS
     AWS_REGION = os.getenv('FLOWDOC_AWS_REGION', 'us-west-2')
+    AWS_MAX_POOL_CONNECTIONS = int(os.getenv('FLOWDOC_AWS_MAX_POOL_CONNECTIONS', 50))
     S3_BUCKET = os.getenv('FLOWDOC_S3_BUCKET', 'flowdoc-documents')
     SIGNATURE_BUCKET = os.getenv('FLOWDOC_SIGNATURE_BUCKET', 'flowdoc-signatures')
+    S3_PART_SIZE_MB = int(os.getenv('FLOWDOC_S3_PART_SIZE_MB', 8))
+    S3_UPLOAD_CONCURRENCY = int(os.getenv('FLOWDOC_S3_UPLOAD_CONCURRENCY', 4))
+    S3_UPLOAD_MEMORY_MB = int(os.getenv('FLOWDOC_S3_UPLOAD_MEMORY_MB', 32))
+    PRESIGNED_UPLOAD_EXPIRES = int(os.getenv('FLOWDOC_PRESIGNED_UPLOAD_EXPIRES', 900))
+    S3_BATCH_CONCURRENCY = int(os.getenv('FLOWDOC_S3_BATCH_CONCURRENCY', 16))
     
     # Redis
     REDIS_HOST = os.getenv('FLOWDOC_REDIS_HOST', 'localhost')
     REDIS_PORT = int(os.getenv('FLOWDOC_REDIS_PORT', 6379))
     REDIS_DB = int(os.getenv('FLOWDOC_REDIS_DB', 0))
+    CACHE_TTL = int(os.getenv('FLOWDOC_CACHE_TTL', 300))
+    EVENTS_QUEUE_SIZE = int(os.getenv('FLOWDOC_EVENTS_QUEUE_SIZE', 100))
     
     # OCR
     ENABLE_OCR = os.getenv('FLOWDOC_ENABLE_OCR', 'true').lower() == 'true'
     OCR_LAMBDA_NAME = os.getenv('FLOWDOC_OCR_LAMBDA_NAME', 'flowdoc-ocr-processor')
+    OCR_MAX_IN_FLIGHT = int(os.getenv('FLOWDOC_OCR_MAX_IN_FLIGHT', 50))
+    OCR_SUBMIT_RATE = int(os.getenv('FLOWDOC_OCR_SUBMIT_RATE', 5))
+    OCR_MAX_ATTEMPTS = int(os.getenv('FLOWDOC_OCR_MAX_ATTEMPTS', 8))
+    OCR_BACKOFF_BASE = float(os.getenv('FLOWDOC_OCR_BACKOFF_BASE', 1.0))
+    OCR_BACKOFF_CAP = float(os.getenv('FLOWDOC_OCR_BACKOFF_CAP', 60.0))
+    OCR_JOB_TIMEOUT = int(os.getenv('FLOWDOC_OCR_JOB_TIMEOUT', 3600))
+    OCR_SCHEDULER_ID = os.getenv('FLOWDOC_OCR_SCHEDULER_ID')
+    OCR_SCHEDULER_HEARTBEAT_TTL = int(os.getenv('FLOWDOC_OCR_SCHEDULER_HEARTBEAT_TTL', 30))
+    SEARCH_BATCH_SIZE = int(os.getenv('FLOWDOC_SEARCH_BATCH_SIZE', 500))
+    OCR_ARTIFACT_REQUEST_TTL = int(os.getenv('FLOWDOC_OCR_ARTIFACT_REQUEST_TTL', 300))
+    OCR_COMPLETION_QUEUE_URL = os.getenv('FLOWDOC_OCR_COMPLETION_QUEUE_URL')
+    OCR_COMPLETION_WAIT_SECONDS = int(os.getenv('FLOWDOC_OCR_COMPLETION_WAIT_SECONDS', 20))
+    OCR_COMPLETION_WORKERS = int(os.getenv('FLOWDOC_OCR_COMPLETION_WORKERS', 0))
+    OCR_COMPLETION_BATCH_SIZE = int(os.getenv('FLOWDOC_OCR_COMPLETION_BATCH_SIZE', 50))
+    OCR_COMPLETION_MAX_ATTEMPTS = int(os.getenv('FLOWDOC_OCR_COMPLETION_MAX_ATTEMPTS', 5))
+    
+    # Previews
+    PREVIEW_WORKERS = int(os.getenv('FLOWDOC_PREVIEW_WORKERS', 0))
+    PREVIEW_BATCH_SIZE = int(os.getenv('FLOWDOC_PREVIEW_BATCH_SIZE', 20))
+    PREVIEW_WIDTH = int(os.getenv('FLOWDOC_PREVIEW_WIDTH', 1024))
+    PREVIEW_THUMBNAIL_WIDTH = int(os.getenv('FLOWDOC_PREVIEW_THUMBNAIL_WIDTH', 240))
+    PREVIEW_MAX_PAGES = int(os.getenv('FLOWDOC_PREVIEW_MAX_PAGES', 50))
+    PREVIEW_QUALITY = int(os.getenv('FLOWDOC_PREVIEW_QUALITY', 80))
+    PREVIEW_CACHE_TTL = int(os.getenv('FLOWDOC_PREVIEW_CACHE_TTL', 3600))
+    PREVIEW_CACHE_MAX_KB = int(os.getenv('FLOWDOC_PREVIEW_CACHE_MAX_KB', 256))
+    PREVIEW_REQUEST_TTL = int(os.getenv('FLOWDOC_PREVIEW_REQUEST_TTL', 300))
     
     # N8N
     ENABLE_N8N = os.getenv('FLOWDOC_ENABLE_N8N', 'true').lower() == 'true'
     N8N_WEBHOOK_URL = os.getenv('FLOWDOC_N8N_WEBHOOK_URL')
     N8N_API_KEY = os.getenv('FLOWDOC_N8N_API_KEY')
+    OUTBOX_BATCH_SIZE = int(os.getenv('FLOWDOC_OUTBOX_BATCH_SIZE', 100))
+    OUTBOX_MAX_BACKOFF = int(os.getenv('FLOWDOC_OUTBOX_MAX_BACKOFF', 300))
+    OUTBOX_RETENTION_DAYS = int(os.getenv('FLOWDOC_OUTBOX_RETENTION_DAYS', 7))
     
     # File Upload
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
+    BATCH_MAX_FILES = int(os.getenv('FLOWDOC_BATCH_MAX_FILES', 1000))
+    BATCH_MAX_CONTENT_LENGTH = int(os.getenv('FLOWDOC_BATCH_MAX_CONTENT_LENGTH', 512 * 1024 * 1024))
+    
+    # Assignments
+    BULK_ASSIGN_MAX_USERS = int(os.getenv('FLOWDOC_BULK_ASSIGN_MAX_USERS', 10000))
+    OVERDUE_BATCH_SIZE = int(os.getenv('FLOWDOC_OVERDUE_BATCH_SIZE', 500))
+    
+    # Dashboard counters
+    COUNTER_SHARDS = int(os.getenv('FLOWDOC_COUNTER_SHARDS', 8))
     
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    
+    # Health checks
+    HEALTH_CACHE_TTL = float(os.getenv('FLOWDOC_HEALTH_CACHE_TTL', 5))
+    HEALTH_WARM_CONNECTIONS = int(os.getenv('FLOWDOC_HEALTH_WARM_CONNECTIONS', 5))
+    
+    # Metrics
+    METRICS_ENABLED = os.getenv('FLOWDOC_METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_PATH = os.getenv('FLOWDOC_METRICS_PATH', '/metrics')
+    METRICS_PORT = int(os.getenv('FLOWDOC_METRICS_PORT', 0))
 
 class DevelopmentConfig(Config):
     """Development configuration."""
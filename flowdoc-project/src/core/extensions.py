@@ -0,0 +1,50 @@
+"""
+Flowdoc Lazy Extensions
+"""
+import os
+import threading
+import click
+from flask import Flask
+from werkzeug.local import LocalProxy
+
+_lock = threading.Lock()
+
+def _redis_client(app: Flask):
+    client = app.extensions.get('flowdoc_redis')
+    if client is None:
+        with _lock:
+            client = app.extensions.get('flowdoc_redis')
+            if client is None:
+                import redis
+                from src.core.metrics import InstrumentedRedis
+
+                # The instrumented client times every command for /metrics
+                redis_class = InstrumentedRedis if app.config['METRICS_ENABLED'] else redis.Redis
+                client = redis_class(
+                    host=os.getenv('REDIS_HOST', 'localhost'),
+                    port=int(os.getenv('REDIS_PORT', 6379)),
+                    db=int(os.getenv('REDIS_DB', 0)),
+                    decode_responses=True
+                )
+                app.extensions['flowdoc_redis'] = client
+    return client
+
+def init_redis(app: Flask) -> None:
+    """Expose ``app.redis``, building the client on first use
+
+    redis-py connects lazily anyway; this also defers building the client
+    until a request or worker actually needs Redis.
+    """
+    app.redis = LocalProxy(lambda: _redis_client(app))
+
+def init_migrate(app: Flask, db) -> None:
+    """Set up Flask-Migrate for the ``flask db`` commands only
+
+    Flask-Migrate imports alembic, which adds about 0.2s to startup, and
+    only the CLI uses it; gunicorn workers never run inside a click context.
+    """
+    if click.get_current_context(silent=True) is None:
+        return
+
+    from flask_migrate import Migrate
+    Migrate(app, db)
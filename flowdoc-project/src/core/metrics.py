@@ -0,0 +1,273 @@
+"""
+Flowdoc Metrics
+"""
+from typing import Dict, Optional
+import logging
+import os
+import time
+from flask import Flask, Response, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+    generate_latest, multiprocess, start_http_server
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from redis import Redis
+from redis.client import Pipeline
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Seconds; from a Redis GET to a slow Textract page fetch
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+REQUEST_LATENCY = Histogram(
+    'flowdoc_http_request_duration_seconds',
+    'Time to produce a response, by route; streamed bodies are timed to the first byte',
+    ['method', 'route', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_QUERIES = Histogram(
+    'flowdoc_http_request_db_queries',
+    'SQL statements executed per request',
+    ['method', 'route'],
+    buckets=QUERY_COUNT_BUCKETS
+)
+REQUEST_DB_TIME = Histogram(
+    'flowdoc_http_request_db_seconds',
+    'Time spent in SQL statements per request',
+    ['method', 'route'],
+    buckets=LATENCY_BUCKETS
+)
+DB_QUERY_LATENCY = Histogram(
+    'flowdoc_db_query_duration_seconds',
+    'SQL statement execution time, by statement type',
+    ['statement'],
+    buckets=LATENCY_BUCKETS
+)
+DB_QUERY_ERRORS = Counter(
+    'flowdoc_db_query_errors_total',
+    'SQL statements that raised',
+    ['statement']
+)
+AWS_CALL_LATENCY = Histogram(
+    'flowdoc_aws_call_duration_seconds',
+    'AWS API call time including retries, by service and operation',
+    ['service', 'operation', 'outcome'],
+    buckets=LATENCY_BUCKETS
+)
+REDIS_COMMAND_LATENCY = Histogram(
+    'flowdoc_redis_command_duration_seconds',
+    'Redis round-trip time, by command; pipelines are timed as one PIPELINE',
+    ['command', 'outcome'],
+    buckets=LATENCY_BUCKETS
+)
+
+STATEMENT_TYPES = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'OTHER')
+# Resolved once: labels() takes a lock and a dict lookup on every call
+_QUERY_TIMERS = {statement: DB_QUERY_LATENCY.labels(statement) for statement in STATEMENT_TYPES}
+
+class RequestTiming:
+    """Per-request totals, kept on flask.g"""
+
+    __slots__ = ('started', 'queries', 'db_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+
+def _statement_type(statement: str) -> str:
+    verb = statement.lstrip()[:8].split(None, 1)
+    verb = verb[0].upper() if verb else ''
+    return verb if verb in _QUERY_TIMERS else 'OTHER'
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - conn.info['metrics_query_started'].pop()
+    _QUERY_TIMERS[_statement_type(statement)].observe(elapsed)
+    timing = g.get('metrics_timing') if has_request_context() else None
+    if timing is not None:
+        timing.queries += 1
+        timing.db_seconds += elapsed
+
+def _handle_error(exception_context) -> None:
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('metrics_query_started'):
+        connection.info['metrics_query_started'].pop()
+    DB_QUERY_ERRORS.labels(_statement_type(exception_context.statement or '')).inc()
+
+def instrument_sqlalchemy() -> None:
+    """Time every SQL statement from every engine
+
+    Listens on the Engine class, so the engine doesn't have to exist yet.
+    """
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+def instrument_boto_client(client, service_name: str) -> None:
+    """Time every API call a boto3 client makes
+
+    A call is timed from before its first HTTP attempt to after its last
+    retry. The per-call ``context`` dict carries the start time.
+    """
+    def started(context: Dict, **kwargs) -> None:
+        context['metrics_started'] = time.perf_counter()
+
+    def observe(model, context: Dict, outcome: str) -> None:
+        started_at = context.pop('metrics_started', None)
+        if started_at is not None:
+            AWS_CALL_LATENCY.labels(service_name, model.name, outcome).observe(
+                time.perf_counter() - started_at
+            )
+
+    def finished(model, context: Dict, http_response, **kwargs) -> None:
+        # Error responses (e.g. NoSuchKey) also end here, before ClientError is raised
+        observe(model, context, 'success' if http_response.status_code < 400 else 'error')
+
+    def failed(model, context: Dict, **kwargs) -> None:
+        # No response at all: connection errors, timeouts
+        observe(model, context, 'error')
+
+    client.meta.events.register('before-call', started)
+    client.meta.events.register('after-call', finished)
+    client.meta.events.register('after-call-error', failed)
+
+class InstrumentedPipeline(Pipeline):
+    """Pipeline that times each execute() as one round trip"""
+
+    def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = super().execute(raise_on_error)
+            outcome = 'success'
+            return result
+        finally:
+            REDIS_COMMAND_LATENCY.labels('PIPELINE', outcome).observe(time.perf_counter() - started)
+
+class InstrumentedRedis(Redis):
+    """Redis client that times every command
+
+    Blocking commands (e.g. BRPOP) are timed including the wait, so read
+    them by their command label rather than in aggregate.
+    """
+
+    def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            result = super().execute_command(*args, **options)
+            outcome = 'success'
+            return result
+        finally:
+            REDIS_COMMAND_LATENCY.labels(str(args[0]).upper(), outcome).observe(
+                time.perf_counter() - started
+            )
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> Pipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+class ProcessStatsCollector:
+    """Exposes the in-process stats services already keep
+
+    Only registered when one process serves /metrics; under the gunicorn
+    multiprocess setup each scrape would see a different worker's values.
+    """
+
+    def collect(self):
+        from src.services.cache import document_cache
+        from src.services.clients import registry
+
+        cache = CounterMetricFamily(
+            'flowdoc_document_cache_lookups',
+            'Document cache lookups by result',
+            labels=['result']
+        )
+        for result, count in document_cache.stats().items():
+            cache.add_metric([result], count)
+        yield cache
+
+        pools = GaugeMetricFamily(
+            'flowdoc_aws_pool_connections',
+            'AWS client connection pool usage',
+            labels=['service', 'stat']
+        )
+        for service_name, stats in registry.stats().items():
+            for stat, value in stats.items():
+                pools.add_metric([service_name, stat], value)
+        yield pools
+
+_process_stats: Optional[ProcessStatsCollector] = None
+
+def _route() -> str:
+    # The URL rule, not the path, so /documents/<id> is one series
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+def _before_request() -> None:
+    g.metrics_timing = RequestTiming()
+
+def _after_request(response: Response) -> Response:
+    timing = g.pop('metrics_timing', None)
+    if timing is None:
+        return response
+
+    method, route = request.method, _route()
+    REQUEST_LATENCY.labels(method, route, str(response.status_code)).observe(
+        time.perf_counter() - timing.started
+    )
+    REQUEST_QUERIES.labels(method, route).observe(timing.queries)
+    REQUEST_DB_TIME.labels(method, route).observe(timing.db_seconds)
+    return response
+
+def _registry() -> CollectorRegistry:
+    """Registry holding every metric
+
+    With PROMETHEUS_MULTIPROC_DIR set (gunicorn with several workers),
+    values are merged from all workers' files so any process can answer.
+    """
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+def metrics_view() -> Response:
+    """Prometheus text exposition of every metric"""
+    return Response(generate_latest(_registry()), mimetype=CONTENT_TYPE_LATEST)
+
+def serve_metrics(port: int) -> None:
+    """Serve the metrics on their own port, from a background thread
+
+    Run from the gunicorn master when FLOWDOC_METRICS_PORT is set, so
+    metrics are only reachable on a port the Service and ingress don't
+    expose, not on the public app.
+    """
+    start_http_server(port, registry=_registry())
+
+def init_metrics(app: Flask) -> None:
+    """Hook request, SQL, AWS and Redis timing into the app and serve /metrics"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    instrument_sqlalchemy()
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    # With a metrics port the gunicorn master serves them there instead
+    if not app.config.get('METRICS_PORT'):
+        app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', metrics_view)
+
+    global _process_stats
+    if not os.getenv('PROMETHEUS_MULTIPROC_DIR') and _process_stats is None:
+        _process_stats = ProcessStatsCollector()
+        REGISTRY.register(_process_stats)
+
+def child_exit(server, worker) -> None:
+    """gunicorn hook: drop a dead worker's live gauges from the shared files"""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,4 +1,5 @@
 from datetime import datetime
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from src import db
 
 class User(db.Model):
@@ -32,11 +33,16 @@ class Document(db.Model):
     title = db.Column(db.String(255), nullable=False)
     filename = db.Column(db.String(255), nullable=False)
     s3_key = db.Column(db.String(500), nullable=False)
+    content_hash = db.Column(db.String(64), index=True)
     content_type = db.Column(db.String(100))
-    status = db.Column(db.String(20), default='pending')
+    # active_history: status counters need the old value even if it wasn't loaded
+    status = db.column_property(db.Column(db.String(20), default='pending'), active_history=True)
     ocr_status = db.Column(db.String(20))
+    ocr_job_id = db.Column(db.String(100), index=True)
     ocr_confidence = db.Column(db.Float)
     form_schema = db.Column(db.JSON)
+    # NULL until its OCR text is in document_pages ('indexed', even with no text) or indexing gave up ('failed')
+    search_status = db.Column(db.String(20))
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -44,27 +50,71 @@ class Document(db.Model):
     # Relationships
     assignments = db.relationship('DocumentAssignment', backref='document', lazy=True)
     submissions = db.relationship('DocumentSubmission', backref='document', lazy=True)
+    
+    __table_args__ = (
+        # Keyset pagination: newest first per user, optionally by status
+        db.Index('ix_documents_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_documents_user_status_created', 'user_id', 'status', 'created_at', 'id'),
+        # What the search indexer still has to do
+        db.Index('ix_documents_search_pending', 'id',
+                 postgresql_where=db.text("ocr_status = 'completed' AND search_status IS NULL")),
+    )
+
+class DocumentPage(db.Model):
+    """Normalized OCR text of one document page, indexed for full-text search."""
+    __tablename__ = 'document_pages'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False)
+    page_number = db.Column(db.Integer, nullable=False)
+    text = db.Column(db.Text, nullable=False)
+    # Maintained by Postgres from text; never written by the application
+    search_vector = db.Column(
+        TSVECTOR,
+        db.Computed("to_tsvector('english', text)", persisted=True)
+    )
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('document_id', 'page_number', name='uq_document_pages_document_page'),
+        db.Index('ix_document_pages_search_vector', 'search_vector', postgresql_using='gin'),
+    )
 
 class DocumentAssignment(db.Model):
     """Document assignment model."""
     __tablename__ = 'document_assignments'
     
     id = db.Column(db.Integer, primary_key=True)
-    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     assigned_at = db.Column(db.DateTime, default=datetime.utcnow)
     due_date = db.Column(db.DateTime)
-    status = db.Column(db.String(20), default='pending')
+    status = db.column_property(db.Column(db.String(20), default='pending'), active_history=True)
+    
+    __table_args__ = (
+        # The overdue scanner walks pending assignments in due order
+        db.Index(
+            'ix_document_assignments_pending_due',
+            'due_date',
+            'id',
+            postgresql_where=db.text("status = 'pending' AND due_date IS NOT NULL")
+        ),
+    )
 
 class DocumentSubmission(db.Model):
     """Document submission model."""
     __tablename__ = 'document_submissions'
     
     id = db.Column(db.Integer, primary_key=True)
-    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id'), nullable=False, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     form_data = db.Column(db.JSON)
-    signature_data = db.Column(db.Text)
+    # Signature image in the signature bucket (see services/signatures.py)
+    signature_key = db.Column(db.String(500))
+    signature_hash = db.Column(db.String(64))
+    # Legacy inline base64, emptied by `flask backfill-signatures`; deferred
+    # so loading submissions never pulls it out of TOAST
+    signature_data = db.deferred(db.Column(db.Text))
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='submitted')
     
@@ -79,4 +129,41 @@ class Workflow(db.Model):
     config = db.Column(db.JSON)
     active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class StatusCounter(db.Model):
+    """Row counts per user, scope and status, kept current by src.services.counters."""
+    __tablename__ = 'status_counters'
+    
+    # user_id 0 holds the totals across all users
+    user_id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(30), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    # Totals are spread over several rows so concurrent writers don't queue on one
+    shard = db.Column(db.SmallInteger, primary_key=True, default=0)
+    count = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class OutboxEvent(db.Model):
+    """Workflow event recorded in the same transaction as the change it describes."""
+    __tablename__ = 'outbox_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    aggregate_type = db.Column(db.String(50), nullable=False)
+    aggregate_id = db.Column(db.Integer, nullable=False)
+    event_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.JSON, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    dispatched_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        # Only undelivered events are ever scanned
+        db.Index(
+            'ix_outbox_events_pending',
+            'available_at',
+            'id',
+            postgresql_where=db.text('dispatched_at IS NULL')
+        ),
+    )
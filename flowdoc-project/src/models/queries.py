@@ -0,0 +1,39 @@
+"""
+Flowdoc Query Helpers
+"""
+from sqlalchemy.orm import selectinload
+from src.models.models import Document, DocumentAssignment, DocumentSubmission, User, db
+
+# The relationships in models.py load lazily, one query per parent row the
+# first time they are touched. Listings that show related data should load
+# it up front with these options instead: selectinload issues one
+# "WHERE ... IN (...)" query per relationship for the whole page, so the
+# query count stays the same however many rows are shown.
+
+def document_assignees():
+    """Load Document.assignments and each assignee, for a page of documents"""
+    return selectinload(Document.assignments).joinedload(DocumentAssignment.user)
+
+def document_submissions():
+    """Load Document.submissions for a page of documents"""
+    return selectinload(Document.submissions)
+
+def user_documents():
+    """Load User.documents for a page of users"""
+    return selectinload(User.documents)
+
+def user_assignments():
+    """Load User.assignments and each assigned document, for a page of users"""
+    return selectinload(User.assignments).joinedload(DocumentAssignment.document)
+
+def submission_count():
+    """Per-document submission count as a column, without loading the rows
+
+    Correlated to the outer Document row; served by the
+    document_submissions.document_id index.
+    """
+    return db.select(
+        db.func.count(DocumentSubmission.id)
+    ).where(
+        DocumentSubmission.document_id == Document.id
+    ).correlate(Document).scalar_subquery().label('submission_count')
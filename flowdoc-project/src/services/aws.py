@@ -1,26 +1,74 @@
-from typing import Dict, Optional, Any
-import boto3
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Any
+from concurrent.futures import ThreadPoolExecutor
+import math
+import threading
+import uuid
+from botocore.exceptions import ClientError
 import json
 import os
 import logging
 from datetime import datetime
+from src.services.clients import get_client, registry
+from src.services.textract import TextractBlock, TextractJobError
 
 logger = logging.getLogger(__name__)
 
+MB = 1024 * 1024
+# S3 rejects multipart parts smaller than 5MB (except the last one)
+MIN_PART_SIZE = 5 * MB
+# Largest page get_document_text_detection will return
+TEXTRACT_MAX_RESULTS = 1000
+
 class AWSService:
     """Service for handling AWS operations."""
     
     def __init__(self):
-        self.s3_client = boto3.client('s3')
-        self.textract_client = boto3.client('textract')
-        self.lambda_client = boto3.client('lambda')
         self.bucket_name = os.getenv('S3_BUCKET', 'flowdoc-documents')
         self.signature_bucket = os.getenv('SIGNATURE_BUCKET', 'flowdoc-signatures')
+        
+        # Multipart upload tuning
+        self.part_size = max(int(os.getenv('FLOWDOC_S3_PART_SIZE_MB', 8)) * MB, MIN_PART_SIZE)
+        self.upload_concurrency = int(os.getenv('FLOWDOC_S3_UPLOAD_CONCURRENCY', 4))
+        self.upload_memory_limit = int(os.getenv('FLOWDOC_S3_UPLOAD_MEMORY_MB', 32)) * MB
+        self.presigned_expires_in = int(os.getenv('FLOWDOC_PRESIGNED_UPLOAD_EXPIRES', 900))
+        # Files transferred at once by a batch upload
+        self.batch_concurrency = int(os.getenv('FLOWDOC_S3_BATCH_CONCURRENCY', 16))
+        self._transfer_config = None
+    
+    # Clients come from the shared registry on first use, so constructing
+    # a service (e.g. at import time) doesn't load botocore
+    @property
+    def s3_client(self):
+        return get_client('s3')
+    
+    @property
+    def textract_client(self):
+        return get_client('textract')
+    
+    @property
+    def lambda_client(self):
+        return get_client('lambda')
     
-    def upload_file(self, file_obj, user_id: int, filename: str) -> Dict:
+    @property
+    def sqs_client(self):
+        return get_client('sqs')
+    
+    @property
+    def transfer_config(self):
+        if self._transfer_config is None:
+            from boto3.s3.transfer import TransferConfig
+            self._transfer_config = TransferConfig(
+                multipart_threshold=self.part_size,
+                multipart_chunksize=self.part_size,
+                max_concurrency=self.upload_concurrency
+            )
+        return self._transfer_config
+    
+    def upload_file(self, file_obj, user_id: Optional[int], filename: str,
+                    s3_key: Optional[str] = None) -> Dict:
         """Upload file to S3."""
         try:
-            s3_key = f"users/{user_id}/documents/{datetime.utcnow().strftime('%Y/%m/%d')}/{filename}"
+            s3_key = s3_key or self._build_s3_key(user_id, filename)
             
             self.s3_client.upload_fileobj(
                 file_obj,
@@ -28,17 +76,391 @@ class AWSService:
                 s3_key,
                 ExtraArgs={
                     'ContentType': self._get_content_type(filename)
-                }
+                },
+                Config=self.transfer_config
+            )
+            
+            return self._upload_result(s3_key)
+            
+        except Exception as e:
+            logger.error(f"Error uploading file to S3: {e}")
+            raise
+    
+    def upload_stream(self, stream: BinaryIO, user_id: Optional[int], filename: str,
+                      content_type: Optional[str] = None,
+                      s3_key: Optional[str] = None) -> Dict:
+        """Stream a request body into S3 without buffering the whole file.
+        
+        The body is read in ``part_size`` chunks and sent as a multipart
+        upload. At most ``upload_memory_limit`` bytes of parts are held at
+        once; a failed upload is aborted so no orphaned parts are billed.
+        """
+        s3_key = s3_key or self._build_s3_key(user_id, filename)
+        content_type = content_type or self._get_content_type(filename)
+        
+        first_part = self._read_part(stream)
+        if len(first_part) < self.part_size:
+            # Fits in a single part, skip the multipart round-trips
+            try:
+                self.s3_client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    Body=first_part,
+                    ContentType=content_type
+                )
+            except Exception as e:
+                logger.error(f"Error uploading file to S3: {e}")
+                raise
+            return self._upload_result(s3_key, size=len(first_part), content_type=content_type)
+        
+        upload_id = self.s3_client.create_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=s3_key,
+            ContentType=content_type
+        )['UploadId']
+        
+        try:
+            parts, size = self._upload_parts(stream, s3_key, upload_id, first_part)
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+            return self._upload_result(s3_key, size=size, content_type=content_type)
+            
+        except Exception as e:
+            logger.error(f"Error streaming file to S3, aborting upload {upload_id}: {e}")
+            self._abort_multipart_upload(s3_key, upload_id)
+            raise
+    
+    def run_transfers(self, transfer: Callable[[Any], Dict],
+                      items: Iterable) -> List[Tuple[Optional[Dict], Optional[Exception]]]:
+        """Run ``transfer`` over items on a bounded thread pool.
+        
+        Returns a (result, error) pair per item, in input order, so one
+        failed file doesn't abort the rest of a batch. The pool is kept
+        below the shared S3 client's connection pool size.
+        """
+        items = list(items)
+        if not items:
+            return []
+        
+        max_workers = max(1, min(self.batch_concurrency, registry.max_pool_connections, len(items)))
+        
+        def run(item: Any) -> Tuple[Optional[Dict], Optional[Exception]]:
+            try:
+                return transfer(item), None
+            except Exception as e:
+                logger.error(f"Error in batch transfer: {e}")
+                return None, e
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(run, items))
+    
+    def _upload_parts(self, stream: BinaryIO, s3_key: str, upload_id: str,
+                      first_part: bytes) -> Tuple[List[Dict], int]:
+        """Upload parts concurrently while bounding the buffered bytes."""
+        max_in_flight = max(1, min(self.upload_concurrency,
+                                   self.upload_memory_limit // self.part_size))
+        # Each slot is one part-sized buffer; reading blocks until a slot frees up
+        slots = threading.BoundedSemaphore(max_in_flight)
+        failed = threading.Event()
+        futures = []
+        size = 0
+        
+        def upload_part(part_number: int, body: bytes) -> Dict:
+            try:
+                response = self.s3_client.upload_part(
+                    Bucket=self.bucket_name,
+                    Key=s3_key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=body
+                )
+                return {'ETag': response['ETag'], 'PartNumber': part_number}
+            except Exception:
+                failed.set()
+                raise
+            finally:
+                slots.release()
+        
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            slots.acquire()
+            part, part_number = first_part, 1
+            while part:
+                futures.append(executor.submit(upload_part, part_number, part))
+                size += len(part)
+                part = None
+                
+                slots.acquire()
+                if failed.is_set():
+                    slots.release()
+                    break
+                part = self._read_part(stream)
+                part_number += 1
+            else:
+                # Release the slot taken for the empty read that ended the loop
+                slots.release()
+        
+        parts = [future.result() for future in futures]
+        return parts, size
+    
+    def _read_part(self, stream: BinaryIO) -> bytes:
+        """Read up to one part from a stream that may return short reads."""
+        buffer = bytearray()
+        while len(buffer) < self.part_size:
+            chunk = stream.read(self.part_size - len(buffer))
+            if not chunk:
+                break
+            buffer += chunk
+        return bytes(buffer)
+    
+    def _abort_multipart_upload(self, s3_key: str, upload_id: str) -> None:
+        """Abort a multipart upload so S3 discards the uploaded parts."""
+        try:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                UploadId=upload_id
+            )
+        except Exception as e:
+            logger.error(f"Error aborting multipart upload {upload_id}: {e}")
+    
+    def create_presigned_upload(self, user_id: int, filename: str, max_size: int,
+                                content_type: Optional[str] = None) -> Dict:
+        """Create a presigned POST so the client uploads straight to S3."""
+        try:
+            s3_key = self._build_s3_key(user_id, filename)
+            content_type = content_type or self._get_content_type(filename)
+            
+            post = self.s3_client.generate_presigned_post(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                Fields={'Content-Type': content_type},
+                Conditions=[
+                    {'Content-Type': content_type},
+                    ['content-length-range', 1, max_size]
+                ],
+                ExpiresIn=self.presigned_expires_in
             )
             
             return {
                 's3_key': s3_key,
-                'bucket': self.bucket_name,
-                'url': f"https://{self.bucket_name}.s3.amazonaws.com/{s3_key}"
+                'method': 'POST',
+                'url': post['url'],
+                'fields': post['fields'],
+                'expires_in': self.presigned_expires_in
             }
             
         except Exception as e:
-            logger.error(f"Error uploading file to S3: {e}")
+            logger.error(f"Error creating presigned upload: {e}")
+            raise
+    
+    def create_presigned_multipart_upload(self, user_id: int, filename: str, size: int,
+                                          content_type: Optional[str] = None) -> Dict:
+        """Start a multipart upload and presign a PUT URL for each part."""
+        try:
+            s3_key = self._build_s3_key(user_id, filename)
+            
+            upload_id = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                ContentType=content_type or self._get_content_type(filename)
+            )['UploadId']
+            
+            parts = []
+            for part_number in range(1, math.ceil(size / self.part_size) + 1):
+                parts.append({
+                    'part_number': part_number,
+                    'url': self.s3_client.generate_presigned_url(
+                        'upload_part',
+                        Params={
+                            'Bucket': self.bucket_name,
+                            'Key': s3_key,
+                            'UploadId': upload_id,
+                            'PartNumber': part_number
+                        },
+                        ExpiresIn=self.presigned_expires_in
+                    )
+                })
+            
+            return {
+                's3_key': s3_key,
+                'method': 'MULTIPART',
+                'upload_id': upload_id,
+                'part_size': self.part_size,
+                'parts': parts,
+                'expires_in': self.presigned_expires_in
+            }
+            
+        except Exception as e:
+            logger.error(f"Error creating presigned multipart upload: {e}")
+            raise
+    
+    def complete_multipart_upload(self, s3_key: str, upload_id: str, parts: List[Dict]) -> None:
+        """Complete a client-driven multipart upload from its part ETags."""
+        try:
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={
+                    'Parts': sorted(
+                        ({'ETag': part['etag'], 'PartNumber': int(part['part_number'])}
+                         for part in parts),
+                        key=lambda part: part['PartNumber']
+                    )
+                }
+            )
+        except Exception as e:
+            logger.error(f"Error completing multipart upload {upload_id}: {e}")
+            raise
+    
+    def get_object_metadata(self, s3_key: str) -> Optional[Dict]:
+        """Return size and content type of an object, or None if it doesn't exist."""
+        try:
+            response = self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            logger.error(f"Error reading object metadata from S3: {e}")
+            raise
+        
+        return {
+            'size': response['ContentLength'],
+            'content_type': response.get('ContentType'),
+            'etag': response.get('ETag')
+        }
+    
+    def get_object_range(self, s3_key: str, byte_range: str) -> Optional[Dict]:
+        """Read part of an object, e.g. ``bytes=0-1023`` or ``bytes=-1024``.
+    
+        Returns the bytes and the object's total size, or None if the
+        object doesn't exist.
+        """
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                Range=byte_range
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            logger.error(f"Error reading object range from S3: {e}")
+            raise
+    
+        body = response['Body'].read()
+        # "bytes 0-1023/5000"; absent if the range covered the whole object
+        content_range = response.get('ContentRange')
+        size = int(content_range.rsplit('/', 1)[-1]) if content_range else len(body)
+        return {'body': body, 'size': size}
+    
+    def open_object(self, s3_key: str) -> Optional[BinaryIO]:
+        """Stream an object's body, or None if it doesn't exist."""
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            logger.error(f"Error reading object from S3: {e}")
+            raise
+        return response['Body']
+    
+    def get_object(self, s3_key: str) -> Optional[Dict]:
+        """Read a whole (small) object, or None if it doesn't exist."""
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            logger.error(f"Error reading object from S3: {e}")
+            raise
+    
+        return {
+            'body': response['Body'].read(),
+            'content_type': response.get('ContentType'),
+            'etag': response.get('ETag')
+        }
+    
+    def put_object(self, s3_key: str, body: bytes, content_type: str) -> str:
+        """Store a small object in the documents bucket; returns its ETag."""
+        try:
+            response = self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                Body=body,
+                ContentType=content_type
+            )
+        except Exception as e:
+            logger.error(f"Error uploading object to S3: {e}")
+            raise
+        return response['ETag']
+    
+    def copy_object(self, source_key: str, s3_key: str) -> None:
+        """Copy an object within the documents bucket without downloading it."""
+        try:
+            self.s3_client.copy_object(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                CopySource={'Bucket': self.bucket_name, 'Key': source_key}
+            )
+        except Exception as e:
+            logger.error(f"Error copying object in S3: {e}")
+            raise
+    
+    def delete_object(self, s3_key: str) -> None:
+        """Delete an object from the documents bucket."""
+        try:
+            self.s3_client.delete_object(Bucket=self.bucket_name, Key=s3_key)
+        except Exception as e:
+            logger.error(f"Error deleting object from S3: {e}")
+            raise
+    
+    def put_signature(self, s3_key: str, body: bytes, content_type: str) -> None:
+        """Store a signature image in the signature bucket."""
+        try:
+            self.s3_client.put_object(
+                Bucket=self.signature_bucket,
+                Key=s3_key,
+                Body=body,
+                ContentType=content_type
+            )
+        except Exception as e:
+            logger.error(f"Error uploading signature to S3: {e}")
+            raise
+    
+    def get_signature(self, s3_key: str) -> Optional[Dict]:
+        """Open a signature image for streaming, or None if it doesn't exist.
+        
+        The body is a botocore StreamingBody; nothing is read until the
+        caller iterates it.
+        """
+        try:
+            response = self.s3_client.get_object(Bucket=self.signature_bucket, Key=s3_key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            logger.error(f"Error reading signature from S3: {e}")
+            raise
+        
+        return {
+            'body': response['Body'],
+            'size': response['ContentLength'],
+            'content_type': response.get('ContentType')
+        }
+    
+    def create_presigned_signature_url(self, s3_key: str) -> str:
+        """Presign a GET so the client downloads a signature straight from S3."""
+        try:
+            return self.s3_client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.signature_bucket, 'Key': s3_key},
+                ExpiresIn=self.presigned_expires_in
+            )
+        except Exception as e:
+            logger.error(f"Error creating presigned signature URL: {e}")
             raise
     
     def start_textract_job(self, s3_key: str, document_id: int) -> Dict:
@@ -107,6 +529,103 @@ class AWSService:
             logger.error(f"Error getting Textract results: {e}")
             raise
     
+    def iter_textract_results(self, job_id: str) -> Iterator[List[TextractBlock]]:
+        """Yield OCR results from Textract one response page at a time.
+        
+        The next page is requested in the background while the caller works
+        through the current one, and blocks are converted to compact
+        ``TextractBlock`` records so the raw response can be freed.
+        Raises ``TextractJobError`` if the job has not succeeded.
+        """
+        def fetch(next_token: Optional[str] = None) -> Dict:
+            params = {'JobId': job_id, 'MaxResults': TEXTRACT_MAX_RESULTS}
+            if next_token:
+                params['NextToken'] = next_token
+            return self.textract_client.get_document_text_detection(**params)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=1) as prefetcher:
+                response = fetch()
+                while True:
+                    if response['JobStatus'] not in ('SUCCEEDED', 'PARTIAL_SUCCESS'):
+                        raise TextractJobError(
+                            job_id,
+                            response['JobStatus'],
+                            response.get('StatusMessage')
+                        )
+                    
+                    next_token = response.get('NextToken')
+                    pending = prefetcher.submit(fetch, next_token) if next_token else None
+                    
+                    blocks = [TextractBlock.from_dict(block) for block in response['Blocks']]
+                    response = None
+                    yield blocks
+                    
+                    if pending is None:
+                        break
+                    response = pending.result()
+                    
+        except TextractJobError:
+            raise
+        except Exception as e:
+            logger.error(f"Error getting Textract results: {e}")
+            raise
+    
+    def receive_messages(self, queue_url: str, max_messages: int = 10,
+                         wait_seconds: int = 20) -> List[Dict]:
+        """Receive up to 10 SQS messages, long-polling for up to ``wait_seconds``"""
+        try:
+            response = self.sqs_client.receive_message(
+                QueueUrl=queue_url,
+                MaxNumberOfMessages=min(max_messages, 10),
+                WaitTimeSeconds=wait_seconds,
+                AttributeNames=['ApproximateReceiveCount']
+            )
+            return response.get('Messages', [])
+            
+        except Exception as e:
+            logger.error(f"Error receiving messages from {queue_url}: {e}")
+            raise
+    
+    def delete_messages(self, queue_url: str, receipt_handles: List[str]) -> None:
+        """Delete received SQS messages, 10 per request"""
+        try:
+            for start in range(0, len(receipt_handles), 10):
+                response = self.sqs_client.delete_message_batch(
+                    QueueUrl=queue_url,
+                    Entries=[
+                        {'Id': str(index), 'ReceiptHandle': receipt_handle}
+                        for index, receipt_handle in enumerate(receipt_handles[start:start + 10])
+                    ]
+                )
+                for failure in response.get('Failed', []):
+                    # The message is received again once its visibility timeout expires
+                    logger.warning(f"Could not delete message from {queue_url}: {failure.get('Message')}")
+            
+        except Exception as e:
+            logger.error(f"Error deleting messages from {queue_url}: {e}")
+            raise
+    
+    def _build_s3_key(self, user_id: int, filename: str) -> str:
+        """Build a new, unique S3 key for a user's document."""
+        # The uuid keeps a second upload of the same filename from overwriting the first
+        return (f"users/{user_id}/documents/{datetime.utcnow().strftime('%Y/%m/%d')}/"
+                f"{uuid.uuid4().hex}/{filename}")
+    
+    def _upload_result(self, s3_key: str, size: Optional[int] = None,
+                       content_type: Optional[str] = None) -> Dict:
+        """Describe an uploaded object."""
+        result = {
+            's3_key': s3_key,
+            'bucket': self.bucket_name,
+            'url': f"https://{self.bucket_name}.s3.amazonaws.com/{s3_key}"
+        }
+        if size is not None:
+            result['size'] = size
+        if content_type is not None:
+            result['content_type'] = content_type
+        return result
+    
     def _get_content_type(self, filename: str) -> str:
         """Get content type based on file extension."""
         ext = filename.lower().split('.')[-1]
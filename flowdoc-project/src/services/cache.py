@@ -0,0 +1,90 @@
+"""
+Flowdoc Document Cache
+"""
+from typing import Callable, Dict, Optional
+import json
+import logging
+import os
+import threading
+from flask import current_app
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+class DocumentCache:
+    """Read-through Redis cache for document detail lookups
+
+    Entries hold the serialized document plus its owner, are written on a
+    miss and dropped whenever the document's status changes. If Redis is
+    unavailable lookups fall through to the database.
+    """
+
+    KEY_PREFIX = 'flowdoc:document'
+
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+        self.ttl = int(os.getenv('FLOWDOC_CACHE_TTL', 300))
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    @property
+    def redis(self):
+        return self._redis if self._redis is not None else current_app.redis
+
+    def key(self, document_id: int) -> str:
+        return f"{self.KEY_PREFIX}:{document_id}"
+
+    def get(self, document_id: int, user_id: int,
+            loader: Callable[[], Optional[Dict]]) -> Optional[Dict]:
+        """Return the cached document for this owner, loading it on a miss
+
+        ``loader`` returns the serialized document (or None) from the
+        database; its result is cached for ``ttl`` seconds.
+        """
+        try:
+            raw = self.redis.get(self.key(document_id))
+        except RedisError as e:
+            logger.warning(f"Document cache unavailable: {e}")
+            self._count('errors')
+            return loader()
+
+        if raw is not None:
+            self._count('hits')
+            entry = json.loads(raw)
+            # Entries are per document, so check ownership on every hit
+            return entry['d'] if entry['u'] == user_id else None
+
+        self._count('misses')
+        document = loader()
+        if document is not None:
+            entry = json.dumps({'u': user_id, 'd': document}, separators=(',', ':'), default=str)
+            try:
+                self.redis.set(self.key(document_id), entry, ex=self.ttl)
+            except RedisError as e:
+                logger.warning(f"Could not cache document {document_id}: {e}")
+                self._count('errors')
+        return document
+
+    def invalidate(self, *document_ids: int) -> None:
+        """Drop cached entries, e.g. after a status change is committed"""
+        if not document_ids:
+            return
+        try:
+            self.redis.delete(*(self.key(document_id) for document_id in document_ids))
+        except RedisError as e:
+            # Stale entries still expire after ttl seconds
+            logger.warning(f"Could not invalidate cached documents {document_ids}: {e}")
+            self._count('errors')
+
+    def stats(self) -> Dict[str, int]:
+        """Hit, miss and error counts for this process"""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'errors': self.errors}
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+document_cache = DocumentCache()
@@ -0,0 +1,124 @@
+"""
+Flowdoc AWS Client Registry
+"""
+from typing import Any, Dict, Optional
+import logging
+import os
+import threading
+from src.core.metrics import instrument_boto_client
+
+logger = logging.getLogger(__name__)
+
+class PoolStats:
+    """In-flight HTTP request counts for one client's connection pool"""
+
+    def __init__(self, max_pool_connections: int):
+        self.max_pool_connections = max_pool_connections
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.saturated = 0
+        self._lock = threading.Lock()
+
+    def request_started(self, **kwargs) -> None:
+        with self._lock:
+            # Past the pool size urllib3 opens throwaway connections instead of reusing one
+            if self.in_flight >= self.max_pool_connections:
+                self.saturated += 1
+            self.in_flight += 1
+            self.requests += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def request_finished(self, **kwargs) -> None:
+        with self._lock:
+            self.in_flight = max(self.in_flight - 1, 0)
+
+    def as_dict(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'max_pool_connections': self.max_pool_connections,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'requests': self.requests,
+                'saturated': self.saturated
+            }
+
+class ClientRegistry:
+    """Process-wide boto3 clients, built lazily and shared by all services
+
+    boto3 clients are thread-safe once built, and each owns a connection
+    pool, so one client per service per process lets every request reuse
+    warm connections. After a fork the child starts with an empty registry,
+    since sockets inherited from the parent must not be shared.
+    """
+
+    def __init__(self, max_pool_connections: Optional[int] = None,
+                 region_name: Optional[str] = None):
+        self.max_pool_connections = max_pool_connections or int(
+            os.getenv('FLOWDOC_AWS_MAX_POOL_CONNECTIONS', 50)
+        )
+        self.region_name = region_name or os.getenv('FLOWDOC_AWS_REGION')
+        self.reset()
+
+    def reset(self) -> None:
+        """Drop all clients, e.g. in a freshly forked worker"""
+        self._lock = threading.Lock()
+        self._session = None
+        self._clients: Dict[str, Any] = {}
+        self._stats: Dict[str, PoolStats] = {}
+        self._pid = os.getpid()
+
+    def get(self, service_name: str) -> Any:
+        """Return the shared client for an AWS service, creating it on first use"""
+        if self._pid != os.getpid():
+            self.reset()
+
+        client = self._clients.get(service_name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(service_name)
+                if client is None:
+                    client = self._create(service_name)
+                    self._clients[service_name] = client
+        return client
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Connection pool usage per service"""
+        return {name: stats.as_dict() for name, stats in self._stats.items()}
+
+    def _create(self, service_name: str) -> Any:
+        # Imported here: boto3 and botocore take a few hundred ms to load,
+        # and processes that never call AWS shouldn't pay for it
+        import boto3
+        from botocore.config import Config as BotoConfig
+
+        # The default boto3 session isn't safe to build clients from concurrently
+        if self._session is None:
+            self._session = boto3.session.Session(region_name=self.region_name)
+
+        client = self._session.client(
+            service_name,
+            config=BotoConfig(
+                max_pool_connections=self.max_pool_connections,
+                retries={'mode': 'standard'}
+            )
+        )
+
+        stats = PoolStats(self.max_pool_connections)
+        client.meta.events.register('before-send', stats.request_started)
+        # Emitted after every HTTP attempt, whether it succeeded or raised
+        client.meta.events.register('needs-retry', stats.request_finished)
+        self._stats[service_name] = stats
+        instrument_boto_client(client, service_name)
+
+        logger.debug(f"Created shared {service_name} client")
+        return client
+
+registry = ClientRegistry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=registry.reset)
+
+def get_client(service_name: str) -> Any:
+    """Shared boto3 client for an AWS service"""
+    return registry.get(service_name)
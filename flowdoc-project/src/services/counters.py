@@ -0,0 +1,248 @@
+"""
+Flowdoc Status Counters
+"""
+from typing import Dict, Optional, Tuple
+from collections import Counter
+from datetime import datetime
+import logging
+import os
+import random
+import time
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects.postgresql import insert
+from src.models.models import Document, DocumentAssignment, StatusCounter, db
+
+logger = logging.getLogger(__name__)
+
+# user_id of the rows holding totals across all users
+ALL_USERS = 0
+
+# Counted models: scope name and the column holding the counted user
+TRACKED = {
+    Document: ('documents', 'user_id'),
+    DocumentAssignment: ('assignments', 'user_id')
+}
+
+# Pending assignments past their due date; only the reconciler writes these,
+# since an assignment becomes overdue without any row changing
+OVERDUE_SCOPE = 'overdue_assignments'
+OVERDUE_STATUS = 'overdue'
+
+COUNTER_SHARDS = int(os.getenv('FLOWDOC_COUNTER_SHARDS', 8))
+UPSERT_CHUNK = 1000
+
+Key = Tuple[str, int, str]
+
+def _status(value: Optional[str]) -> str:
+    return value or 'unknown'
+
+def _changed_deltas(session) -> Counter:
+    """Count changes from updated and deleted objects, taken before the flush
+
+    The old status is still loadable here; deleted rows are gone afterwards.
+    """
+    deltas: Counter = Counter()
+    for obj in session.deleted:
+        tracked = TRACKED.get(type(obj))
+        if tracked:
+            scope, user_attr = tracked
+            history = inspect(obj).attrs.status.history
+            status = history.deleted[0] if history.deleted else obj.status
+            deltas[(scope, getattr(obj, user_attr), _status(status))] -= 1
+
+    for obj in session.dirty:
+        tracked = TRACKED.get(type(obj))
+        if not tracked:
+            continue
+        scope, user_attr = tracked
+        history = inspect(obj).attrs.status.history
+        # active_history on the status columns guarantees the old value is here
+        if not history.deleted or history.deleted[0] == obj.status:
+            continue
+        user_id = getattr(obj, user_attr)
+        deltas[(scope, user_id, _status(history.deleted[0]))] -= 1
+        deltas[(scope, user_id, _status(obj.status))] += 1
+
+    return deltas
+
+def _new_deltas(session) -> Counter:
+    """Count changes from inserted objects, taken after the flush applied column defaults"""
+    deltas: Counter = Counter()
+    for obj in session.new:
+        tracked = TRACKED.get(type(obj))
+        if tracked:
+            scope, user_attr = tracked
+            deltas[(scope, getattr(obj, user_attr), _status(obj.status))] += 1
+    return deltas
+
+def apply_deltas(connection, deltas: Dict[Key, int]) -> None:
+    """Add count changes to the per-user and all-user rows in one upsert
+
+    Runs on the caller's connection, so the counters commit or roll back
+    together with the change they describe.
+    """
+    rows: Counter = Counter()
+    for (scope, user_id, status), delta in deltas.items():
+        if delta and user_id is not None:
+            rows[(user_id, scope, status, 0)] += delta
+            rows[(ALL_USERS, scope, status, random.randrange(COUNTER_SHARDS))] += delta
+    _upsert(connection, rows)
+
+def _upsert(connection, rows: Dict[Tuple[int, str, str, int], int]) -> None:
+    """Add to counter rows keyed by (user_id, scope, status, shard)"""
+    # Sorted so concurrent upserts lock rows in the same order
+    values = [
+        {'user_id': user_id, 'scope': scope, 'status': status, 'shard': shard,
+         'count': delta, 'updated_at': datetime.utcnow()}
+        for (user_id, scope, status, shard), delta in sorted(rows.items()) if delta
+    ]
+    for start in range(0, len(values), UPSERT_CHUNK):
+        statement = insert(StatusCounter).values(values[start:start + UPSERT_CHUNK])
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=['user_id', 'scope', 'status', 'shard'],
+            set_={
+                'count': StatusCounter.count + statement.excluded.count,
+                'updated_at': statement.excluded.updated_at
+            }
+        ))
+
+def increment(deltas: Dict[Key, int]) -> None:
+    """Record count changes made outside the ORM unit of work
+
+    Bulk INSERT/UPDATE statements don't pass through the flush hook, so
+    code issuing them reports their effect here, before committing.
+    """
+    apply_deltas(db.session.connection(), deltas)
+
+def _before_flush(session, flush_context, instances) -> None:
+    session.info['status_counter_deltas'] = _changed_deltas(session)
+
+def _after_flush(session, flush_context) -> None:
+    deltas = session.info.pop('status_counter_deltas', Counter())
+    deltas.update(_new_deltas(session))
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+def register_counter_events(session) -> None:
+    """Keep status counters current for every flush of this session"""
+    if not event.contains(session, 'before_flush', _before_flush):
+        event.listen(session, 'before_flush', _before_flush)
+        event.listen(session, 'after_flush', _after_flush)
+
+def user_counts(user_id: int) -> Dict[str, Dict[str, int]]:
+    """Counts by scope and status for one user, or ALL_USERS for totals
+
+    Reads a handful of counter rows, however large the counted tables are.
+    """
+    rows = db.session.query(
+        StatusCounter.scope,
+        StatusCounter.status,
+        db.func.sum(StatusCounter.count)
+    ).filter(
+        StatusCounter.user_id == user_id
+    ).group_by(
+        StatusCounter.scope,
+        StatusCounter.status
+    ).all()
+
+    counts: Dict[str, Dict[str, int]] = {}
+    for scope, status, count in rows:
+        if count:
+            counts.setdefault(scope, {})[status] = int(count)
+    return counts
+
+class CounterReconciler:
+    """Recomputes counters from the source tables
+
+    Corrects any drift (e.g. rows changed by hand in psql) and refreshes
+    overdue assignment counts, which no write path can maintain.
+    """
+
+    # pg_try_advisory_xact_lock key, so only one reconciler applies corrections at a time
+    LOCK_KEY = 0x666c6f77646f63
+
+    def reconcile(self) -> Dict[str, int]:
+        """Correct every counter; returns counter rows corrected per scope
+
+        The source tables and the counters are read in one REPEATABLE READ
+        snapshot, in which they must agree: every counted change commits
+        together with its counter update. The difference is then added to
+        the counters like any other change, so writers are never blocked
+        and updates committed since the snapshot are kept.
+        """
+        try:
+            acquired = db.session.execute(
+                db.select(db.func.pg_try_advisory_xact_lock(self.LOCK_KEY))
+            ).scalar()
+            if not acquired:
+                logger.info("Another reconciler is running; skipping")
+                db.session.rollback()
+                return {}
+
+            with db.engine.connect().execution_options(isolation_level='REPEATABLE READ') as snapshot:
+                with snapshot.begin():
+                    expected = self._expected(snapshot)
+                    actual = self._actual(snapshot)
+
+            corrections: Counter = Counter()
+            for key in expected.keys() | actual.keys():
+                user_id, scope, status = key
+                corrections[(user_id, scope, status, 0)] += expected[key] - actual[key]
+            _upsert(db.session.connection(), corrections)
+            db.session.commit()
+
+            return dict(Counter(scope for (_, scope, _, _), delta in corrections.items() if delta))
+
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def run(self, interval: float = 300.0) -> None:
+        """Reconcile forever"""
+        logger.info("Counter reconciler started")
+        while True:
+            try:
+                written = self.reconcile()
+                if written:
+                    logger.warning(f"Corrected drifted status counters: {written}")
+            except Exception as e:
+                logger.error(f"Error reconciling status counters: {e}")
+            time.sleep(interval)
+
+    @staticmethod
+    def _expected(connection) -> Counter:
+        """Counts by (user_id, scope, status), totals under ALL_USERS, from the source tables"""
+        counts: Counter = Counter()
+
+        def add(scope: str, rows) -> None:
+            for user_id, status, count in rows:
+                if user_id is not None:
+                    counts[(user_id, scope, _status(status))] += count
+                    counts[(ALL_USERS, scope, _status(status))] += count
+
+        for model, (scope, user_attr) in TRACKED.items():
+            user_column = getattr(model, user_attr)
+            add(scope, connection.execute(
+                db.select(user_column, model.status, db.func.count()).group_by(user_column, model.status)
+            ))
+
+        add(OVERDUE_SCOPE, connection.execute(
+            db.select(
+                DocumentAssignment.user_id, db.literal(OVERDUE_STATUS), db.func.count()
+            ).where(
+                DocumentAssignment.status == 'pending',
+                DocumentAssignment.due_date < datetime.utcnow()
+            ).group_by(DocumentAssignment.user_id)
+        ))
+        return counts
+
+    @staticmethod
+    def _actual(connection) -> Counter:
+        """What the counters hold, by (user_id, scope, status) across shards"""
+        rows = connection.execute(
+            db.select(
+                StatusCounter.user_id, StatusCounter.scope, StatusCounter.status,
+                db.func.sum(StatusCounter.count)
+            ).group_by(StatusCounter.user_id, StatusCounter.scope, StatusCounter.status)
+        )
+        return Counter({(user_id, scope, status): int(count) for user_id, scope, status, count in rows})
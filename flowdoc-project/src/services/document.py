@@ -1,13 +1,26 @@
 """
 Flowdoc Document Service
 """
-from typing import Dict, Optional, BinaryIO
+from typing import Callable, Dict, List, Optional, BinaryIO, Tuple
+from collections import Counter, defaultdict
 from datetime import datetime
 import os
 import logging
+import time
 from src.services.aws import AWSService
-from src.services.workflow import WorkflowService
-from src.models.models import Document, db
+from src.services import counters
+from src.services.cache import document_cache
+from src.services.events import document_status_changed, documents_status_changed
+from src.services.ocr_store import OCRArtifact, OCRStore
+from src.services.outbox import record_event, record_events
+from src.services.previews import PreviewStore
+from src.services.scheduler import OCRScheduler
+from src.services.search import SearchIndexer
+from src.services.signatures import SignatureStore
+from src.services.storage import ContentStore
+from src.models.models import Document, DocumentAssignment, DocumentSubmission, User, db
+from src.models.queries import document_assignees, submission_count
+from src.utils.pagination import decode_cursor, encode_cursor
 
 logger = logging.getLogger(__name__)
 
@@ -16,41 +29,260 @@ class DocumentService:
     
     def __init__(self):
         self.aws_service = AWSService()
-        self.workflow_service = WorkflowService()
+        self.content_store = ContentStore(self.aws_service)
+        self.ocr_scheduler = OCRScheduler(aws_service=self.aws_service)
+        self.ocr_store = OCRStore(self.aws_service)
+        self.search_indexer = SearchIndexer(self.aws_service, self.ocr_store)
+        self.signature_store = SignatureStore(self.aws_service)
+        self.preview_store = PreviewStore(self.aws_service)
         
     def process_uploaded_document(self, file_obj: BinaryIO, user_id: int) -> Document:
         """Process and store an uploaded document"""
         try:
-            # Upload to S3
-            s3_result = self.aws_service.upload_file(file_obj, user_id, file_obj.filename)
-            
-            # Create document record
-            document = Document(
-                title=file_obj.filename,
-                filename=file_obj.filename,
-                s3_key=s3_result['s3_key'],
-                content_type=file_obj.content_type,
-                status='uploaded',
-                user_id=user_id
+            # Upload to S3, once per unique file
+            s3_result = self.content_store.put_file(file_obj, file_obj.filename)
+            
+            return self._create_document(
+                s3_result,
+                user_id,
+                file_obj.filename,
+                file_obj.content_type
             )
             
-            db.session.add(document)
-            db.session.commit()
+        except Exception as e:
+            logger.error(f"Error processing document upload: {e}")
+            db.session.rollback()
+            raise
+    
+    def process_streamed_document(self, stream: BinaryIO, user_id: int, filename: str,
+                                  content_type: Optional[str] = None) -> Document:
+        """Stream a raw request body to S3 and store the document"""
+        try:
+            s3_result = self.content_store.put_stream(stream, filename, content_type)
             
-            # Trigger workflow
-            self.workflow_service.document_uploaded(
-                document.id,
+            return self._create_document(
+                s3_result,
                 user_id,
-                file_obj.filename
+                filename,
+                s3_result['content_type']
             )
             
-            return document
+        except Exception as e:
+            logger.error(f"Error processing streamed document upload: {e}")
+            db.session.rollback()
+            raise
+    
+    def process_batch(self, entries: List[Tuple[str, Optional[str], Callable[[], BinaryIO]]],
+                      user_id: int, priority: str = 'bulk') -> Dict:
+        """Store many documents at once and queue their OCR as one unit
+        
+        Entries are (filename, content_type, open_file) triples. Files are
+        uploaded concurrently, then every successful one is inserted with a
+        single bulk INSERT and queued for OCR with one Redis call. Failed
+        files are reported per item and don't affect the rest.
+        """
+        started = time.perf_counter()
+        stored = self.content_store.put_files([(filename, open_file) for filename, _, open_file in entries])
+        
+        results = []
+        rows = []
+        new_blobs = []
+        for (filename, content_type, _), (s3_result, error) in zip(entries, stored):
+            if error is not None:
+                results.append({'filename': filename, 'status': 'failed', 'error': str(error)})
+                continue
+            results.append({
+                'filename': filename,
+                'status': 'created',
+                'deduplicated': s3_result['deduplicated'],
+                'size': s3_result['size']
+            })
+            rows.append({
+                'title': filename,
+                'filename': filename,
+                's3_key': s3_result['s3_key'],
+                'content_hash': s3_result['content_hash'],
+                'content_type': content_type,
+                'status': 'uploaded',
+                'user_id': user_id
+            })
+            if not s3_result['deduplicated']:
+                new_blobs.append(s3_result['s3_key'])
+        
+        queued = []
+        if rows:
+            try:
+                if os.getenv('FLOWDOC_ENABLE_OCR', 'true').lower() == 'true':
+                    self._reuse_batch_ocr(rows)
+                    for row in rows:
+                        row['status'] = 'processing'
+                        row.setdefault('ocr_status', 'queued')
+                else:
+                    for row in rows:
+                        row['ocr_status'] = 'skipped'
+                
+                # insertmanyvalues sends this as a few multi-row INSERT ... RETURNING statements
+                ids = db.session.execute(
+                    db.insert(Document).returning(Document.id, sort_by_parameter_order=True),
+                    rows
+                ).scalars().all()
+                for row, document_id in zip(rows, ids):
+                    row['id'] = document_id
+                
+                # Bulk inserts bypass the flush hook that maintains the status counters
+                counters.increment(Counter(('documents', user_id, row['status']) for row in rows))
+                
+                record_events('document_uploaded', 'document', {
+                    row['id']: {'document_id': row['id'], 'user_id': user_id, 'filename': row['filename']}
+                    for row in rows
+                })
+                db.session.commit()
+            except Exception as e:
+                logger.error(f"Error inserting document batch: {e}")
+                db.session.rollback()
+                raise
+            
+            queued = [row for row in rows if row['ocr_status'] == 'queued']
+            if queued:
+                # Copies of one file in the batch share a blob, and so a Textract job
+                leaders = {}
+                shared_with = defaultdict(list)
+                for row in queued:
+                    leader = leaders.setdefault(row['s3_key'], row)
+                    if leader is not row:
+                        shared_with[leader['id']].append(row['id'])
+                try:
+                    self.ocr_scheduler.enqueue_many(
+                        [(row['id'], row['s3_key']) for row in leaders.values()], priority, shared_with
+                    )
+                except Exception as e:
+                    logger.error(f"Error queueing OCR for document batch: {e}")
+                    Document.query.filter(Document.id.in_([row['id'] for row in queued])).update(
+                        {'ocr_status': 'failed'}, synchronize_session=False
+                    )
+                    db.session.commit()
+                    for row in queued:
+                        row['ocr_status'] = 'failed'
+            
+            documents_status_changed(user_id, rows)
+            self._queue_previews(new_blobs)
+        
+        created = iter(rows)
+        for result in results:
+            if result['status'] == 'created':
+                row = next(created)
+                result['document_id'] = row['id']
+                result['ocr_status'] = row['ocr_status']
+        
+        elapsed = time.perf_counter() - started
+        total_bytes = sum(result.get('size', 0) for result in results)
+        return {
+            'results': results,
+            'total': len(results),
+            'created': len(rows),
+            'failed': len(results) - len(rows),
+            'queued': sum(1 for row in queued if row['ocr_status'] == 'queued'),
+            'bytes': total_bytes,
+            'elapsed_seconds': round(elapsed, 3),
+            'files_per_second': round(len(rows) / elapsed, 2) if elapsed else None,
+            'megabytes_per_second': round(total_bytes / elapsed / (1024 * 1024), 2) if elapsed else None
+        }
+    
+    def create_upload(self, user_id: int, filename: str, max_size: int,
+                      content_type: Optional[str] = None, size: Optional[int] = None) -> Dict:
+        """Hand out presigned S3 upload instructions for a new document"""
+        if size is not None and size > max_size:
+            raise ValueError("File is too large")
+        
+        # Large files go up in parallel parts; everything else is a single POST
+        if size is not None and size > self.aws_service.part_size:
+            return self.aws_service.create_presigned_multipart_upload(
+                user_id, filename, size, content_type
+            )
+        return self.aws_service.create_presigned_upload(user_id, filename, max_size, content_type)
+    
+    def complete_upload(self, user_id: int, s3_key: str, max_size: int,
+                        upload_id: Optional[str] = None,
+                        parts: Optional[List[Dict]] = None) -> Document:
+        """Create the document record once the client has uploaded to S3"""
+        if not s3_key.startswith(f"users/{user_id}/documents/"):
+            raise ValueError("Upload not found")
+        
+        # Keys are unique per upload, so completing twice (e.g. a client
+        # retry) is the only way to find one taken
+        existing = Document.query.filter_by(s3_key=s3_key, user_id=user_id).first()
+        if existing:
+            return existing
+        
+        try:
+            if upload_id:
+                self.aws_service.complete_multipart_upload(s3_key, upload_id, parts or [])
+            
+            metadata = self.aws_service.get_object_metadata(s3_key)
+            if metadata is None:
+                raise ValueError("Upload not found")
+            if metadata['size'] > max_size:
+                # Multipart part URLs can't enforce a size limit, so check it here
+                self.aws_service.delete_object(s3_key)
+                raise ValueError("File is too large")
+            
+            # The hash enables OCR reuse, as for uploads through the content store
+            content = self.content_store.hash_object(s3_key)
+            if content is None:
+                raise ValueError("Upload not found")
+            
+            return self._create_document(
+                {'s3_key': s3_key, 'content_hash': content['content_hash']},
+                user_id,
+                s3_key.rsplit('/', 1)[-1],
+                metadata['content_type']
+            )
             
         except Exception as e:
-            logger.error(f"Error processing document upload: {e}")
+            logger.error(f"Error completing document upload: {e}")
             db.session.rollback()
             raise
     
+    def _create_document(self, s3_result: Dict, user_id: int, filename: str,
+                         content_type: Optional[str]) -> Document:
+        """Create the document record for an uploaded object and queue its workflow"""
+        document = Document(
+            title=filename,
+            filename=filename,
+            s3_key=s3_result['s3_key'],
+            content_hash=s3_result.get('content_hash'),
+            content_type=content_type,
+            status='uploaded',
+            user_id=user_id
+        )
+        
+        db.session.add(document)
+        db.session.flush()
+        
+        # Trigger workflow once the document is committed
+        record_event('document_uploaded', 'document', document.id, {
+            'document_id': document.id,
+            'user_id': user_id,
+            'filename': filename
+        })
+        db.session.commit()
+        document_status_changed(document)
+        
+        # A deduplicated blob already has its previews
+        if not s3_result.get('deduplicated'):
+            self._queue_previews([document.s3_key])
+        
+        return document
+    
+    def _queue_previews(self, s3_keys: List[str]) -> None:
+        """Queue preview rendering; the preview endpoint retries any this misses"""
+        if not s3_keys:
+            return
+        try:
+            self.preview_store.enqueue(*dict.fromkeys(s3_keys))
+        except Exception as e:
+            logger.error(f"Error queueing previews: {e}")
+    
     def get_document(self, document_id: int, user_id: int) -> Optional[Document]:
         """Retrieve document details"""
         return Document.query.filter_by(
@@ -58,7 +290,213 @@ class DocumentService:
             user_id=user_id
         ).first()
     
-    def start_processing(self, document_id: int, user_id: int) -> Dict:
+    def get_document_detail(self, document_id: int, user_id: int,
+                            serialize: Callable[[Document], Dict]) -> Optional[Dict]:
+        """Serialized document details, served from the Redis cache when possible"""
+        def load() -> Optional[Dict]:
+            document = self.get_document(document_id, user_id)
+            return serialize(document) if document else None
+        
+        return document_cache.get(document_id, user_id, load)
+    
+    def list_documents(self, user_id: int, limit: int = 20, cursor: Optional[str] = None,
+                       statuses: Optional[List[str]] = None) -> Dict:
+        """List a user's documents newest first, one keyset page at a time"""
+        query = Document.query.filter(Document.user_id == user_id)
+        
+        if statuses:
+            query = query.filter(Document.status.in_(statuses))
+        
+        documents, next_cursor = self._keyset_page(query, limit, cursor)
+        return {
+            'documents': documents,
+            'next_cursor': next_cursor
+        }
+    
+    def get_dashboard(self, user_id: int, limit: int = 20, cursor: Optional[str] = None) -> Dict:
+        """A page of documents with their assignees and submission counts
+        
+        Runs a fixed number of queries per page: the documents with their
+        submission counts, their assignments, and the assigned users.
+        """
+        query = db.session.query(Document, submission_count()).filter(
+            Document.user_id == user_id
+        ).options(document_assignees())
+        
+        rows, next_cursor = self._keyset_page(query, limit, cursor, key=lambda row: row[0])
+        return {
+            'documents': [
+                {'document': document, 'submission_count': count}
+                for document, count in rows
+            ],
+            'next_cursor': next_cursor
+        }
+    
+    def _keyset_page(self, query, limit: int, cursor: Optional[str],
+                     key: Callable = lambda document: document) -> Tuple[List, Optional[str]]:
+        """Apply newest-first keyset pagination to a Document query"""
+        if cursor:
+            created_at, last_id = decode_cursor(cursor)
+            # Row comparison seeks straight into the (user_id, created_at, id) index
+            query = query.filter(
+                db.tuple_(Document.created_at, Document.id) < db.tuple_(created_at, last_id)
+            )
+        
+        # One extra row tells us whether there is a next page
+        rows = query.order_by(
+            Document.created_at.desc(),
+            Document.id.desc()
+        ).limit(limit + 1).all()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = key(rows[-1])
+            next_cursor = encode_cursor(last.created_at, last.id)
+        return rows, next_cursor
+    
+    def get_ocr_artifact(self, document_id: int, user_id: int) -> Optional[OCRArtifact]:
+        """Open a document's stored OCR results for page-at-a-time reads
+        
+        Returns None if OCR completed but the artifact isn't written yet;
+        it is queued for the search indexer instead of being built from
+        Textract inside the request.
+        """
+        document = self.get_document(document_id, user_id)
+        if not document:
+            raise ValueError("Document not found")
+        
+        artifact = self.ocr_store.open(document, build=False)
+        if artifact is None:
+            if document.ocr_status != 'completed' or not document.ocr_job_id:
+                raise ValueError("OCR results are not available")
+            self.ocr_store.request(document)
+        return artifact
+    
+    def submit_document(self, document_id: int, user_id: int, form_data: Optional[Dict],
+                        signature_data: Optional[str] = None) -> DocumentSubmission:
+        """Record a submission by the document's owner or an assignee
+        
+        The signature image goes to the signature bucket before the row is
+        written; the row keeps only its key and hash.
+        """
+        document = db.session.get(Document, document_id)
+        if not document or (document.user_id != user_id and not DocumentAssignment.query.filter_by(
+                document_id=document_id, user_id=user_id).first()):
+            raise ValueError("Document not found")
+        
+        try:
+            signature = self.signature_store.put(signature_data) if signature_data else {}
+            submission = DocumentSubmission(
+                document_id=document_id,
+                user_id=user_id,
+                form_data=form_data,
+                **signature
+            )
+            db.session.add(submission)
+            db.session.flush()
+            
+            record_event('document_submitted', 'document', document_id, {
+                'document_id': document_id,
+                'submission_id': submission.id,
+                'user_id': user_id
+            })
+            db.session.commit()
+            return submission
+            
+        except Exception as e:
+            logger.error(f"Error submitting document {document_id}: {e}")
+            db.session.rollback()
+            raise
+    
+    def get_submission(self, document_id: int, submission_id: int,
+                       user_id: int) -> Optional[DocumentSubmission]:
+        """A submission visible to the user: their own, or any on their document"""
+        return DocumentSubmission.query.join(Document).filter(
+            DocumentSubmission.id == submission_id,
+            DocumentSubmission.document_id == document_id,
+            db.or_(DocumentSubmission.user_id == user_id, Document.user_id == user_id)
+        ).first()
+    
+    def assign_users(self, document_id: int, owner_id: int, user_ids: List[int],
+                     due_date: Optional[datetime] = None) -> Dict:
+        """Assign a document to many users with a single INSERT ... SELECT
+        
+        Unknown and inactive users, and users who already have a pending
+        assignment of the document, are skipped. One event lists everyone
+        newly assigned.
+        """
+        document = self.get_document(document_id, owner_id)
+        if not document:
+            raise ValueError("Document not found")
+        
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            raise ValueError("No users given")
+        max_users = int(os.getenv('FLOWDOC_BULK_ASSIGN_MAX_USERS', 10000))
+        if len(user_ids) > max_users:
+            raise ValueError(f"At most {max_users} users can be assigned at once")
+        if due_date is not None and due_date <= datetime.utcnow():
+            # The overdue scanner only looks ahead of its watermark
+            raise ValueError("due_date must be in the future")
+        
+        started = time.perf_counter()
+        already_assigned = db.exists().where(
+            DocumentAssignment.document_id == document_id,
+            DocumentAssignment.user_id == User.id,
+            DocumentAssignment.status == 'pending'
+        )
+        candidates = db.select(
+            db.literal(document_id),
+            User.id,
+            db.literal(datetime.utcnow()),
+            db.literal(due_date, DocumentAssignment.due_date.type),
+            db.literal('pending')
+        ).where(
+            User.id.in_(user_ids),
+            User.active.is_(True),
+            ~already_assigned
+        )
+        
+        try:
+            assigned = db.session.execute(
+                db.insert(DocumentAssignment).from_select(
+                    ['document_id', 'user_id', 'assigned_at', 'due_date', 'status'],
+                    candidates
+                ).returning(DocumentAssignment.user_id)
+            ).scalars().all()
+            
+            if assigned:
+                # INSERT ... SELECT bypasses the flush hook that maintains the status counters
+                counters.increment(Counter(('assignments', user_id, 'pending') for user_id in assigned))
+                record_event('document_assigned', 'document', document_id, {
+                    'document_id': document_id,
+                    'assigned_by': owner_id,
+                    'user_ids': assigned,
+                    'due_date': due_date.isoformat() if due_date else None
+                })
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Error assigning document {document_id}: {e}")
+            db.session.rollback()
+            raise
+        
+        document_cache.invalidate(document_id)
+        return {
+            'document_id': document_id,
+            'requested': len(user_ids),
+            'assigned': len(assigned),
+            'skipped': len(user_ids) - len(assigned),
+            'elapsed_seconds': round(time.perf_counter() - started, 3)
+        }
+    
+    def search_documents(self, user_id: int, query: str, limit: int = 20,
+                         offset: int = 0) -> Dict:
+        """Full-text search over the OCR text of a user's documents"""
+        return self.search_indexer.search(user_id, query, limit, offset)
+    
+    def start_processing(self, document_id: int, user_id: int,
+                         priority: str = 'interactive') -> Dict:
         """Start document processing workflow"""
         document = self.get_document(document_id, user_id)
         if not document:
@@ -67,17 +505,28 @@ class DocumentService:
         try:
             # Start OCR if enabled
             if os.getenv('FLOWDOC_ENABLE_OCR', 'true').lower() == 'true':
-                ocr_result = self.aws_service.start_textract_job(
-                    document.s3_key,
-                    document_id
-                )
-                document.ocr_status = 'processing'
+                ocr_result = self._reuse_ocr(document)
+                if ocr_result is None:
+                    # The OCR scheduler submits the Textract job outside the request
+                    ocr_result = {'status': 'QUEUED', 'priority': priority}
+                    document.ocr_status = 'queued'
             else:
                 ocr_result = {'status': 'disabled'}
                 document.ocr_status = 'skipped'
             
             document.status = 'processing'
             db.session.commit()
+            document_status_changed(document)
+            
+            # Enqueue only after the commit, so the scheduler can't update the row first
+            if document.ocr_status == 'queued':
+                try:
+                    self.ocr_scheduler.enqueue(document_id, document.s3_key, priority)
+                except Exception:
+                    document.ocr_status = 'failed'
+                    db.session.commit()
+                    document_status_changed(document)
+                    raise
             
             return {
                 'document_id': document_id,
@@ -89,4 +538,59 @@ class DocumentService:
         except Exception as e:
             logger.error(f"Error starting document processing: {e}")
             db.session.rollback()
-            raise
\ No newline at end of file
+            raise
+    
+    def _reuse_batch_ocr(self, rows: List[Dict]) -> None:
+        """Batch version of _reuse_ocr: one query for every content hash in the batch"""
+        hashes = {row['content_hash'] for row in rows}
+        sources = Document.query.filter(
+            Document.content_hash.in_(hashes),
+            Document.ocr_job_id.isnot(None),
+            Document.ocr_status.in_(('completed', 'processing'))
+        ).order_by(
+            db.case((Document.ocr_status == 'completed', 0), else_=1),
+            Document.id.desc()
+        ).all()
+        
+        reusable = {}
+        for source in sources:
+            reusable.setdefault(source.content_hash, source)
+        
+        for row in rows:
+            source = reusable.get(row['content_hash'])
+            if source is not None:
+                row.update(
+                    ocr_job_id=source.ocr_job_id,
+                    ocr_status=source.ocr_status,
+                    ocr_confidence=source.ocr_confidence,
+                    form_schema=source.form_schema
+                )
+    
+    def _reuse_ocr(self, document: Document) -> Optional[Dict]:
+        """Share the Textract job of an identical, already-processed document"""
+        if not document.content_hash:
+            return None
+        
+        source = Document.query.filter(
+            Document.content_hash == document.content_hash,
+            Document.id != document.id,
+            Document.ocr_job_id.isnot(None),
+            Document.ocr_status.in_(('completed', 'processing'))
+        ).order_by(
+            db.case((Document.ocr_status == 'completed', 0), else_=1),
+            Document.id.desc()
+        ).first()
+        if not source:
+            return None
+        
+        # A running job is joined too; its completion updates every document with that job id
+        document.ocr_job_id = source.ocr_job_id
+        document.ocr_status = source.ocr_status
+        document.ocr_confidence = source.ocr_confidence
+        document.form_schema = source.form_schema
+        
+        return {
+            'job_id': source.ocr_job_id,
+            'status': 'SUCCEEDED' if source.ocr_status == 'completed' else 'IN_PROGRESS',
+            'reused_from': source.id
+        }
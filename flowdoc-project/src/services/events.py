@@ -0,0 +1,151 @@
+"""
+Flowdoc Document Events
+"""
+from typing import Dict, Iterator, List, Set
+from collections import defaultdict
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from flask import current_app
+from redis.exceptions import RedisError
+from src.models.models import Document
+from src.services.cache import document_cache
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'flowdoc:events:user'
+
+def channel(user_id) -> str:
+    """Pub/sub channel carrying one user's document events"""
+    return f"{CHANNEL_PREFIX}:{user_id}"
+
+def publish(user_id, event: Dict) -> None:
+    """Publish an event to a user's open event streams"""
+    try:
+        current_app.redis.publish(channel(user_id), json.dumps(event, separators=(',', ':')))
+    except RedisError as e:
+        # Clients still see the change on their next poll
+        logger.warning(f"Could not publish event for user {user_id}: {e}")
+
+def document_status_changed(document: Document) -> None:
+    """Call after committing a status or ocr_status change"""
+    document_cache.invalidate(document.id)
+    publish(document.user_id, {
+        'type': 'document.status',
+        'document_id': document.id,
+        'status': document.status,
+        'ocr_status': document.ocr_status
+    })
+
+def documents_status_changed(user_id, documents: List[Dict]) -> None:
+    """Publish status events for many of a user's documents in one round-trip
+
+    ``documents`` are dicts with ``id``, ``status`` and ``ocr_status``.
+    """
+    if not documents:
+        return
+    document_cache.invalidate(*(document['id'] for document in documents))
+    try:
+        pipe = current_app.redis.pipeline(transaction=False)
+        for document in documents:
+            pipe.publish(channel(user_id), json.dumps({
+                'type': 'document.status',
+                'document_id': document['id'],
+                'status': document['status'],
+                'ocr_status': document['ocr_status']
+            }, separators=(',', ':')))
+        pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Could not publish events for user {user_id}: {e}")
+
+class EventHub:
+    """Fans one Redis subscription per process out to local listeners
+
+    Each open stream waits on an in-process queue instead of holding its
+    own Redis connection. Run on gevent workers so a waiting stream costs
+    a greenlet, not a thread.
+    """
+
+    def __init__(self):
+        self._listeners: Dict[str, Set[queue.Queue]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.queue_size = int(os.getenv('FLOWDOC_EVENTS_QUEUE_SIZE', 100))
+
+    def listen(self, redis_client, user_id) -> queue.Queue:
+        """Register a listener for a user's events"""
+        listener: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._listeners[str(user_id)].add(listener)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    args=(redis_client,),
+                    name='flowdoc-event-hub',
+                    daemon=True
+                )
+                self._thread.start()
+        return listener
+
+    def unlisten(self, user_id, listener: queue.Queue) -> None:
+        with self._lock:
+            listeners = self._listeners.get(str(user_id))
+            if listeners is not None:
+                listeners.discard(listener)
+                if not listeners:
+                    del self._listeners[str(user_id)]
+
+    def listener_count(self) -> int:
+        with self._lock:
+            return sum(len(listeners) for listeners in self._listeners.values())
+
+    def _run(self, redis_client) -> None:
+        while True:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.psubscribe(f"{CHANNEL_PREFIX}:*")
+                for message in pubsub.listen():
+                    if message['type'] == 'pmessage':
+                        self._deliver(message['channel'].rsplit(':', 1)[-1], message['data'])
+            except RedisError as e:
+                logger.warning(f"Event subscription lost, reconnecting: {e}")
+                time.sleep(1)
+            finally:
+                pubsub.close()
+
+    def _deliver(self, user_id: str, data: str) -> None:
+        with self._lock:
+            listeners = list(self._listeners.get(user_id, ()))
+        for listener in listeners:
+            try:
+                listener.put_nowait(data)
+            except queue.Full:
+                # A stalled client misses events rather than growing memory
+                pass
+
+event_hub = EventHub()
+
+def stream(user_id, heartbeat: float = 15.0) -> Iterator[str]:
+    """Server-sent event stream of a user's document events"""
+    redis_client = current_app.redis
+
+    def generate() -> Iterator[str]:
+        listener = event_hub.listen(redis_client, user_id)
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    data = listener.get(timeout=heartbeat)
+                except queue.Empty:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ': keep-alive\n\n'
+                    continue
+                event_type = json.loads(data).get('type', 'message')
+                yield f"event: {event_type}\ndata: {data}\n\n"
+        finally:
+            event_hub.unlisten(user_id, listener)
+
+    return generate()
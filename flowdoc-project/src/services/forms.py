@@ -0,0 +1,259 @@
+"""
+Flowdoc Form Extraction
+"""
+from typing import Dict, List, Optional, Tuple
+import logging
+import math
+import re
+import time
+import numpy as np
+from src.services.ocr_store import OCRPage, OCRStore
+from src.services.textract import TextractBlock
+from src.models.models import Document, db
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+
+# "Label: value" on one line; the space after the colon rules out times and URLs
+INLINE_FIELD = re.compile(r'^([A-Za-z][^:]{0,39}?)\s*:\s+(\S.*)$')
+SLUG = re.compile(r'[^a-z0-9]+')
+
+def _field_name(label: str, taken: Dict[str, int]) -> str:
+    base = SLUG.sub('_', label.lower()).strip('_') or 'field'
+    taken[base] = taken.get(base, 0) + 1
+    return base if taken[base] == 1 else f"{base}_{taken[base]}"
+
+def _first_per_group(groups: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """Positions of the lowest score in each group"""
+    order = np.lexsort((scores, groups))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = groups[order][1:] != groups[order][:-1]
+    return order[first]
+
+class FormExtractor:
+    """Pairs form labels with their values using LINE block geometry
+
+    A label is a line ending in a colon; its value is the nearest line to
+    its right on the same row or, failing that, the nearest line just
+    below that overlaps it horizontally. Lines reading "Label: value" are
+    fields on their own.
+
+    Pages are added one at a time and the pairing runs once over the whole
+    document with NumPy. Lines are bucketed into a grid of rows two line
+    heights tall, so each label is only compared with the lines in its own
+    and adjacent rows: the work grows with the number of lines, not with
+    lines times labels as a pairwise search would.
+    """
+
+    def __init__(self, max_gap: float = 0.5, below_gap: float = 1.5, tolerance: float = 0.005):
+        self.max_gap = max_gap  # page widths between a label and a value to its right
+        self.below_gap = below_gap  # label heights between a label and a value below it
+        self.tolerance = tolerance  # page fractions of overlap still counted as adjacent
+        self._columns: List[Tuple[np.ndarray, ...]] = []
+        self._texts: List[str] = []
+        self._inline_columns: List[Tuple[np.ndarray, ...]] = []
+        self._inline_labels: List[str] = []
+        self._inline_values: List[str] = []
+
+    def add_page(self, page_number: int, blocks: List[TextractBlock]) -> None:
+        lines = [block for block in blocks if block.block_type == 'LINE' and block.text]
+        self._add(
+            page_number,
+            [block.text for block in lines],
+            np.fromiter((block.confidence or 0.0 for block in lines), np.float32, len(lines)),
+            np.fromiter((block.left for block in lines), np.float32, len(lines)),
+            np.fromiter((block.top for block in lines), np.float32, len(lines)),
+            np.fromiter((block.width for block in lines), np.float32, len(lines)),
+            np.fromiter((block.height for block in lines), np.float32, len(lines))
+        )
+
+    def add_ocr_page(self, page: OCRPage) -> None:
+        """Add a page read from an OCR artifact, straight from its float32 columns"""
+        lines = np.array([
+            block_type == 'LINE' and bool(text)
+            for block_type, text in zip(page.block_types, page.texts)
+        ], dtype=bool)
+        columns = [
+            np.frombuffer(column, dtype=np.float32)[lines] if len(page) else np.empty(0, np.float32)
+            for column in (page.confidence, page.left, page.top, page.width, page.height)
+        ]
+        self._add(page.page_number, [text for text, line in zip(page.texts, lines) if line], *columns)
+
+    def _add(self, page_number: int, texts: List[str], confidence: np.ndarray, left: np.ndarray,
+             top: np.ndarray, width: np.ndarray, height: np.ndarray) -> None:
+        if not texts:
+            return
+
+        inline = np.zeros(len(texts), dtype=bool)
+        for i, text in enumerate(texts):
+            match = INLINE_FIELD.match(text.strip())
+            if match:
+                inline[i] = True
+                self._inline_labels.append(match.group(1).strip())
+                self._inline_values.append(match.group(2).strip())
+
+        page = np.full(len(texts), page_number, dtype=np.int64)
+        columns = (page, confidence, left, top, width, height)
+        if inline.any():
+            self._inline_columns.append(tuple(column[inline] for column in columns))
+        self._texts.extend(text for text, is_inline in zip(texts, inline) if not is_inline)
+        self._columns.append(tuple(column[~inline] for column in columns))
+
+    def result(self) -> Dict:
+        """The document's form_schema: fields in reading order and their mean confidence"""
+        paired_labels, paired_values, paired_columns = self._pair()
+        labels = self._inline_labels + paired_labels
+        values = self._inline_values + paired_values
+        if not labels:
+            return {'version': SCHEMA_VERSION, 'confidence': None, 'fields': []}
+
+        page, confidence, left, top, width, height = (
+            np.concatenate(column) for column in zip(*self._inline_columns, paired_columns)
+        )
+        order = np.lexsort((left, top, page))
+        confidence = np.round(confidence.astype(np.float64), 2)
+        boxes = np.round(np.column_stack((left, top, width, height)).astype(np.float64), 4)
+
+        taken: Dict[str, int] = {}
+        fields = [
+            {
+                'name': _field_name(labels[i], taken),
+                'label': labels[i],
+                'value': values[i],
+                'page': field_page,
+                'confidence': field_confidence,
+                'bbox': box
+            }
+            for i, field_page, field_confidence, box in zip(
+                order.tolist(), page[order].tolist(), confidence[order].tolist(), boxes[order].tolist()
+            )
+        ]
+        return {
+            'version': SCHEMA_VERSION,
+            'confidence': round(float(confidence.mean()), 2),
+            'fields': fields
+        }
+
+    def _pair(self) -> Tuple[List[str], List[str], Tuple[np.ndarray, ...]]:
+        """Labels, values and value geometry (page, confidence, left, top, width, height) of each pair"""
+        empty = ([], [], tuple(np.empty(0, dtype) for dtype in (np.int64,) + (np.float32,) * 5))
+        if not self._texts:
+            return empty
+        page, confidence, left, top, width, height = (np.concatenate(column) for column in zip(*self._columns))
+        texts = self._texts
+        is_label = np.fromiter((text.rstrip().endswith(':') for text in texts), bool, len(texts))
+        labels = np.flatnonzero(is_label)
+        if not len(labels):
+            return empty
+
+        right = left + width
+        bottom = top + height
+        middle = top + height / 2
+
+        # Grid rows two median line heights tall, numbered across the whole document
+        row_height = max(float(np.median(height)) * 2, 1e-3)
+        rows_per_page = math.ceil(1 / row_height) + 1
+        cells = page * rows_per_page + np.floor(np.clip(middle, 0, 1) / row_height).astype(np.int64)
+        order = np.argsort(cells, kind='stable')
+        sorted_cells = cells[order]
+
+        # Candidates for each label: every line in its row, the row above and two below
+        starts = np.searchsorted(sorted_cells, cells[labels] - 1, 'left')
+        ends = np.searchsorted(sorted_cells, cells[labels] + 3, 'left')
+        counts = ends - starts
+        label_of = np.repeat(labels, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        candidate = order[np.repeat(starts, counts) + offsets]
+        keep = candidate != label_of
+        label_of, candidate = label_of[keep], candidate[keep]
+
+        tolerance = self.tolerance
+        heights = np.maximum(height[label_of], height[candidate])
+        gap = left[candidate] - right[label_of]
+        same_row = np.abs(middle[candidate] - middle[label_of]) <= heights / 2
+        beside = same_row & (gap >= -tolerance) & (gap <= self.max_gap)
+
+        drop = top[candidate] - bottom[label_of]
+        overlaps = (left[candidate] < right[label_of] + tolerance) & (right[candidate] > left[label_of] - tolerance)
+        below = ~same_row & overlaps & (drop >= -tolerance) & (drop <= self.below_gap * height[label_of])
+
+        # Nearest line in each direction; a label there means this label has no value that way.
+        # Beside is applied last, so it wins over below.
+        value_of = np.full(len(texts), -1, dtype=np.int64)
+        score_of = np.zeros(len(texts), dtype=np.float32)
+        for mask, distance, penalty in ((below, drop, 1.0), (beside, gap, 0.0)):
+            best = _first_per_group(label_of[mask], distance[mask])
+            nearest_label = label_of[mask][best]
+            nearest = candidate[mask][best]
+            found = ~is_label[nearest]
+            value_of[nearest_label[found]] = nearest[found]
+            score_of[nearest_label[found]] = distance[mask][best][found] + penalty
+
+        # A value claimed by two labels goes to the closer one
+        paired = np.flatnonzero(value_of >= 0)
+        paired = paired[_first_per_group(value_of[paired], score_of[paired])]
+        values = value_of[paired]
+
+        return (
+            [texts[i].rstrip().rstrip(':').strip() for i in paired.tolist()],
+            [texts[i].strip() for i in values.tolist()],
+            (page[values], np.minimum(confidence[paired], confidence[values]),
+             left[values], top[values], width[values], height[values])
+        )
+
+def backfill(ocr_store: Optional[OCRStore] = None, batch_size: int = 100) -> Dict:
+    """Extract form_schema for completed documents that have none, from their OCR artifacts
+
+    Documents sharing a Textract job share the extraction; each batch is
+    written with one bulk UPDATE by primary key.
+    """
+    ocr_store = ocr_store or OCRStore()
+    started = time.perf_counter()
+    extracted = failed = 0
+    last_id = 0
+    while True:
+        documents = Document.query.filter(
+            Document.id > last_id,
+            Document.ocr_status == 'completed',
+            Document.ocr_job_id.isnot(None),
+            # A JSON null, not SQL NULL, when copied from a document without one
+            db.or_(Document.form_schema.is_(None), db.cast(Document.form_schema, db.Text) == 'null')
+        ).order_by(Document.id).limit(batch_size).all()
+        if not documents:
+            break
+        last_id = documents[-1].id
+
+        schemas: Dict[str, Dict] = {}
+        updates = []
+        for document in documents:
+            try:
+                if document.ocr_job_id not in schemas:
+                    artifact = ocr_store.open(document)
+                    if artifact is None:
+                        raise ValueError("no OCR artifact")
+                    extractor = FormExtractor()
+                    for ocr_page in artifact.iter_pages():
+                        extractor.add_ocr_page(ocr_page)
+                    schemas[document.ocr_job_id] = extractor.result()
+                updates.append({'id': document.id, 'form_schema': schemas[document.ocr_job_id]})
+            except Exception as e:
+                logger.error(f"Error extracting form fields of document {document.id}: {e}")
+                failed += 1
+
+        try:
+            if updates:
+                db.session.execute(db.update(Document), updates)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Error recording form schemas: {e}")
+            db.session.rollback()
+            raise
+        extracted += len(updates)
+        logger.info(f"Extracted form fields of {extracted} documents ({failed} failed)")
+
+    return {
+        'extracted': extracted,
+        'failed': failed,
+        'elapsed_seconds': round(time.perf_counter() - started, 3)
+    }
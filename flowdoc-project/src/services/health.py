@@ -0,0 +1,151 @@
+"""
+Flowdoc Health Checks
+"""
+from typing import Callable, Dict, Optional
+import logging
+import os
+import threading
+import time
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+class HealthChecker:
+    """Cached dependency probes and connection warm-up for one worker process
+
+    Probes run at most once per ``ttl`` seconds, and never concurrently:
+    a request arriving while a probe is in flight gets the previous
+    result, so however often Kubernetes (or anything else) polls, each
+    dependency sees at most one probe per worker per ``ttl``.
+
+    The worker isn't ready until its warm-up has opened the database and
+    Redis connections and built the boto3 clients a request will need,
+    so the first requests routed to it don't pay for connecting.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, warm_connections: Optional[int] = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv('FLOWDOC_HEALTH_CACHE_TTL', 5))
+        self.warm_connections = warm_connections or int(os.getenv('FLOWDOC_HEALTH_WARM_CONNECTIONS', 5))
+        self._reset()
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._probe_lock = threading.Lock()
+        self._results: Optional[Dict] = None
+        self._checked_at = 0.0
+        self._warm_up_thread: Optional[threading.Thread] = None
+        self._warm_up_error: Optional[str] = None
+        self.warmed = False
+
+    def probes(self, app) -> Dict[str, Callable[[], None]]:
+        """Dependency name -> check that raises if it is unreachable"""
+        from src import db
+        from src.services.clients import get_client
+
+        def postgres() -> None:
+            with db.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+
+        def redis() -> None:
+            app.redis.ping()
+
+        def s3() -> None:
+            get_client('s3').head_bucket(Bucket=app.config['S3_BUCKET'])
+
+        return {'postgres': postgres, 'redis': redis, 's3': s3}
+
+    def check(self, app) -> Dict:
+        """Latest probe results, refreshed if older than ``ttl``; needs an app context"""
+        self._check_pid()
+        if self._results is not None and time.monotonic() - self._checked_at < self.ttl:
+            return self._results
+
+        if not self._probe_lock.acquire(blocking=False):
+            # Another request is probing; don't add a second probe
+            return self._results or {'ok': False, 'checks': {}, 'pending': True}
+        try:
+            checks = {}
+            for name, probe in self.probes(app).items():
+                started = time.perf_counter()
+                try:
+                    probe()
+                    checks[name] = {'ok': True}
+                except Exception as e:
+                    logger.warning(f"Health check {name} failed: {e}")
+                    checks[name] = {'ok': False, 'error': str(e)}
+                checks[name]['latency_ms'] = round((time.perf_counter() - started) * 1000, 2)
+
+            self._results = {'ok': all(check['ok'] for check in checks.values()), 'checks': checks}
+            self._checked_at = time.monotonic()
+            return self._results
+        finally:
+            self._probe_lock.release()
+
+    def readiness(self, app) -> Dict:
+        """Ready once warmed up and every dependency answers"""
+        self.start_warm_up(app)
+        report = dict(self.check(app), warmed=self.warmed)
+        if self._warm_up_error:
+            report['warm_up_error'] = self._warm_up_error
+        report['ok'] = report['ok'] and self.warmed
+        return report
+
+    def start_warm_up(self, app) -> None:
+        """Warm this worker's connections in the background, once per process
+
+        gunicorn starts this as each worker boots (see gunicorn.conf.py);
+        under any other server the first readiness probe starts it.
+        """
+        self._check_pid()
+        if self.warmed or (self._warm_up_thread and self._warm_up_thread.is_alive()):
+            return
+        self._warm_up_thread = threading.Thread(
+            target=self._warm_up, args=(app,), name='flowdoc-warm-up', daemon=True
+        )
+        self._warm_up_thread.start()
+
+    def _warm_up(self, app) -> None:
+        from src import db
+        from src.services.clients import get_client
+
+        started = time.perf_counter()
+        try:
+            with app.app_context():
+                # Open the connections together so the pool holds that many
+                pool_size = getattr(db.engine.pool, 'size', lambda: self.warm_connections)()
+                connections = [db.engine.connect() for _ in range(min(self.warm_connections, pool_size))]
+                try:
+                    for connection in connections:
+                        connection.execute(text("SELECT 1"))
+                finally:
+                    for connection in connections:
+                        connection.close()
+
+                pool = app.redis.connection_pool
+                redis_connections = [pool.get_connection('PING') for _ in range(self.warm_connections)]
+                try:
+                    for connection in redis_connections:
+                        connection.connect()
+                finally:
+                    for connection in redis_connections:
+                        pool.release(connection)
+
+                # Builds the shared clients and opens a TLS connection to S3
+                for service_name in ('s3', 'textract', 'lambda'):
+                    get_client(service_name)
+                get_client('s3').head_bucket(Bucket=app.config['S3_BUCKET'])
+
+            self.warmed = True
+            self._warm_up_error = None
+            logger.info(f"Worker {os.getpid()} warmed up in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            # The next readiness probe starts another attempt
+            logger.warning(f"Worker warm-up failed: {e}")
+            self._warm_up_error = str(e)
+
+    def _check_pid(self) -> None:
+        # Connections and threads don't survive a fork
+        if self._pid != os.getpid():
+            self._reset()
+
+health_checker = HealthChecker()
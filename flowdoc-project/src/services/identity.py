@@ -0,0 +1,177 @@
+"""
+Flowdoc Identity Cache
+"""
+from typing import NamedTuple, Optional, Set
+from collections import OrderedDict
+import json
+import logging
+import os
+import threading
+import time
+from flask import current_app
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from src.models.models import User, db
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'flowdoc:identity:invalidate'
+
+class Principal(NamedTuple):
+    """What authorization needs to know about the user behind a token"""
+    id: int
+    role: str
+    active: bool
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == 'admin'
+
+class IdentityCache:
+    """Two-tier cache resolving a JWT subject to its Principal
+
+    Lookups go to a small in-process LRU first, then Redis, then the
+    users table (three columns by primary key), filling the tiers on the
+    way back. Local entries live for ``local_ttl`` seconds; a change to a
+    user is published so every process drops its copy straight away, and
+    the TTL only bounds staleness if that message is lost.
+    """
+
+    KEY_PREFIX = 'flowdoc:principal'
+
+    def __init__(self, redis_client=None):
+        self._redis = redis_client
+        self.ttl = int(os.getenv('FLOWDOC_IDENTITY_CACHE_TTL', 300))
+        self.local_ttl = float(os.getenv('FLOWDOC_IDENTITY_LOCAL_TTL', 30))
+        self.local_size = int(os.getenv('FLOWDOC_IDENTITY_LOCAL_SIZE', 10000))
+        self._local: 'OrderedDict[int, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def redis(self):
+        return self._redis if self._redis is not None else current_app.redis
+
+    def key(self, user_id: int) -> str:
+        return f"{self.KEY_PREFIX}:{user_id}"
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        """The user's Principal, or None if there is no such user"""
+        user_id = int(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._local.move_to_end(user_id)
+                return entry[0]
+
+        self._subscribe()
+        principal = self._get_shared(user_id)
+        if principal is not None:
+            with self._lock:
+                self._local[user_id] = (principal, now + self.local_ttl)
+                self._local.move_to_end(user_id)
+                while len(self._local) > self.local_size:
+                    self._local.popitem(last=False)
+        return principal
+
+    def _get_shared(self, user_id: int) -> Optional[Principal]:
+        try:
+            raw = self.redis.get(self.key(user_id))
+            if raw is not None:
+                return Principal(*json.loads(raw))
+        except RedisError as e:
+            logger.warning(f"Identity cache unavailable: {e}")
+            return self._load(user_id)
+
+        principal = self._load(user_id)
+        if principal is not None:
+            try:
+                self.redis.set(self.key(user_id), json.dumps(list(principal)), ex=self.ttl)
+            except RedisError as e:
+                logger.warning(f"Could not cache principal {user_id}: {e}")
+        return principal
+
+    @staticmethod
+    def _load(user_id: int) -> Optional[Principal]:
+        row = db.session.query(User.id, User.role, User.active).filter(User.id == user_id).first()
+        if row is None:
+            return None
+        # NULL active predates the column default; treat it like the default
+        return Principal(row.id, row.role, row.active is not False)
+
+    def invalidate(self, *user_ids: int) -> None:
+        """Drop users from every process's cache, e.g. after a role change is committed"""
+        if not user_ids:
+            return
+        self._drop(user_ids)
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.delete(*(self.key(user_id) for user_id in user_ids))
+            pipe.publish(INVALIDATION_CHANNEL, json.dumps(list(user_ids)))
+            pipe.execute()
+        except RedisError as e:
+            # Other processes catch up within local_ttl, Redis within ttl
+            logger.warning(f"Could not invalidate principals {user_ids}: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._local.clear()
+
+    def _drop(self, user_ids) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._local.pop(int(user_id), None)
+
+    def _subscribe(self) -> None:
+        """Start this process's invalidation listener, once"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._listen,
+                    args=(self.redis,),
+                    name='flowdoc-identity-invalidation',
+                    daemon=True
+                )
+                self._thread.start()
+
+    def _listen(self, redis_client) -> None:
+        while True:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Whatever changed while we weren't listening is unknown
+                self.clear()
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self._drop(json.loads(message['data']))
+            except RedisError as e:
+                logger.warning(f"Identity invalidation subscription lost, reconnecting: {e}")
+                time.sleep(1)
+            finally:
+                pubsub.close()
+
+identity_cache = IdentityCache()
+
+def _after_flush(session, flush_context) -> None:
+    changed: Set[int] = session.info.setdefault('changed_principals', set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            changed.add(obj.id)
+
+def _after_commit(session) -> None:
+    changed = session.info.pop('changed_principals', None)
+    if changed:
+        identity_cache.invalidate(*changed)
+
+def _after_rollback(session) -> None:
+    session.info.pop('changed_principals', None)
+
+def register_identity_events(session) -> None:
+    """Invalidate cached principals whenever a user row is updated or deleted"""
+    if not event.contains(session, 'after_flush', _after_flush):
+        event.listen(session, 'after_flush', _after_flush)
+        event.listen(session, 'after_commit', _after_commit)
+        event.listen(session, 'after_rollback', _after_rollback)
@@ -0,0 +1,345 @@
+"""
+Flowdoc OCR Completions
+"""
+from typing import Dict, List, Optional, Set, Tuple
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import json
+import logging
+import multiprocessing
+import os
+import time
+from src.services.aws import AWSService
+from src.services.events import documents_status_changed
+from src.services.forms import FormExtractor
+from src.services.ocr_store import OCRStore
+from src.services.scheduler import OCRScheduler
+from src.services.search import page_text
+from src.models.models import Document, DocumentPage, db
+
+logger = logging.getLogger(__name__)
+
+SUCCEEDED = ('SUCCEEDED', 'PARTIAL_SUCCESS')
+
+def parse_notification(body: str) -> Optional[Dict]:
+    """Job id and status of a Textract completion notification
+
+    Accepts the SNS envelope SQS receives from the topic, or the bare
+    Textract message when the subscription uses raw message delivery.
+    """
+    try:
+        message = json.loads(body)
+        if message.get('Type') == 'Notification':
+            message = json.loads(message['Message'])
+        return {'job_id': message['JobId'], 'status': message['Status']}
+    except (ValueError, KeyError, TypeError):
+        return None
+
+class SQSCompletionQueue:
+    """Textract completion notifications from the SQS queue subscribed to SNS_TOPIC_ARN"""
+
+    def __init__(self, queue_url: Optional[str] = None, aws_service: Optional[AWSService] = None):
+        self.queue_url = queue_url or os.getenv('FLOWDOC_OCR_COMPLETION_QUEUE_URL')
+        self.wait_seconds = int(os.getenv('FLOWDOC_OCR_COMPLETION_WAIT_SECONDS', 20))
+        self._aws_service = aws_service
+        if not self.queue_url:
+            raise ValueError("FLOWDOC_OCR_COMPLETION_QUEUE_URL is not set")
+
+    @property
+    def aws_service(self) -> AWSService:
+        if self._aws_service is None:
+            self._aws_service = AWSService()
+        return self._aws_service
+
+    def receive(self, max_messages: int) -> List[Dict]:
+        """Up to ``max_messages`` notifications, waiting only for the first one
+
+        Each is a dict with ``job_id``, ``status`` (None if unreadable),
+        ``receipt`` and ``attempts``.
+        """
+        notifications = []
+        wait_seconds = self.wait_seconds
+        while len(notifications) < max_messages:
+            messages = self.aws_service.receive_messages(
+                self.queue_url, max_messages - len(notifications), wait_seconds
+            )
+            if not messages:
+                break
+            for message in messages:
+                notification = parse_notification(message['Body']) or {'job_id': None, 'status': None}
+                notification['receipt'] = message['ReceiptHandle']
+                notification['attempts'] = int(message.get('Attributes', {}).get('ApproximateReceiveCount', 1))
+                notifications.append(notification)
+            wait_seconds = 0
+        return notifications
+
+    def delete(self, receipts: List[str]) -> None:
+        if receipts:
+            self.aws_service.delete_messages(self.queue_url, receipts)
+
+# One store per pool process, built on its first job
+_ocr_store: Optional[OCRStore] = None
+
+def process_job(job_id: str, artifact_keys: List[str]) -> Dict:
+    """Parse a finished Textract job in a pool process
+
+    Fetches the results, writes the OCR artifact and extracts each page's
+    search text, the mean LINE confidence and the form fields in one
+    pass, returning only that summary to the consumer.
+    """
+    global _ocr_store
+    if _ocr_store is None:
+        _ocr_store = OCRStore()
+
+    pages = []
+    confidence_total = 0.0
+    confidence_count = 0
+    forms = FormExtractor()
+
+    def on_page(page_number, blocks):
+        nonlocal confidence_total, confidence_count
+        forms.add_page(page_number, blocks)
+        text = page_text(blocks)
+        if text:
+            pages.append((page_number, text))
+        for block in blocks:
+            if block.block_type == 'LINE':
+                confidence_total += block.confidence or 0.0
+                confidence_count += 1
+
+    artifact = _ocr_store.write_job(job_id, artifact_keys, on_page)
+    return {
+        'job_id': job_id,
+        'pages': pages,
+        'confidence': confidence_total / confidence_count if confidence_count else None,
+        'form_schema': forms.result(),
+        'artifact': artifact
+    }
+
+class OCRCompletionConsumer:
+    """Applies Textract completions to documents (``flask ocr-completions``)
+
+    Notifications are read in batches. Results of succeeded jobs are
+    fetched, parsed and stored as OCR artifacts in a process pool, one
+    job per process at a time, so throughput grows with the number of
+    cores; the consumer itself only does the database work, writing a
+    whole batch's status changes with an executemany UPDATE per outcome
+    and its page text with batched INSERTs in a single transaction.
+
+    A notification is deleted only after its batch commits. Jobs whose
+    results can't be fetched yet, or whose documents aren't marked
+    submitted yet, are left on the queue to be received again.
+    """
+
+    def __init__(self, queue=None, workers: Optional[int] = None):
+        self._queue = queue
+        self.workers = workers or int(os.getenv('FLOWDOC_OCR_COMPLETION_WORKERS', 0)) or os.cpu_count() or 1
+        self.batch_size = int(os.getenv('FLOWDOC_OCR_COMPLETION_BATCH_SIZE', 50))
+        self.max_attempts = int(os.getenv('FLOWDOC_OCR_COMPLETION_MAX_ATTEMPTS', 5))
+        self.page_batch_size = int(os.getenv('FLOWDOC_SEARCH_BATCH_SIZE', 500))
+        self.scheduler = OCRScheduler()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def queue(self):
+        if self._queue is None:
+            self._queue = SQSCompletionQueue()
+        return self._queue
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking would copy this process's DB and Redis connections
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._pool
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def process_batch(self) -> int:
+        """Receive and apply one batch of notifications; returns how many were received"""
+        notifications = self.queue.receive(self.batch_size)
+        if not notifications:
+            return 0
+
+        # SNS can deliver a notification more than once
+        by_job: Dict[str, List[Dict]] = defaultdict(list)
+        unreadable = []
+        for notification in notifications:
+            if notification['job_id'] is None:
+                unreadable.append(notification['receipt'])
+            else:
+                by_job[notification['job_id']].append(notification)
+        if unreadable:
+            logger.error(f"Dropping {len(unreadable)} unreadable OCR completion notifications")
+
+        documents: Dict[str, List] = defaultdict(list)
+        known = set()
+        for row in db.session.query(
+            Document.id, Document.user_id, Document.s3_key, Document.status,
+            Document.ocr_job_id, Document.ocr_status
+        ).filter(Document.ocr_job_id.in_(list(by_job))):
+            known.add(row.ocr_job_id)
+            # Documents already completed or failed saw this job's notification before
+            if row.ocr_status == 'processing':
+                documents[row.ocr_job_id].append(row)
+        # The rows are plain tuples; don't sit idle in a transaction while
+        # the jobs run, or leave one open when there is nothing to apply
+        db.session.rollback()
+
+        retry = set()
+        for job_id, job_notifications in by_job.items():
+            # The scheduler commits the job id just after Textract accepts the job
+            if job_id not in known and self._attempts(job_notifications) < self.max_attempts:
+                retry.add(job_id)
+
+        succeeded = [
+            job_id for job_id in documents
+            if by_job[job_id][0]['status'] in SUCCEEDED
+        ]
+        results, failed, not_ready = self._run_jobs(succeeded, documents, by_job)
+        retry.update(not_ready)
+        failed.update(
+            job_id for job_id in documents
+            if by_job[job_id][0]['status'] not in SUCCEEDED
+        )
+
+        changed = self._apply(results, failed, documents)
+
+        finished = [job_id for job_id in by_job if job_id not in retry]
+        self.scheduler.release(*finished)
+        for user_id, user_documents in changed.items():
+            documents_status_changed(user_id, user_documents)
+        self.queue.delete(unreadable + [
+            notification['receipt']
+            for job_id in finished
+            for notification in by_job[job_id]
+        ])
+
+        logger.info(f"Applied {len(results)} OCR completions and {len(failed)} failures, "
+                    f"{len(retry)} left for retry")
+        return len(notifications)
+
+    def run(self, poll_interval: float = 1.0) -> None:
+        """Consume completions forever"""
+        logger.info(f"OCR completion consumer started with {self.workers} workers")
+        try:
+            while True:
+                try:
+                    received = self.process_batch()
+                except Exception as e:
+                    logger.error(f"Error applying OCR completions: {e}")
+                    db.session.rollback()
+                    received = 0
+                if not received:
+                    time.sleep(poll_interval)
+        finally:
+            self.close()
+
+    def _run_jobs(self, job_ids: List[str], documents: Dict[str, List],
+                  by_job: Dict[str, List[Dict]]) -> Tuple[Dict[str, Dict], Set[str], Set[str]]:
+        """Process succeeded jobs in the pool; returns results, failed and retryable job ids"""
+        results: Dict[str, Dict] = {}
+        failed = set()
+        retry = set()
+        futures = {
+            self.pool.submit(
+                process_job, job_id,
+                sorted({OCRStore.key_for(row.s3_key) for row in documents[job_id]})
+            ): job_id
+            for job_id in job_ids
+        }
+
+        for future in as_completed(futures):
+            job_id = futures[future]
+            try:
+                results[job_id] = future.result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    # A worker died; every pending job fails the same way
+                    if self._pool is not None:
+                        # Reap the surviving workers and management thread before starting afresh
+                        self._pool.shutdown(wait=False, cancel_futures=True)
+                        self._pool = None
+                logger.error(f"Error processing OCR results of job {job_id}: {e}")
+                if self._attempts(by_job[job_id]) >= self.max_attempts:
+                    failed.add(job_id)
+                else:
+                    retry.add(job_id)
+
+        return results, failed, retry
+
+    def _apply(self, results: Dict[str, Dict], failed: Set[str],
+               documents: Dict[str, List]) -> Dict[int, List[Dict]]:
+        """Write a batch's outcomes in one transaction; returns changed documents per user"""
+        table = Document.__table__
+        pages = []
+        changed: Dict[int, List[Dict]] = defaultdict(list)
+        for job_id in list(results) + sorted(failed):
+            for row in documents[job_id]:
+                changed[row.user_id].append({
+                    'id': row.id,
+                    'status': row.status,
+                    'ocr_status': 'completed' if job_id in results else 'failed'
+                })
+                if job_id in results:
+                    pages.extend(
+                        {'document_id': row.id, 'page_number': page_number, 'text': text}
+                        for page_number, text in results[job_id]['pages']
+                    )
+
+        if not changed:
+            return changed
+
+        connection = db.session.connection()
+        processing = db.and_(table.c.ocr_job_id == db.bindparam('b_job_id'), table.c.ocr_status == 'processing')
+        try:
+            # Each statement runs once with every job's parameters
+            if results:
+                connection.execute(
+                    table.update().where(processing).values(
+                        ocr_status='completed',
+                        # Its pages are written below, in the same transaction
+                        search_status='indexed',
+                        ocr_confidence=db.bindparam('b_ocr_confidence'),
+                        form_schema=db.bindparam('b_form_schema', type_=table.c.form_schema.type)
+                    ),
+                    [
+                        {
+                            'b_job_id': job_id,
+                            'b_ocr_confidence': result['confidence'],
+                            'b_form_schema': result['form_schema']
+                        }
+                        for job_id, result in results.items()
+                    ]
+                )
+            if failed:
+                connection.execute(
+                    table.update().where(processing).values(ocr_status='failed'),
+                    [{'b_job_id': job_id} for job_id in failed]
+                )
+
+            completed_ids = [row.id for job_id in results for row in documents[job_id]]
+            if completed_ids:
+                DocumentPage.query.filter(
+                    DocumentPage.document_id.in_(completed_ids)
+                ).delete(synchronize_session=False)
+            for start in range(0, len(pages), self.page_batch_size):
+                db.session.execute(db.insert(DocumentPage), pages[start:start + self.page_batch_size])
+
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return changed
+
+    @staticmethod
+    def _attempts(notifications: List[Dict]) -> int:
+        return max(notification['attempts'] for notification in notifications)
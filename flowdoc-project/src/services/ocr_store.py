@@ -0,0 +1,390 @@
+"""
+Flowdoc OCR Artifacts
+"""
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from array import array
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from flask import current_app
+from redis.exceptions import RedisError
+from src.services.aws import AWSService
+from src.services.textract import TextractBlock, group_by_page
+from src.models.models import Document
+
+logger = logging.getLogger(__name__)
+
+# Layout of an artifact (all integers little-endian):
+#
+#   page 1 | page 2 | ... | footer | trailer
+#
+# Each page is a zlib-compressed columnar record (see _encode_page). The
+# footer is a page offset table followed by JSON metadata, and the fixed
+# size trailer points at the footer, so a reader needs the tail of the
+# file plus one range per page it wants.
+MAGIC = b'FDOC'
+VERSION = 1
+TRAILER = struct.Struct('<QIH4s')  # footer offset, footer length, version, magic
+FOOTER_HEADER = struct.Struct('<II')  # page count, metadata length
+PAGE_ENTRY = struct.Struct('<IQII')  # page number, offset, length, block count
+PAGE_HEADER = struct.Struct('<IIIII')  # blocks, type table, types, ids, texts (lengths)
+
+# A single suffix request usually returns the trailer and the whole footer
+TAIL_SIZE = 64 * 1024
+
+SPOOL_SIZE = 8 * 1024 * 1024
+
+def _to_bytes(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def _from_bytes(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def _pack_strings(strings: List[Optional[str]]) -> Tuple[bytes, bytes]:
+    """UTF-8 blob plus n + 1 end offsets; None is stored as empty"""
+    offsets = array('I', [0])
+    blob = bytearray()
+    for value in strings:
+        if value:
+            blob += value.encode('utf-8')
+        offsets.append(len(blob))
+    return _to_bytes(offsets), bytes(blob)
+
+def _unpack_strings(offsets: array, blob: bytes) -> List[Optional[str]]:
+    return [
+        blob[offsets[i]:offsets[i + 1]].decode('utf-8') if offsets[i + 1] > offsets[i] else None
+        for i in range(len(offsets) - 1)
+    ]
+
+class OCRPage:
+    """One page of an artifact, held as columns rather than block objects"""
+
+    __slots__ = ('page_number', 'block_types', 'ids', 'texts', 'confidence',
+                 'left', 'top', 'width', 'height')
+
+    def __init__(self, page_number: int, block_types: List[str], ids: List[Optional[str]],
+                 texts: List[Optional[str]], confidence: array, left: array, top: array,
+                 width: array, height: array):
+        self.page_number = page_number
+        self.block_types = block_types
+        self.ids = ids
+        self.texts = texts
+        self.confidence = confidence
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+
+    def __len__(self):
+        return len(self.block_types)
+
+    def blocks(self) -> List[TextractBlock]:
+        """The page as TextractBlock records"""
+        return [
+            TextractBlock(self.ids[i], self.block_types[i], self.texts[i], self.confidence[i],
+                          self.page_number, self.left[i], self.top[i], self.width[i], self.height[i])
+            for i in range(len(self))
+        ]
+
+    def to_dict(self) -> Dict:
+        """JSON-friendly representation, shaped like TextractBlock.to_dict"""
+        # Columns are float32; rounding drops digits they never held
+        return {
+            'page': self.page_number,
+            'blocks': [
+                {
+                    'id': self.ids[i],
+                    'block_type': self.block_types[i],
+                    'text': self.texts[i],
+                    'confidence': round(self.confidence[i], 4),
+                    'page': self.page_number,
+                    'bbox': [round(self.left[i], 6), round(self.top[i], 6),
+                             round(self.width[i], 6), round(self.height[i], 6)]
+                }
+                for i in range(len(self))
+            ]
+        }
+
+def _encode_page(blocks: List[TextractBlock]) -> bytes:
+    type_table = sorted({block.block_type for block in blocks})
+    type_codes = {block_type: code for code, block_type in enumerate(type_table)}
+    id_offsets, id_blob = _pack_strings([block.id for block in blocks])
+    text_offsets, text_blob = _pack_strings([block.text for block in blocks])
+    type_table_bytes = '\n'.join(type_table).encode('utf-8')
+
+    payload = b''.join((
+        PAGE_HEADER.pack(len(blocks), len(type_table_bytes), len(type_table), len(id_blob), len(text_blob)),
+        type_table_bytes,
+        bytes(type_codes[block.block_type] for block in blocks),
+        _to_bytes(array('f', [block.confidence or 0.0 for block in blocks])),
+        _to_bytes(array('f', [block.left for block in blocks])),
+        _to_bytes(array('f', [block.top for block in blocks])),
+        _to_bytes(array('f', [block.width for block in blocks])),
+        _to_bytes(array('f', [block.height for block in blocks])),
+        id_offsets,
+        text_offsets,
+        id_blob,
+        text_blob
+    ))
+    return zlib.compress(payload, 6)
+
+def _decode_page(page_number: int, data: bytes) -> OCRPage:
+    payload = memoryview(zlib.decompress(data))
+    count, type_table_length, _, id_length, text_length = PAGE_HEADER.unpack_from(payload)
+    position = PAGE_HEADER.size
+
+    def take(length: int) -> bytes:
+        nonlocal position
+        chunk = payload[position:position + length].tobytes()
+        position += length
+        return chunk
+
+    type_table = take(type_table_length).decode('utf-8').split('\n')
+    block_types = [type_table[code] for code in take(count)]
+    columns = [_from_bytes('f', take(4 * count)) for _ in range(5)]
+    id_offsets = _from_bytes('I', take(4 * (count + 1)))
+    text_offsets = _from_bytes('I', take(4 * (count + 1)))
+    ids = _unpack_strings(id_offsets, take(id_length))
+    texts = _unpack_strings(text_offsets, take(text_length))
+    return OCRPage(page_number, block_types, ids, texts, *columns)
+
+class OCRArtifactWriter:
+    """Writes pages to a file object, then the footer on close"""
+
+    def __init__(self, file_obj: BinaryIO):
+        self.file_obj = file_obj
+        self.entries = []
+        self.offset = 0
+        self.blocks = 0
+
+    def add_page(self, page_number: int, blocks: List[TextractBlock]) -> None:
+        data = _encode_page(blocks)
+        self.file_obj.write(data)
+        self.entries.append((page_number, self.offset, len(data), len(blocks)))
+        self.offset += len(data)
+        self.blocks += len(blocks)
+
+    def close(self, metadata: Optional[Dict] = None) -> int:
+        """Write the footer and trailer; returns the artifact size"""
+        metadata_bytes = json.dumps(metadata or {}, separators=(',', ':')).encode('utf-8')
+        footer = b''.join(
+            [FOOTER_HEADER.pack(len(self.entries), len(metadata_bytes))]
+            + [PAGE_ENTRY.pack(*entry) for entry in self.entries]
+            + [metadata_bytes]
+        )
+        self.file_obj.write(footer)
+        self.file_obj.write(TRAILER.pack(self.offset, len(footer), VERSION, MAGIC))
+        return self.offset + len(footer) + TRAILER.size
+
+class OCRArtifact:
+    """Reads single pages of an artifact without loading the rest
+
+    ``read_range(start, length)`` returns bytes of the artifact and
+    ``size`` is its total length; the footer is read once on open.
+    """
+
+    def __init__(self, read_range: Callable[[int, int], bytes], size: int,
+                 tail: Optional[bytes] = None):
+        self.read_range = read_range
+        self.size = size
+
+        tail = tail if tail is not None else read_range(max(size - TAIL_SIZE, 0), min(size, TAIL_SIZE))
+        if len(tail) < TRAILER.size:
+            raise ValueError("Not an OCR artifact")
+        footer_offset, footer_length, version, magic = TRAILER.unpack(tail[-TRAILER.size:])
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not an OCR artifact")
+
+        tail_start = size - len(tail)
+        if footer_offset >= tail_start:
+            footer = tail[footer_offset - tail_start:footer_offset - tail_start + footer_length]
+        else:
+            footer = read_range(footer_offset, footer_length)
+
+        page_count, metadata_length = FOOTER_HEADER.unpack_from(footer)
+        self.pages = {}
+        for i in range(page_count):
+            page_number, offset, length, block_count = PAGE_ENTRY.unpack_from(
+                footer, FOOTER_HEADER.size + i * PAGE_ENTRY.size
+            )
+            self.pages[page_number] = (offset, length, block_count)
+        metadata_start = FOOTER_HEADER.size + page_count * PAGE_ENTRY.size
+        self.metadata = json.loads(footer[metadata_start:metadata_start + metadata_length])
+
+    @classmethod
+    def from_s3(cls, aws_service: AWSService, s3_key: str) -> Optional['OCRArtifact']:
+        """Open an artifact in S3 with range requests; None if it doesn't exist"""
+        tail = aws_service.get_object_range(s3_key, f"bytes=-{TAIL_SIZE}")
+        if tail is None:
+            return None
+
+        def read_range(start: int, length: int) -> bytes:
+            result = aws_service.get_object_range(s3_key, f"bytes={start}-{start + length - 1}")
+            if result is None:
+                raise ValueError(f"OCR artifact {s3_key} was removed")
+            return result['body']
+
+        return cls(read_range, tail['size'], tail['body'])
+
+    @classmethod
+    def from_path(cls, path: str) -> 'OCRArtifact':
+        """Open a local artifact through mmap"""
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(lambda start, length: mapped[start:start + length], len(mapped))
+
+    def read_page(self, page_number: int) -> OCRPage:
+        if page_number not in self.pages:
+            raise KeyError(page_number)
+        offset, length, _ = self.pages[page_number]
+        return _decode_page(page_number, self.read_range(offset, length))
+
+    def iter_pages(self) -> Iterator[OCRPage]:
+        for page_number in sorted(self.pages):
+            yield self.read_page(page_number)
+
+    def iter_blocks(self) -> Iterator[List[TextractBlock]]:
+        """Pages as block lists, in the shape iter_textract_results yields"""
+        for page in self.iter_pages():
+            yield page.blocks()
+
+    def summary(self) -> Dict:
+        return {
+            'pages': [
+                {'page': page_number, 'blocks': block_count}
+                for page_number, (_, _, block_count) in sorted(self.pages.items())
+            ],
+            'metadata': self.metadata
+        }
+
+def write_artifact(pages: Iterable[List[TextractBlock]], file_obj: BinaryIO,
+                   metadata: Optional[Dict] = None) -> Dict:
+    """Write streamed Textract results as an artifact"""
+    writer = OCRArtifactWriter(file_obj)
+    for page_number, blocks in group_by_page(pages):
+        writer.add_page(page_number, blocks)
+    size = writer.close(metadata)
+    return {'pages': len(writer.entries), 'blocks': writer.blocks, 'size': size}
+
+class OCRStore:
+    """Keeps one OCR artifact per document next to its source object
+
+    Textract results are fetched once, when the artifact is written; views,
+    exports and indexing then read pages from S3 instead of calling
+    get_document_text_detection again. Requests never write one: a
+    missing artifact is queued with ``request`` and written by the
+    search indexer.
+    """
+
+    KEY_PREFIX = 'flowdoc:ocr-artifacts'
+
+    def __init__(self, aws_service: Optional[AWSService] = None, redis_client=None):
+        self._aws_service = aws_service
+        self._redis = redis_client
+        self.request_ttl = int(os.getenv('FLOWDOC_OCR_ARTIFACT_REQUEST_TTL', 300))
+
+    @property
+    def aws_service(self) -> AWSService:
+        if self._aws_service is None:
+            self._aws_service = AWSService()
+        return self._aws_service
+
+    @property
+    def redis(self):
+        return self._redis if self._redis is not None else current_app.redis
+
+    def _key(self, *parts: str) -> str:
+        return ':'.join((self.KEY_PREFIX,) + parts)
+
+    @staticmethod
+    def key_for(s3_key: str) -> str:
+        # Documents sharing a blob share its OCR results too
+        return f"{s3_key}.ocr"
+
+    @classmethod
+    def key(cls, document: Document) -> str:
+        return cls.key_for(document.s3_key)
+
+    def write(self, document: Document) -> Dict:
+        """Build the artifact from the document's Textract job and store it"""
+        result = self.write_job(document.ocr_job_id, [self.key(document)])
+        logger.info(f"Stored OCR artifact for document {document.id}: {result['pages']} pages, "
+                    f"{result['size']} bytes")
+        result['s3_key'] = self.key(document)
+        return result
+
+    def write_job(self, job_id: str, s3_keys: List[str],
+                  on_page: Optional[Callable[[int, List[TextractBlock]], None]] = None) -> Dict:
+        """Build the artifact of a Textract job and store it under each key
+
+        ``on_page(page_number, blocks)`` sees every page as it is written,
+        so callers can derive more from the results in the same pass.
+        """
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+            writer = OCRArtifactWriter(spool)
+            for page_number, blocks in group_by_page(self.aws_service.iter_textract_results(job_id)):
+                writer.add_page(page_number, blocks)
+                if on_page is not None:
+                    on_page(page_number, blocks)
+            size = writer.close({'job_id': job_id})
+
+            for s3_key in s3_keys:
+                spool.seek(0)
+                self.aws_service.upload_file(spool, None, s3_key, s3_key=s3_key)
+
+        return {'pages': len(writer.entries), 'blocks': writer.blocks, 'size': size}
+
+    def open(self, document: Document, build: bool = True) -> Optional[OCRArtifact]:
+        """Open a document's artifact, writing it first if OCR finished without one"""
+        artifact = OCRArtifact.from_s3(self.aws_service, self.key(document))
+        if artifact is not None or not build:
+            return artifact
+        if document.ocr_status != 'completed' or not document.ocr_job_id:
+            return None
+
+        self.write(document)
+        return OCRArtifact.from_s3(self.aws_service, self.key(document))
+
+    def request(self, document: Document) -> None:
+        """Queue the artifact of a completed document that has none
+
+        Covers documents processed before artifacts existed and writes
+        that failed; at most once per ``request_ttl`` seconds per blob, so
+        clients polling for it don't queue the job again.
+        """
+        s3_key = self.key(document)
+        try:
+            if self.redis.set(self._key('requested', s3_key), 1, nx=True, ex=self.request_ttl):
+                self.redis.rpush(self._key('queue'), json.dumps({'job_id': document.ocr_job_id, 's3_key': s3_key}))
+        except RedisError as e:
+            logger.warning(f"Could not queue OCR artifact {s3_key}: {e}")
+
+    def write_requested(self, count: int = 10) -> int:
+        """Write up to ``count`` queued artifacts; returns how many were written"""
+        written = 0
+        for raw_request in self.redis.lpop(self._key('queue'), count) or []:
+            queued = json.loads(raw_request)
+            s3_key = queued['s3_key']
+            try:
+                # Another worker may have written it since it was queued
+                if self.aws_service.get_object_metadata(s3_key) is not None:
+                    continue
+                result = self.write_job(queued['job_id'], [s3_key])
+                logger.info(f"Stored requested OCR artifact {s3_key}: {result['pages']} pages")
+                written += 1
+            except Exception as e:
+                # It is queued again once the request expires and it is asked for
+                logger.error(f"Error writing OCR artifact {s3_key}: {e}")
+        return written
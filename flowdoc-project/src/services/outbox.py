@@ -0,0 +1,136 @@
+"""
+Flowdoc Workflow Outbox
+"""
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import logging
+import os
+import time
+from src.models.models import OutboxEvent, db
+
+logger = logging.getLogger(__name__)
+
+def record_event(event_type: str, aggregate_type: str, aggregate_id: int,
+                 payload: Dict) -> OutboxEvent:
+    """Add a workflow event to the current transaction
+
+    The event is only visible to the dispatcher once the caller commits,
+    so it is delivered if and only if the change it describes was saved.
+    """
+    event = OutboxEvent(
+        aggregate_type=aggregate_type,
+        aggregate_id=aggregate_id,
+        event_type=event_type,
+        payload=payload
+    )
+    db.session.add(event)
+    return event
+
+def record_events(event_type: str, aggregate_type: str,
+                  payloads: Dict[int, Dict]) -> None:
+    """Add one event per aggregate id to the current transaction in a single INSERT"""
+    if not payloads:
+        return
+    db.session.execute(db.insert(OutboxEvent), [
+        {
+            'aggregate_type': aggregate_type,
+            'aggregate_id': aggregate_id,
+            'event_type': event_type,
+            'payload': payload
+        }
+        for aggregate_id, payload in payloads.items()
+    ])
+
+class OutboxDispatcher:
+    """Delivers outbox events to the workflow engine in batches
+
+    Delivery is at-least-once: an event is marked dispatched only after
+    its WorkflowService call returns, so a crash in between resends it.
+    Events for the same aggregate and type within a batch are coalesced
+    into a single call carrying the newest payload.
+    """
+
+    def __init__(self, workflow_service=None):
+        self._workflow_service = workflow_service
+        self.batch_size = int(os.getenv('FLOWDOC_OUTBOX_BATCH_SIZE', 100))
+        self.max_backoff = int(os.getenv('FLOWDOC_OUTBOX_MAX_BACKOFF', 300))
+        self.retention = timedelta(days=int(os.getenv('FLOWDOC_OUTBOX_RETENTION_DAYS', 7)))
+
+    @property
+    def workflow_service(self):
+        if self._workflow_service is None:
+            from src.services.workflow import WorkflowService
+            self._workflow_service = WorkflowService()
+        return self._workflow_service
+
+    def dispatch_batch(self) -> int:
+        """Deliver one batch of due events; returns how many were handled"""
+        now = datetime.utcnow()
+        # SKIP LOCKED lets several dispatchers drain the table side by side
+        events = OutboxEvent.query.filter(
+            OutboxEvent.dispatched_at.is_(None),
+            OutboxEvent.available_at <= now
+        ).order_by(
+            OutboxEvent.id
+        ).limit(
+            self.batch_size
+        ).with_for_update(
+            skip_locked=True
+        ).all()
+
+        if not events:
+            db.session.commit()
+            return 0
+
+        groups: Dict[Tuple, List[OutboxEvent]] = OrderedDict()
+        for event in events:
+            key = (event.aggregate_type, event.aggregate_id, event.event_type)
+            groups.setdefault(key, []).append(event)
+
+        for group in groups.values():
+            latest = group[-1]
+            try:
+                handler = getattr(self.workflow_service, latest.event_type)
+                handler(**latest.payload)
+            except Exception as e:
+                logger.error(f"Error dispatching {latest.event_type} for "
+                             f"{latest.aggregate_type} {latest.aggregate_id}: {e}")
+                for event in group:
+                    event.attempts += 1
+                    event.available_at = now + self._backoff(event.attempts)
+                continue
+
+            for event in group:
+                event.dispatched_at = now
+
+        db.session.commit()
+        return len(events)
+
+    def purge(self) -> int:
+        """Delete delivered events older than the retention period"""
+        deleted = OutboxEvent.query.filter(
+            OutboxEvent.dispatched_at < datetime.utcnow() - self.retention
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    def run(self, poll_interval: float = 0.5, purge_interval: float = 3600) -> None:
+        """Drain the outbox forever"""
+        logger.info("Outbox dispatcher started")
+        last_purge: Optional[float] = None
+        while True:
+            try:
+                handled = self.dispatch_batch()
+                if last_purge is None or time.time() - last_purge > purge_interval:
+                    self.purge()
+                    last_purge = time.time()
+            except Exception as e:
+                logger.error(f"Error draining outbox: {e}")
+                db.session.rollback()
+                handled = 0
+            if handled < self.batch_size:
+                time.sleep(poll_interval)
+
+    def _backoff(self, attempts: int) -> timedelta:
+        return timedelta(seconds=min(self.max_backoff, 2 ** attempts))
@@ -0,0 +1,287 @@
+"""
+Flowdoc Page Previews
+"""
+from typing import Container, Dict, Iterator, List, Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+import base64
+import json
+import logging
+import multiprocessing
+import os
+import time
+from flask import current_app
+from redis.exceptions import RedisError
+from src.services.aws import AWSService
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'image/jpeg'
+
+class PreviewStore:
+    """Rendered previews in S3 with a Redis hot layer in front
+
+    A document's previews sit next to its blob, like its OCR artifact:
+    ``{s3_key}.previews/thumbnail.jpg`` for the first page at dashboard
+    size and ``{s3_key}.previews/page-{n}.jpg`` per page. Blobs are
+    content-addressed, so previews never change once written and every
+    document sharing a blob shares them.
+
+    Recently served images are kept in Redis with their S3 ETag, so a
+    conditional request is answered from one small Redis read.
+    """
+
+    KEY_PREFIX = 'flowdoc:previews'
+
+    def __init__(self, aws_service: Optional[AWSService] = None, redis_client=None):
+        self._aws_service = aws_service
+        self._redis = redis_client
+        self.cache_ttl = int(os.getenv('FLOWDOC_PREVIEW_CACHE_TTL', 3600))
+        self.cache_max_bytes = int(os.getenv('FLOWDOC_PREVIEW_CACHE_MAX_KB', 256)) * 1024
+        self.request_ttl = int(os.getenv('FLOWDOC_PREVIEW_REQUEST_TTL', 300))
+
+    @property
+    def aws_service(self) -> AWSService:
+        if self._aws_service is None:
+            self._aws_service = AWSService()
+        return self._aws_service
+
+    @property
+    def redis(self):
+        return self._redis if self._redis is not None else current_app.redis
+
+    @staticmethod
+    def key_for(s3_key: str, page_number: Optional[int] = None) -> str:
+        name = 'thumbnail' if page_number is None else f"page-{page_number}"
+        return f"{s3_key}.previews/{name}.jpg"
+
+    def _key(self, *parts: str) -> str:
+        return ':'.join((self.KEY_PREFIX,) + parts)
+
+    def enqueue(self, *s3_keys: str) -> None:
+        """Queue blobs for rendering by ``flask render-previews``"""
+        if s3_keys:
+            self.redis.rpush(self._key('queue'), *(json.dumps({'s3_key': s3_key}) for s3_key in s3_keys))
+
+    def pop(self, count: int) -> List[str]:
+        """Take up to ``count`` queued blobs, oldest first"""
+        jobs = self.redis.lpop(self._key('queue'), count) or []
+        return [json.loads(job)['s3_key'] for job in jobs]
+
+    def request(self, s3_key: str) -> None:
+        """Queue a blob whose previews were asked for but don't exist
+
+        Covers documents uploaded before previews, and renders that failed
+        or were lost; at most once per ``request_ttl`` seconds per blob.
+        """
+        try:
+            if self.redis.set(self._key('requested', s3_key), 1, nx=True, ex=self.request_ttl):
+                self.enqueue(s3_key)
+        except RedisError as e:
+            logger.warning(f"Could not queue previews of {s3_key}: {e}")
+
+    def get(self, s3_key: str, page_number: Optional[int] = None,
+            if_none_match: Container = ()) -> Optional[Dict]:
+        """A preview's ``etag`` and ``body``, or None if it isn't rendered
+
+        ``body`` is None when the ETag is in ``if_none_match``: the client
+        already has the image.
+        """
+        preview_key = self.key_for(s3_key, page_number)
+        cache_key = self._key('image', preview_key)
+        try:
+            etag = self.redis.hget(cache_key, 'etag')
+            if etag is not None:
+                if etag in if_none_match:
+                    return {'etag': etag, 'body': None}
+                # Bodies are base64, as the shared client decodes responses to str
+                body = self.redis.hget(cache_key, 'body')
+                if body is not None:
+                    return {'etag': etag, 'body': base64.b64decode(body)}
+        except RedisError as e:
+            logger.warning(f"Preview cache unavailable: {e}")
+
+        preview = self.aws_service.get_object(preview_key)
+        if preview is None:
+            return None
+        etag = preview['etag'].strip('"')
+        self.cache(preview_key, etag, preview['body'])
+        return {'etag': etag, 'body': None if etag in if_none_match else preview['body']}
+
+    def cache(self, preview_key: str, etag: str, body: bytes) -> None:
+        """Keep a small preview in Redis for ``cache_ttl`` seconds"""
+        if len(body) > self.cache_max_bytes:
+            return
+        cache_key = self._key('image', preview_key)
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hset(cache_key, mapping={'etag': etag, 'body': base64.b64encode(body).decode('ascii')})
+            pipe.expire(cache_key, self.cache_ttl)
+            pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Could not cache preview {preview_key}: {e}")
+
+def _pages(body: bytes, width: int, max_pages: int) -> Iterator:
+    """RGB Pillow images of the first ``max_pages`` pages, at most ``width`` wide"""
+    from PIL import Image, ImageOps
+
+    if body[:5] == b'%PDF-':
+        import fitz  # PyMuPDF
+
+        with fitz.open(stream=body, filetype='pdf') as pdf:
+            for page in pdf.pages(0, min(pdf.page_count, max_pages)):
+                # Rasterize straight at the target size rather than scaling down
+                zoom = width / page.rect.width
+                pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+                yield Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+        return
+
+    image = Image.open(BytesIO(body))
+    # JPEGs decode at a fraction of full size when that's all we need
+    image.draft('RGB', (width, width * 4))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        # Transparent areas would come out black in a JPEG
+        image = image.convert('RGBA')
+        image = Image.alpha_composite(Image.new('RGBA', image.size, 'white'), image)
+    image = image.convert('RGB')
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+    yield image
+
+def _encode(image, quality: int) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+# One AWS service per pool process, built on its first job
+_aws_service: Optional[AWSService] = None
+
+def render_document(s3_key: str, width: int, thumbnail_width: int, max_pages: int,
+                    quality: int) -> Dict:
+    """Render and store a blob's previews in a pool process
+
+    The thumbnail is written last, so its presence means the set is
+    complete and a blob whose thumbnail exists is skipped.
+    """
+    global _aws_service
+    if _aws_service is None:
+        _aws_service = AWSService()
+
+    thumbnail_key = PreviewStore.key_for(s3_key)
+    if _aws_service.get_object_metadata(thumbnail_key) is not None:
+        return {'s3_key': s3_key, 'pages': 0, 'skipped': True}
+
+    source = _aws_service.get_object(s3_key)
+    if source is None:
+        raise ValueError("document not found")
+
+    thumbnail = None
+    pages = 0
+    for page_number, image in enumerate(_pages(source['body'], width, max_pages), 1):
+        if thumbnail is None:
+            # Scaled down from the page preview, not rendered again
+            small = image.copy()
+            small.thumbnail((thumbnail_width, thumbnail_width * 4))
+            thumbnail = _encode(small, quality)
+        _aws_service.put_object(PreviewStore.key_for(s3_key, page_number), _encode(image, quality), CONTENT_TYPE)
+        pages = page_number
+    if thumbnail is None:
+        raise ValueError("document has no pages")
+
+    etag = _aws_service.put_object(thumbnail_key, thumbnail, CONTENT_TYPE).strip('"')
+    return {'s3_key': s3_key, 'pages': pages, 'skipped': False,
+            'thumbnail': {'etag': etag, 'body': thumbnail}}
+
+class PreviewRenderer:
+    """Renders queued previews in a process pool (``flask render-previews``)
+
+    Uploads only queue the blob; rasterizing and encoding run in pool
+    processes, a blob per process at a time, so the API never pays for
+    them and throughput grows with the number of cores. Each new
+    thumbnail is put in the Redis hot layer as soon as it is stored, as
+    the dashboard will ask for it next.
+
+    Jobs are popped before they run, so a crashed worker loses its batch;
+    the preview endpoint queues missing previews again when asked.
+    """
+
+    def __init__(self, store: Optional[PreviewStore] = None, workers: Optional[int] = None):
+        self.store = store or PreviewStore()
+        self.workers = workers or int(os.getenv('FLOWDOC_PREVIEW_WORKERS', 0)) or os.cpu_count() or 1
+        self.batch_size = int(os.getenv('FLOWDOC_PREVIEW_BATCH_SIZE', 20))
+        self.width = int(os.getenv('FLOWDOC_PREVIEW_WIDTH', 1024))
+        self.thumbnail_width = int(os.getenv('FLOWDOC_PREVIEW_THUMBNAIL_WIDTH', 240))
+        self.max_pages = int(os.getenv('FLOWDOC_PREVIEW_MAX_PAGES', 50))
+        self.quality = int(os.getenv('FLOWDOC_PREVIEW_QUALITY', 80))
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # spawn: forking would copy this process's Redis connections
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._pool
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def process_batch(self) -> int:
+        """Render one batch of queued blobs; returns how many jobs were popped"""
+        popped = self.store.pop(self.batch_size)
+        if not popped:
+            return 0
+        # A blob uploaded twice in a batch is rendered once
+        s3_keys = list(dict.fromkeys(popped))
+
+        rendered = skipped = failed = 0
+        futures = {
+            self.pool.submit(render_document, s3_key, self.width, self.thumbnail_width,
+                             self.max_pages, self.quality): s3_key
+            for s3_key in s3_keys
+        }
+        for future in as_completed(futures):
+            s3_key = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    # A worker died (e.g. a malformed file); every pending job fails the same way
+                    if self._pool is not None:
+                        # Stop its remaining workers; the next batch gets a new pool
+                        self._pool.shutdown(wait=False, cancel_futures=True)
+                        self._pool = None
+                logger.error(f"Error rendering previews of {s3_key}: {e}")
+                failed += 1
+                continue
+
+            if result['skipped']:
+                skipped += 1
+                continue
+            rendered += 1
+            thumbnail = result['thumbnail']
+            self.store.cache(PreviewStore.key_for(s3_key), thumbnail['etag'], thumbnail['body'])
+
+        logger.info(f"Rendered previews of {rendered} documents ({skipped} already rendered, {failed} failed)")
+        return len(popped)
+
+    def run(self, poll_interval: float = 1.0) -> None:
+        """Render previews forever"""
+        logger.info(f"Preview renderer started with {self.workers} workers")
+        try:
+            while True:
+                try:
+                    popped = self.process_batch()
+                except Exception as e:
+                    logger.error(f"Error rendering previews: {e}")
+                    popped = 0
+                if not popped:
+                    time.sleep(poll_interval)
+        finally:
+            self.close()
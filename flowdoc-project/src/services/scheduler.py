@@ -0,0 +1,325 @@
+"""
+Flowdoc OCR Job Scheduler
+"""
+from typing import Dict, Iterable, List, Mapping, Optional
+import json
+import logging
+import os
+import random
+import socket
+import time
+from botocore.exceptions import ClientError
+from flask import current_app
+from src.services.aws import AWSService
+from src.services.events import document_status_changed
+from src.models.models import Document, db
+
+logger = logging.getLogger(__name__)
+
+# Highest priority first
+LANES = ('interactive', 'bulk')
+
+THROTTLING_ERRORS = {
+    'ThrottlingException',
+    'ProvisionedThroughputExceededException',
+    'LimitExceededException',
+    'TooManyRequestsException'
+}
+
+# Drops timed-out jobs, then takes a slot if one is free
+ACQUIRE_SLOT_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', tonumber(ARGV[1]) - tonumber(ARGV[2]))
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[4])
+    return 1
+end
+return 0
+"""
+
+class OCRScheduler:
+    """Queues Textract jobs in Redis and submits them within AWS limits
+
+    Requests only enqueue; a scheduler process (``flask ocr-scheduler``)
+    submits jobs while keeping under the concurrent-job and submission
+    rate limits, and retries throttled submissions with jittered backoff.
+
+    A job is moved, not popped, from its lane to the scheduler's own
+    processing list and only removed from there once it is submitted,
+    failed or put back, so a scheduler that dies mid-job loses nothing:
+    its list is requeued when it restarts, or by another scheduler once
+    its heartbeat expires.
+    """
+
+    KEY_PREFIX = 'flowdoc:ocr'
+
+    def __init__(self, redis_client=None, aws_service: Optional[AWSService] = None):
+        self._redis = redis_client
+        self._aws_service = aws_service
+        self.max_in_flight = int(os.getenv('FLOWDOC_OCR_MAX_IN_FLIGHT', 50))
+        self.submit_rate = int(os.getenv('FLOWDOC_OCR_SUBMIT_RATE', 5))
+        self.max_attempts = int(os.getenv('FLOWDOC_OCR_MAX_ATTEMPTS', 8))
+        self.backoff_base = float(os.getenv('FLOWDOC_OCR_BACKOFF_BASE', 1.0))
+        self.backoff_cap = float(os.getenv('FLOWDOC_OCR_BACKOFF_CAP', 60.0))
+        self.job_timeout = int(os.getenv('FLOWDOC_OCR_JOB_TIMEOUT', 3600))
+        self.heartbeat_ttl = int(os.getenv('FLOWDOC_OCR_SCHEDULER_HEARTBEAT_TTL', 30))
+        # Stable across restarts where the platform allows (e.g. a StatefulSet pod name)
+        self.scheduler_id = os.getenv('FLOWDOC_OCR_SCHEDULER_ID') or f"{socket.gethostname()}:{os.getpid()}"
+        self._acquire_slot = None
+
+    @property
+    def redis(self):
+        return self._redis if self._redis is not None else current_app.redis
+
+    @property
+    def aws_service(self) -> AWSService:
+        # Only the scheduler process submits jobs; enqueueing needs no AWS client
+        if self._aws_service is None:
+            self._aws_service = AWSService()
+        return self._aws_service
+
+    def _key(self, *parts: str) -> str:
+        return ':'.join((self.KEY_PREFIX,) + parts)
+
+    def enqueue(self, document_id: int, s3_key: str, priority: str = 'interactive') -> Dict:
+        """Queue one document for OCR"""
+        return self.enqueue_many([(document_id, s3_key)], priority)
+
+    def enqueue_many(self, documents: Iterable, priority: str = 'bulk',
+                     shared_with: Optional[Mapping[int, List[int]]] = None) -> Dict:
+        """Queue (document_id, s3_key) pairs for OCR in one round-trip
+
+        ``shared_with`` maps a document id to other documents of the same
+        blob; they get the same Textract job instead of one each.
+        """
+        shared_with = shared_with or {}
+        if priority not in LANES:
+            raise ValueError(f"Unknown priority: {priority}")
+
+        enqueued_at = time.time()
+        jobs = [
+            json.dumps({
+                'document_id': document_id,
+                's3_key': s3_key,
+                'priority': priority,
+                'attempts': 0,
+                'enqueued_at': enqueued_at,
+                'shared_with': shared_with.get(document_id, [])
+            })
+            for document_id, s3_key in documents
+        ]
+        if jobs:
+            self.redis.rpush(self._key('queue', priority), *jobs)
+
+        return {
+            'status': 'QUEUED',
+            'priority': priority,
+            'count': len(jobs)
+        }
+
+    def queue_lengths(self) -> Dict[str, int]:
+        """Number of waiting jobs per lane, plus retries and running jobs"""
+        pipe = self.redis.pipeline()
+        for lane in LANES:
+            pipe.llen(self._key('queue', lane))
+        pipe.zcard(self._key('delayed'))
+        pipe.zcard(self._key('in_flight'))
+        counts = pipe.execute()
+
+        lengths = dict(zip(LANES, counts))
+        lengths['delayed'] = counts[len(LANES)]
+        lengths['in_flight'] = counts[len(LANES) + 1]
+        return lengths
+
+    def release(self, *job_ids: str) -> None:
+        """Free the slots of finished Textract jobs"""
+        if job_ids:
+            self.redis.zrem(self._key('in_flight'), *job_ids)
+
+    def dispatch(self) -> int:
+        """Submit queued jobs until a limit is hit or the queues are empty"""
+        self._promote_due_retries()
+
+        submitted = 0
+        while self._take_rate_token():
+            raw_job = self._pop_next()
+            if raw_job is None:
+                break
+
+            job = json.loads(raw_job)
+            placeholder = f"document:{job['document_id']}"
+            if not self._take_slot(placeholder):
+                # Textract is at its concurrent-job limit; try again later
+                self._requeue(raw_job)
+                break
+
+            try:
+                result = self.aws_service.start_textract_job(job['s3_key'], job['document_id'])
+            except ClientError as e:
+                self.release(placeholder)
+                if e.response['Error']['Code'] in THROTTLING_ERRORS:
+                    self._retry_later(job)
+                    self._ack(raw_job)
+                    break
+                self._mark_failed(job)
+                self._ack(raw_job)
+                continue
+            except Exception:
+                self.release(placeholder)
+                self._mark_failed(job)
+                self._ack(raw_job)
+                continue
+
+            pipe = self.redis.pipeline()
+            pipe.zrem(self._key('in_flight'), placeholder)
+            pipe.zadd(self._key('in_flight'), {result['job_id']: time.time()})
+            pipe.execute()
+
+            self._mark_submitted(job, result['job_id'])
+            self._ack(raw_job)
+            submitted += 1
+
+        return submitted
+
+    def run(self, poll_interval: float = 1.0) -> None:
+        """Dispatch forever"""
+        logger.info(f"OCR scheduler {self.scheduler_id} started")
+        # Whatever this scheduler held when it last stopped was never finished
+        self.recover(self.scheduler_id)
+        next_recovery = 0.0
+        while True:
+            if time.monotonic() >= next_recovery:
+                try:
+                    self.heartbeat()
+                    self.recover()
+                except Exception as e:
+                    logger.error(f"Error recovering OCR jobs: {e}")
+                next_recovery = time.monotonic() + self.heartbeat_ttl / 3
+            try:
+                submitted = self.dispatch()
+            except Exception as e:
+                logger.error(f"Error dispatching OCR jobs: {e}")
+                db.session.rollback()
+                # Retry what was taken; a job submitted but not acknowledged is submitted again
+                self.recover(self.scheduler_id)
+                submitted = 0
+            if not submitted:
+                time.sleep(poll_interval)
+
+    def heartbeat(self) -> None:
+        """Mark this scheduler alive, so others leave its processing list alone"""
+        pipe = self.redis.pipeline()
+        pipe.sadd(self._key('schedulers'), self.scheduler_id)
+        pipe.set(self._key('scheduler', self.scheduler_id), 1, ex=self.heartbeat_ttl)
+        pipe.execute()
+
+    def recover(self, *scheduler_ids: str) -> int:
+        """Requeue the jobs held by the given schedulers, or by every dead one
+
+        Jobs go back to the front of their lanes. Each is first moved to
+        this scheduler's own list, so two schedulers recovering the same
+        list can't both requeue a job.
+        """
+        if not scheduler_ids:
+            known = self.redis.smembers(self._key('schedulers'))
+            scheduler_ids = tuple(
+                scheduler_id for scheduler_id in known
+                if scheduler_id != self.scheduler_id
+                and not self.redis.exists(self._key('scheduler', scheduler_id))
+            )
+
+        requeued = 0
+        processing = self._key('processing', self.scheduler_id)
+        for scheduler_id in scheduler_ids:
+            if scheduler_id != self.scheduler_id:
+                source = self._key('processing', scheduler_id)
+                while self.redis.lmove(source, processing, 'LEFT', 'RIGHT') is not None:
+                    pass
+                self.redis.srem(self._key('schedulers'), scheduler_id)
+            # Newest first, so the oldest job ends up at the front of its lane
+            for raw_job in reversed(self.redis.lrange(processing, 0, -1)):
+                self._requeue(raw_job)
+                requeued += 1
+        if requeued:
+            logger.warning(f"Requeued {requeued} OCR jobs left unfinished by {', '.join(scheduler_ids)}")
+        return requeued
+
+    def _pop_next(self) -> Optional[str]:
+        """Move the next job into this scheduler's processing list"""
+        processing = self._key('processing', self.scheduler_id)
+        for lane in LANES:
+            raw_job = self.redis.lmove(self._key('queue', lane), processing, 'LEFT', 'RIGHT')
+            if raw_job is not None:
+                return raw_job
+        return None
+
+    def _ack(self, raw_job: str) -> None:
+        """The job has been dealt with; drop it from the processing list"""
+        self.redis.lrem(self._key('processing', self.scheduler_id), 1, raw_job)
+
+    def _requeue(self, raw_job: str) -> None:
+        """Put a taken job back at the front of its lane"""
+        pipe = self.redis.pipeline()
+        pipe.lpush(self._key('queue', json.loads(raw_job)['priority']), raw_job)
+        pipe.lrem(self._key('processing', self.scheduler_id), 1, raw_job)
+        pipe.execute()
+
+    def _take_rate_token(self) -> bool:
+        """Fixed one-second window shared by all scheduler processes"""
+        key = self._key('rate', str(int(time.time())))
+        pipe = self.redis.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, 2)
+        count, _ = pipe.execute()
+        return count <= self.submit_rate
+
+    def _take_slot(self, member: str) -> bool:
+        if self._acquire_slot is None:
+            self._acquire_slot = self.redis.register_script(ACQUIRE_SLOT_SCRIPT)
+        return bool(self._acquire_slot(
+            keys=[self._key('in_flight')],
+            args=[time.time(), self.job_timeout, self.max_in_flight, member]
+        ))
+
+    def _retry_later(self, job: Dict) -> None:
+        job['attempts'] += 1
+        if job['attempts'] >= self.max_attempts:
+            logger.error(f"Giving up on OCR for document {job['document_id']} after "
+                         f"{job['attempts']} throttled attempts")
+            self._mark_failed(job)
+            return
+
+        # Full jitter keeps schedulers from retrying in lockstep
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** job['attempts']))
+        self.redis.zadd(self._key('delayed'), {json.dumps(job): time.time() + delay})
+
+    def _promote_due_retries(self) -> None:
+        delayed_key = self._key('delayed')
+        for raw_job in self.redis.zrangebyscore(delayed_key, '-inf', time.time()):
+            # Only the scheduler that removes the entry requeues it
+            if self.redis.zrem(delayed_key, raw_job):
+                job = json.loads(raw_job)
+                self.redis.lpush(self._key('queue', job['priority']), raw_job)
+
+    @staticmethod
+    def _documents(job: Dict) -> List[Document]:
+        # Jobs queued before shared_with existed name one document
+        document_ids = [job['document_id'], *job.get('shared_with', ())]
+        return Document.query.filter(Document.id.in_(document_ids)).all()
+
+    def _mark_submitted(self, job: Dict, job_id: str) -> None:
+        documents = self._documents(job)
+        for document in documents:
+            document.ocr_job_id = job_id
+            document.ocr_status = 'processing'
+        db.session.commit()
+        for document in documents:
+            document_status_changed(document)
+
+    def _mark_failed(self, job: Dict) -> None:
+        logger.error(f"OCR submission failed for document {job['document_id']}")
+        documents = self._documents(job)
+        for document in documents:
+            document.ocr_status = 'failed'
+        db.session.commit()
+        for document in documents:
+            document_status_changed(document)
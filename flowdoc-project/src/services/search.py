@@ -0,0 +1,225 @@
+"""
+Flowdoc Document Search
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import logging
+import os
+import re
+import time
+import unicodedata
+from src.services.aws import AWSService
+from src.services.ocr_store import OCRStore
+from src.services.textract import TextractBlock, group_by_page
+from src.models.models import Document, DocumentPage, db
+
+logger = logging.getLogger(__name__)
+
+# Must match the configuration of the document_pages.search_vector column
+TEXT_SEARCH_CONFIG = 'english'
+
+WHITESPACE = re.compile(r'\s+')
+
+def normalize_text(text: str) -> str:
+    """Fold OCR text into one canonical form before indexing"""
+    # NFKC turns ligatures and full-width characters into their plain forms
+    text = unicodedata.normalize('NFKC', text).replace('\u00ad', '')
+    return WHITESPACE.sub(' ', ''.join(ch for ch in text if ch.isprintable() or ch.isspace())).strip()
+
+def page_text(blocks: List[TextractBlock]) -> str:
+    """Normalized text of one page's blocks
+
+    LINE blocks carry the reading order; WORD blocks are only used for
+    pages that have no lines.
+    """
+    lines = [block.text for block in blocks if block.block_type == 'LINE' and block.text]
+    if not lines:
+        lines = [block.text for block in blocks if block.block_type == 'WORD' and block.text]
+    return normalize_text('\n'.join(lines))
+
+def page_texts(pages: Iterable[List[TextractBlock]]) -> Iterator[Tuple[int, str]]:
+    """Turn streamed Textract blocks into (page_number, text) pairs"""
+    for page_number, blocks in group_by_page(pages):
+        text = page_text(blocks)
+        if text:
+            yield page_number, text
+
+class SearchIndexer:
+    """Stores OCR text per page and answers ranked full-text queries
+
+    Page text goes into document_pages, where Postgres maintains a
+    tsvector column with a GIN index; queries rank matching pages with
+    ts_rank_cd and return each document once, at its best page.
+    """
+
+    def __init__(self, aws_service: Optional[AWSService] = None,
+                 ocr_store: Optional[OCRStore] = None):
+        self._aws_service = aws_service
+        self._ocr_store = ocr_store
+        self.batch_size = int(os.getenv('FLOWDOC_SEARCH_BATCH_SIZE', 500))
+
+    @property
+    def aws_service(self) -> AWSService:
+        if self._aws_service is None:
+            self._aws_service = AWSService()
+        return self._aws_service
+
+    @property
+    def ocr_store(self) -> OCRStore:
+        if self._ocr_store is None:
+            self._ocr_store = OCRStore(self.aws_service)
+        return self._ocr_store
+
+    def index_document(self, document: Document) -> int:
+        """(Re)build a document's page index from its OCR results"""
+        try:
+            DocumentPage.query.filter_by(document_id=document.id).delete(synchronize_session=False)
+
+            # Documents sharing a job (identical content) share its text
+            if self._copy_pages(document):
+                count = DocumentPage.query.filter_by(document_id=document.id).count()
+            else:
+                artifact = self.ocr_store.open(document)
+                blocks = (artifact.iter_blocks() if artifact is not None
+                          else self.aws_service.iter_textract_results(document.ocr_job_id))
+                count = self.index_pages(document.id, page_texts(blocks))
+            document.search_status = 'indexed'
+            db.session.commit()
+            return count
+
+        except Exception as e:
+            logger.error(f"Error indexing document {document.id}: {e}")
+            db.session.rollback()
+            raise
+
+    def index_pages(self, document_id: int, pages: Iterable[Tuple[int, str]]) -> int:
+        """Insert (page_number, text) pairs in batches; the caller commits"""
+        count = 0
+        batch = []
+        for page_number, text in pages:
+            batch.append({'document_id': document_id, 'page_number': page_number, 'text': text})
+            if len(batch) >= self.batch_size:
+                db.session.execute(db.insert(DocumentPage), batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            db.session.execute(db.insert(DocumentPage), batch)
+            count += len(batch)
+        return count
+
+    def index_pending(self, limit: int = 100) -> int:
+        """Index completed documents the indexer hasn't handled yet
+
+        Each document is tried once: it ends up 'indexed', even if it has
+        no text, or 'failed'. Clear search_status to have it tried again.
+        """
+        documents = Document.query.filter(
+            Document.ocr_status == 'completed',
+            Document.search_status.is_(None),
+            Document.ocr_job_id.isnot(None)
+        ).order_by(Document.id).limit(limit).all()
+
+        indexed = 0
+        for document in documents:
+            try:
+                self.index_document(document)
+                indexed += 1
+            except Exception:
+                # index_document logged the error and rolled back
+                Document.query.filter_by(id=document.id).update(
+                    {'search_status': 'failed'}, synchronize_session=False
+                )
+                db.session.commit()
+                logger.warning(f"Gave up indexing document {document.id} for search")
+        return indexed
+
+    def run(self, poll_interval: float = 5.0) -> None:
+        """Index newly completed documents, and write requested OCR artifacts, forever"""
+        logger.info("Search indexer started")
+        while True:
+            try:
+                indexed = self.index_pending()
+            except Exception as e:
+                logger.error(f"Error indexing documents: {e}")
+                db.session.rollback()
+                indexed = 0
+            try:
+                # Artifacts that API requests found missing; see OCRStore.request
+                indexed += self.ocr_store.write_requested()
+            except Exception as e:
+                logger.error(f"Error writing requested OCR artifacts: {e}")
+            if not indexed:
+                time.sleep(poll_interval)
+
+    def search(self, user_id: int, query: str, limit: int = 20, offset: int = 0) -> Dict:
+        """Rank a user's documents against a web-style query
+
+        Every match has to be scored to rank it, so pages are addressed by
+        offset rather than a cursor.
+        """
+        tsquery = db.func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, query)
+        rank = db.func.ts_rank_cd(DocumentPage.search_vector, tsquery)
+
+        # Best-ranked page per document
+        best = db.session.query(
+            DocumentPage.document_id,
+            DocumentPage.page_number,
+            DocumentPage.text,
+            rank.label('rank')
+        ).join(
+            Document, Document.id == DocumentPage.document_id
+        ).filter(
+            Document.user_id == user_id,
+            DocumentPage.search_vector.op('@@')(tsquery)
+        ).distinct(
+            DocumentPage.document_id
+        ).order_by(
+            DocumentPage.document_id,
+            rank.desc()
+        ).subquery()
+
+        rows = db.session.query(
+            Document,
+            best.c.page_number,
+            best.c.rank,
+            # Only computed for the rows on this page
+            db.func.ts_headline(
+                TEXT_SEARCH_CONFIG, best.c.text, tsquery,
+                'MaxFragments=2, MinWords=5, MaxWords=20'
+            ).label('snippet')
+        ).join(
+            best, best.c.document_id == Document.id
+        ).order_by(
+            best.c.rank.desc(),
+            Document.id.desc()
+        ).offset(offset).limit(limit + 1).all()
+
+        return {
+            'results': [
+                {'document': document, 'page': page_number, 'rank': rank, 'snippet': snippet}
+                for document, page_number, rank, snippet in rows[:limit]
+            ],
+            'next_offset': offset + limit if len(rows) > limit else None
+        }
+
+    def _copy_pages(self, document: Document) -> bool:
+        """Copy the pages of another document indexed from the same job"""
+        source_id = db.session.query(DocumentPage.document_id).join(
+            Document, Document.id == DocumentPage.document_id
+        ).filter(
+            Document.ocr_job_id == document.ocr_job_id,
+            Document.id != document.id
+        ).limit(1).scalar()
+        if source_id is None:
+            return False
+
+        db.session.execute(
+            db.insert(DocumentPage).from_select(
+                ['document_id', 'page_number', 'text'],
+                db.select(
+                    db.literal(document.id),
+                    DocumentPage.page_number,
+                    DocumentPage.text
+                ).where(DocumentPage.document_id == source_id)
+            )
+        )
+        return True
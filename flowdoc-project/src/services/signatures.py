@@ -0,0 +1,136 @@
+"""
+Flowdoc Signature Storage
+"""
+from typing import Dict, Optional, Tuple
+import base64
+import binascii
+import hashlib
+import logging
+import time
+from src.services.aws import AWSService
+from src.models.models import DocumentSubmission, db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTENT_TYPE = 'image/png'
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def decode_signature(signature_data: str) -> Tuple[bytes, str]:
+    """Decode a ``data:image/...;base64,`` URL or bare base64 to bytes and a content type"""
+    content_type = DEFAULT_CONTENT_TYPE
+    if signature_data.startswith('data:'):
+        header, _, signature_data = signature_data.partition(',')
+        if not header.endswith(';base64'):
+            raise ValueError("Signature must be base64 encoded")
+        content_type = header[len('data:'):-len(';base64')] or DEFAULT_CONTENT_TYPE
+
+    if not content_type.startswith('image/'):
+        raise ValueError("Signature must be an image")
+    try:
+        return base64.b64decode(signature_data, validate=True), content_type
+    except (binascii.Error, ValueError):
+        raise ValueError("Signature is not valid base64")
+
+class SignatureStore:
+    """Keeps signature images in the signature bucket, keyed by their SHA-256
+
+    Submission rows hold only the key and hash. A user's signature is
+    usually the same image on every submission, so it is stored once.
+    """
+
+    def __init__(self, aws_service: Optional[AWSService] = None):
+        self.aws_service = aws_service or AWSService()
+
+    @staticmethod
+    def signature_key(signature_hash: str) -> str:
+        """S3 key of the signature with the given hash"""
+        return f"signatures/sha256/{signature_hash[:2]}/{signature_hash}"
+
+    def put(self, signature_data: str) -> Dict:
+        """Upload a base64 signature; returns the columns to store on the submission"""
+        body, content_type = decode_signature(signature_data)
+        signature_hash = hashlib.sha256(body).hexdigest()
+        s3_key = self.signature_key(signature_hash)
+        # Same key, same bytes: re-uploading an existing signature is harmless
+        self.aws_service.put_signature(s3_key, body, content_type)
+        return {'signature_key': s3_key, 'signature_hash': signature_hash}
+
+    def url(self, submission: DocumentSubmission) -> Optional[str]:
+        """Presigned download URL for a submission's signature"""
+        if not submission.signature_key:
+            return None
+        return self.aws_service.create_presigned_signature_url(submission.signature_key)
+
+    def open(self, submission: DocumentSubmission) -> Optional[Dict]:
+        """Open a submission's signature for streaming
+
+        Returns the content type, size and an iterator of chunks, or None
+        if the submission has no signature. Rows the backfill hasn't
+        reached yet are decoded from the inline column.
+        """
+        if submission.signature_key:
+            signature = self.aws_service.get_signature(submission.signature_key)
+            if signature is None:
+                return None
+            return {
+                'chunks': signature['body'].iter_chunks(STREAM_CHUNK_SIZE),
+                'size': signature['size'],
+                'content_type': signature['content_type'] or DEFAULT_CONTENT_TYPE
+            }
+
+        if submission.signature_data:
+            body, content_type = decode_signature(submission.signature_data)
+            return {'chunks': iter((body,)), 'size': len(body), 'content_type': content_type}
+        return None
+
+    def backfill(self, batch_size: int = 500) -> Dict:
+        """Move inline signatures to the bucket, one batch per transaction
+
+        Walks submissions by id, so each batch is an index range scan and
+        an interrupted run simply resumes where the column is still set.
+        Rows that fail to upload keep their inline data and are reported.
+        """
+        started = time.perf_counter()
+        moved = failed = 0
+        last_id = 0
+        while True:
+            rows = db.session.query(
+                DocumentSubmission.id,
+                DocumentSubmission.signature_data
+            ).filter(
+                DocumentSubmission.id > last_id,
+                DocumentSubmission.signature_key.is_(None),
+                DocumentSubmission.signature_data.isnot(None)
+            ).order_by(DocumentSubmission.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            results = self.aws_service.run_transfers(
+                lambda row: self.put(row.signature_data), rows
+            )
+            updates = []
+            for row, (result, error) in zip(rows, results):
+                if error is not None:
+                    logger.error(f"Error moving signature of submission {row.id}: {error}")
+                    failed += 1
+                    continue
+                updates.append(dict(result, id=row.id, signature_data=None))
+
+            try:
+                if updates:
+                    # Bulk UPDATE by primary key: one statement per batch
+                    db.session.execute(db.update(DocumentSubmission), updates)
+                db.session.commit()
+            except Exception as e:
+                logger.error(f"Error recording moved signatures: {e}")
+                db.session.rollback()
+                raise
+            moved += len(updates)
+            logger.info(f"Moved {moved} signatures to S3 ({failed} failed)")
+
+        return {
+            'moved': moved,
+            'failed': failed,
+            'elapsed_seconds': round(time.perf_counter() - started, 3)
+        }
@@ -0,0 +1,135 @@
+"""
+Flowdoc Content-Addressed Storage
+"""
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+import hashlib
+import logging
+import uuid
+from src.services.aws import AWSService
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+class HashingReader:
+    """File-like wrapper that hashes bytes as they are read"""
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.stream.read(size)
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+        return chunk
+
+    @property
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
+
+class ContentStore:
+    """Stores each unique file once in S3, keyed by its SHA-256"""
+
+    def __init__(self, aws_service: AWSService):
+        self.aws_service = aws_service
+
+    @staticmethod
+    def blob_key(content_hash: str) -> str:
+        """S3 key of the blob with the given hash"""
+        return f"blobs/sha256/{content_hash[:2]}/{content_hash}"
+
+    def put_file(self, file_obj: BinaryIO, filename: str) -> Dict:
+        """Store a file, hashing it while it uploads
+
+        Read once, like put_stream: the file is staged and then promoted
+        (or dropped, if the blob already exists) rather than hashed in a
+        first pass and read again for the upload.
+        """
+        reader = HashingReader(file_obj)
+        staging_key = self._staging_key()
+        self.aws_service.upload_file(reader, None, filename, s3_key=staging_key)
+
+        s3_key, deduplicated = self._promote(staging_key, reader.hexdigest)
+        return self._result(s3_key, reader, deduplicated)
+
+    def put_files(self, entries: List[Tuple[str, Callable[[], BinaryIO]]]
+                  ) -> List[Tuple[Optional[Dict], Optional[Exception]]]:
+        """Store many files concurrently
+
+        Each entry is a (filename, open_file) pair; files are opened on the
+        worker that uploads them, so only the files in flight are open.
+        """
+        def put(entry: Tuple[str, Callable[[], BinaryIO]]) -> Dict:
+            filename, open_file = entry
+            file_obj = open_file()
+            try:
+                return self.put_file(file_obj, filename)
+            finally:
+                file_obj.close()
+
+        return self.aws_service.run_transfers(put, entries)
+
+    def put_stream(self, stream: BinaryIO, filename: str,
+                   content_type: Optional[str] = None) -> Dict:
+        """Store a non-seekable stream, hashing it while it uploads
+
+        The hash is only known once the body has been read, so the stream
+        goes to a staging key first and is then promoted with a server-side
+        copy (or dropped, if the blob already exists).
+        """
+        reader = HashingReader(stream)
+        staging_key = self._staging_key()
+        upload = self.aws_service.upload_stream(
+            reader, None, filename, content_type, s3_key=staging_key
+        )
+
+        s3_key, deduplicated = self._promote(staging_key, reader.hexdigest)
+        result = self._result(s3_key, reader, deduplicated)
+        result['content_type'] = upload['content_type']
+        return result
+
+    def hash_object(self, s3_key: str) -> Optional[Dict]:
+        """SHA-256 and size of an object uploaded outside the store, e.g. presigned
+
+        Streamed from S3 in chunks; None if the object doesn't exist.
+        """
+        body = self.aws_service.open_object(s3_key)
+        if body is None:
+            return None
+        reader = HashingReader(body)
+        try:
+            while reader.read(HASH_CHUNK_SIZE):
+                pass
+        finally:
+            body.close()
+        return {'content_hash': reader.hexdigest, 'size': reader.size}
+
+    @staticmethod
+    def _staging_key() -> str:
+        return f"uploads/staging/{uuid.uuid4().hex}"
+
+    def _promote(self, staging_key: str, content_hash: str) -> Tuple[str, bool]:
+        """Move a staged upload to its blob key; returns the key and whether it already existed"""
+        s3_key = self.blob_key(content_hash)
+        try:
+            deduplicated = self.aws_service.get_object_metadata(s3_key) is not None
+            if not deduplicated:
+                self.aws_service.copy_object(staging_key, s3_key)
+        finally:
+            try:
+                self.aws_service.delete_object(staging_key)
+            except Exception:
+                logger.warning(f"Could not delete staging object {staging_key}")
+        return s3_key, deduplicated
+
+    def _result(self, s3_key: str, reader: HashingReader, deduplicated: bool) -> Dict:
+        """Describe a stored blob"""
+        return {
+            's3_key': s3_key,
+            'bucket': self.aws_service.bucket_name,
+            'content_hash': reader.hexdigest,
+            'size': reader.size,
+            'deduplicated': deduplicated
+        }
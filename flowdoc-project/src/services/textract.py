@@ -0,0 +1,88 @@
+"""
+Flowdoc Textract Result Types
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import sys
+
+class TextractJobError(Exception):
+    """Raised when a Textract job has not produced results"""
+
+    def __init__(self, job_id: str, job_status: str, message: Optional[str] = None):
+        super().__init__(message or f"Textract job {job_id} is {job_status}")
+        self.job_id = job_id
+        self.job_status = job_status
+
+class TextractBlock:
+    """Compact form of a Textract block
+
+    Keeps only the fields Flowdoc uses. Boto returns each block as nested
+    dicts with polygons and relationships, which costs several KB per
+    block; this record is a fraction of that.
+    """
+
+    __slots__ = ('id', 'block_type', 'text', 'confidence', 'page',
+                 'left', 'top', 'width', 'height')
+
+    def __init__(self, id: str, block_type: str, text: Optional[str], confidence: float,
+                 page: int, left: float, top: float, width: float, height: float):
+        self.id = id
+        self.block_type = block_type
+        self.text = text
+        self.confidence = confidence
+        self.page = page
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+
+    @classmethod
+    def from_dict(cls, block: Dict) -> 'TextractBlock':
+        """Build a block from a raw Textract response block"""
+        box = block.get('Geometry', {}).get('BoundingBox', {})
+        return cls(
+            block['Id'],
+            # Block types repeat on every block; share one string object
+            sys.intern(block['BlockType']),
+            block.get('Text'),
+            block.get('Confidence', 0.0),
+            block.get('Page', 1),
+            box.get('Left', 0.0),
+            box.get('Top', 0.0),
+            box.get('Width', 0.0),
+            box.get('Height', 0.0)
+        )
+
+    def to_dict(self) -> Dict:
+        """JSON-friendly representation"""
+        return {
+            'id': self.id,
+            'block_type': self.block_type,
+            'text': self.text,
+            'confidence': self.confidence,
+            'page': self.page,
+            'bbox': [self.left, self.top, self.width, self.height]
+        }
+
+    def __repr__(self):
+        return f'<TextractBlock {self.block_type} p{self.page} {self.text!r}>'
+
+def group_by_page(pages: Iterable[List[TextractBlock]]) -> Iterator[Tuple[int, List[TextractBlock]]]:
+    """Regroup streamed response pages into (page_number, blocks) per document page
+
+    Textract returns blocks in page order but its response pages don't
+    line up with document pages, so a page is yielded once blocks for a
+    later page arrive.
+    """
+    buffered: Dict[int, List[TextractBlock]] = {}
+    current = None
+    for blocks in pages:
+        for block in blocks:
+            page = block.page or 1
+            if current is not None and page > current:
+                for done in sorted(p for p in buffered if p < page):
+                    yield done, buffered.pop(done)
+            current = page if current is None else max(current, page)
+            buffered.setdefault(page, []).append(block)
+
+    for done in sorted(buffered):
+        yield done, buffered.pop(done)
@@ -0,0 +1,48 @@
+"""
+Flowdoc Archive Helpers
+"""
+from typing import BinaryIO, Callable, List, Set, Tuple
+import mimetypes
+import posixpath
+import zipfile
+
+def zip_entries(file_obj: BinaryIO, allowed_extensions: Set[str], max_files: int,
+                max_size: int) -> Tuple[List[Tuple[str, str, Callable[[], BinaryIO]]], List[Tuple[str, str]]]:
+    """Split a ZIP archive into uploadable entries and rejected ones
+
+    Returns ``(entries, rejected)``: entries are (filename, content_type,
+    open_file) triples whose files are only decompressed when opened;
+    rejected are (filename, reason) pairs. Raises ValueError for anything
+    that isn't a readable archive or that holds more than ``max_files``
+    entries.
+    """
+    try:
+        archive = zipfile.ZipFile(file_obj)
+    except zipfile.BadZipFile as e:
+        raise ValueError("Invalid ZIP archive") from e
+
+    infos = [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and not info.filename.startswith('__MACOSX/')
+        and not posixpath.basename(info.filename).startswith('.')
+    ]
+    if len(infos) > max_files:
+        raise ValueError(f"Archive holds more than {max_files} files")
+
+    entries, rejected = [], []
+    for info in infos:
+        filename = posixpath.basename(info.filename)
+        extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+        if extension not in allowed_extensions:
+            rejected.append((filename, 'File type not allowed'))
+        elif info.file_size > max_size:
+            # Checked against the declared size, before anything is decompressed
+            rejected.append((filename, 'File is too large'))
+        else:
+            entries.append((
+                filename,
+                mimetypes.guess_type(filename)[0],
+                lambda info=info: archive.open(info)
+            ))
+    return entries, rejected
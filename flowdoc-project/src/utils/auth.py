@@ -0,0 +1,34 @@
+"""
+Flowdoc Authorization Helpers
+"""
+from functools import wraps
+from flask import current_app, jsonify
+from flask_jwt_extended import current_user, jwt_required
+from src.services.identity import identity_cache
+
+def init_auth(jwt) -> None:
+    """Resolve every verified token to a cached Principal
+
+    flask-jwt-extended calls the loader on each ``@jwt_required`` request;
+    tokens of deleted or deactivated users are rejected with a 401, and
+    ``current_user`` is the Principal, without a query to the users table.
+    """
+
+    @jwt.user_lookup_loader
+    def load_principal(jwt_header, jwt_data):
+        principal = identity_cache.get(jwt_data[current_app.config['JWT_IDENTITY_CLAIM']])
+        return principal if principal is not None and principal.active else None
+
+    @jwt.user_lookup_error_loader
+    def principal_not_found(jwt_header, jwt_data):
+        return jsonify({'error': 'User not found or inactive'}), 401
+
+def admin_required(fn):
+    """``@jwt_required()`` that also requires the admin role"""
+    @wraps(fn)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        if not current_user.is_admin:
+            return jsonify({'error': 'Admin access required'}), 403
+        return fn(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,22 @@
+"""
+Flowdoc Pagination Helpers
+"""
+from typing import Tuple
+from datetime import datetime
+import base64
+import binascii
+import json
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """Opaque cursor pointing just past a (created_at, id) row"""
+    raw = json.dumps([created_at.isoformat(), id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for anything malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(id)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
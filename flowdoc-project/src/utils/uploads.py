@@ -0,0 +1,36 @@
+"""
+Flowdoc Upload Helpers
+"""
+from typing import BinaryIO, Callable
+import os
+from flask import Request, current_app
+
+class FlowdocRequest(Request):
+    """Request whose body limit a view can raise with ``@max_content_length``
+
+    Flask applies MAX_CONTENT_LENGTH to every request; a batch upload
+    needs far more than a single document, without raising the limit for
+    every other endpoint.
+    """
+
+    @property
+    def max_content_length(self):
+        view = current_app.view_functions.get(self.endpoint) if self.url_rule else None
+        config_key = getattr(view, 'max_content_length_config', None)
+        if config_key is not None:
+            return current_app.config[config_key]
+        return super().max_content_length
+
+def max_content_length(config_key: str) -> Callable:
+    """Limit a view's request body to the ``config_key`` setting instead of MAX_CONTENT_LENGTH"""
+    def decorator(fn):
+        fn.max_content_length_config = config_key
+        return fn
+    return decorator
+
+def stream_size(stream: BinaryIO) -> int:
+    """Size of an uploaded file, leaving the stream at its start"""
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
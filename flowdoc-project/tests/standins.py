@@ -0,0 +1,277 @@
+"""
+Flowdoc Local Stand-ins
+
+Local HTTP servers that take the place of AWS and n8n so the app can run
+end to end on one machine: moto for S3 and SQS, a fake Textract with
+configurable latency and page counts that posts completion notifications
+to the SQS queue, and a webhook sink for n8n. The
+app talks to them through the standard AWS_ENDPOINT_URL_<SERVICE>
+variables, so no application code knows it isn't talking to AWS.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class StandinServer(ABC):
+    """Threaded HTTP server on a free local port"""
+
+    def __init__(self):
+        self.port = free_port()
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    @abstractmethod
+    def handle(self, method, path, headers, body):
+        """Return (status, headers, body) for one request"""
+
+    def start(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                with standin._lock:
+                    standin.requests += 1
+                status, headers, payload = standin.handle(self.command, self.path, self.headers, body)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = _respond
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+class FakeTextract(StandinServer):
+    """Textract (JSON protocol) and Lambda invoke stand-in
+
+    Jobs succeed ``job_seconds`` after they are started and report
+    ``pages`` pages of ``lines_per_page`` LINE blocks each. Every call
+    waits ``call_latency`` seconds first, like a real API round trip.
+    When a job succeeds ``notify(job_id, status)`` is called, as SNS
+    would be.
+    """
+
+    def __init__(self, job_seconds=5.0, pages=3, lines_per_page=40, call_latency=0.05,
+                 max_results=1000):
+        super().__init__()
+        self.job_seconds = job_seconds
+        self.pages = pages
+        self.lines_per_page = lines_per_page
+        self.call_latency = call_latency
+        self.max_results = max_results
+        self.jobs = {}
+        self.invocations = 0
+        self.notify = None
+
+    def handle(self, method, path, headers, body):
+        time.sleep(self.call_latency)
+
+        if path.startswith('/2015-03-31/functions/'):
+            # Lambda Invoke with InvocationType=Event
+            with self._lock:
+                self.invocations += 1
+            return 202, {}, b''
+
+        operation = headers.get('X-Amz-Target', '').rsplit('.', 1)[-1]
+        params = json.loads(body or b'{}')
+        if operation == 'StartDocumentTextDetection':
+            job_id = uuid.uuid4().hex
+            with self._lock:
+                self.jobs[job_id] = time.time()
+            if self.notify is not None:
+                timer = threading.Timer(self.job_seconds, self.notify, (job_id, 'SUCCEEDED'))
+                timer.daemon = True
+                timer.start()
+            return self._json({'JobId': job_id})
+        if operation == 'GetDocumentTextDetection':
+            return self._get_results(params)
+        return self._json({'__type': 'UnknownOperationException', 'message': operation}, 400)
+
+    def _get_results(self, params):
+        started = self.jobs.get(params.get('JobId'))
+        if started is None:
+            return self._json({'__type': 'InvalidJobIdException', 'message': 'Unknown job'}, 400)
+        if time.time() - started < self.job_seconds:
+            return self._json({'JobStatus': 'IN_PROGRESS'})
+
+        blocks_per_page = self.lines_per_page + 1
+        total = self.pages * blocks_per_page
+        start = int(params.get('NextToken') or 0)
+        stop = min(start + int(params.get('MaxResults') or self.max_results), total)
+        response = {
+            'JobStatus': 'SUCCEEDED',
+            'DocumentMetadata': {'Pages': self.pages},
+            'Blocks': [self._block(index, blocks_per_page) for index in range(start, stop)]
+        }
+        if stop < total:
+            response['NextToken'] = str(stop)
+        return self._json(response)
+
+    @staticmethod
+    def _block(index, blocks_per_page):
+        page, line = divmod(index, blocks_per_page)
+        block = {
+            'Id': f'block-{index}',
+            'BlockType': 'PAGE' if line == 0 else 'LINE',
+            'Page': page + 1,
+            'Confidence': 99.0,
+            'Geometry': {'BoundingBox': {
+                'Left': 0.1, 'Top': line / blocks_per_page, 'Width': 0.8, 'Height': 0.02
+            }}
+        }
+        if line:
+            block['Text'] = f'Page {page + 1} line {line} lorem ipsum dolor sit amet'
+        return block
+
+    @staticmethod
+    def _json(payload, status=200):
+        return status, {'Content-Type': 'application/x-amz-json-1.1'}, json.dumps(payload).encode()
+
+class WebhookSink(StandinServer):
+    """n8n webhook stand-in: accepts every POST after ``latency`` seconds"""
+
+    def __init__(self, latency=0.02, status=200):
+        super().__init__()
+        self.latency = latency
+        self.status = status
+        self.received = []
+
+    def handle(self, method, path, headers, body):
+        time.sleep(self.latency)
+        with self._lock:
+            self.received.append((path, body))
+        return self.status, {'Content-Type': 'application/json'}, b'{"ok":true}'
+
+class Standins:
+    """Starts every stand-in and describes how to point the app at them
+
+    S3 and SQS are a moto server; S3 can instead be one already running
+    at ``s3_endpoint`` (e.g. MinIO). Postgres and Redis are real local
+    services; their URLs are passed through.
+    """
+
+    def __init__(self, s3_endpoint=None, textract=None, webhook=None,
+                 buckets=('flowdoc-documents', 'flowdoc-signatures'),
+                 completion_queue='flowdoc-textract-completions'):
+        self.s3_endpoint = s3_endpoint
+        self.textract = textract or FakeTextract()
+        self.webhook = webhook or WebhookSink()
+        self.buckets = buckets
+        self.completion_queue = completion_queue
+        self.completion_queue_url = None
+        self.moto_endpoint = None
+        self._moto = None
+
+    def start(self):
+        import boto3
+        from moto.server import ThreadedMotoServer
+
+        port = free_port()
+        self._moto = ThreadedMotoServer(ip_address='127.0.0.1', port=port, verbose=False)
+        self._moto.start()
+        self.moto_endpoint = f"http://127.0.0.1:{port}"
+        self.s3_endpoint = self.s3_endpoint or self.moto_endpoint
+        credentials = {'region_name': 'us-east-1', 'aws_access_key_id': 'testing',
+                       'aws_secret_access_key': 'testing'}
+
+        s3 = boto3.client('s3', endpoint_url=self.s3_endpoint, **credentials)
+        for bucket in self.buckets:
+            try:
+                s3.create_bucket(Bucket=bucket)
+            except s3.exceptions.BucketAlreadyOwnedByYou:
+                pass
+
+        sqs = boto3.client('sqs', endpoint_url=self.moto_endpoint, **credentials)
+        self.completion_queue_url = sqs.create_queue(
+            QueueName=self.completion_queue,
+            Attributes={'VisibilityTimeout': '30'}
+        )['QueueUrl']
+
+        def notify(job_id, status):
+            # Shaped like Textract's SNS message as delivered to SQS
+            sqs.send_message(QueueUrl=self.completion_queue_url, MessageBody=json.dumps({
+                'Type': 'Notification',
+                'Message': json.dumps({
+                    'JobId': job_id,
+                    'Status': status,
+                    'API': 'StartDocumentTextDetection',
+                    'Timestamp': int(time.time() * 1000)
+                })
+            }))
+
+        self.textract.notify = notify
+        self.textract.start()
+        self.webhook.start()
+        return self
+
+    def stop(self):
+        self.textract.notify = None
+        self.textract.stop()
+        self.webhook.stop()
+        if self._moto:
+            self._moto.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def environ(self):
+        """Environment variables that route the app to the stand-ins"""
+        return {
+            'AWS_ACCESS_KEY_ID': 'testing',
+            'AWS_SECRET_ACCESS_KEY': 'testing',
+            'AWS_DEFAULT_REGION': 'us-east-1',
+            'FLOWDOC_AWS_REGION': 'us-east-1',
+            'AWS_ENDPOINT_URL_S3': self.s3_endpoint,
+            'AWS_ENDPOINT_URL_TEXTRACT': self.textract.url,
+            'AWS_ENDPOINT_URL_LAMBDA': self.textract.url,
+            'AWS_ENDPOINT_URL_SQS': self.moto_endpoint,
+            'FLOWDOC_OCR_COMPLETION_QUEUE_URL': self.completion_queue_url,
+            # Short long-polls keep workers quick to stop
+            'FLOWDOC_OCR_COMPLETION_WAIT_SECONDS': '1',
+            'SNS_TOPIC_ARN': 'arn:aws:sns:us-east-1:000000000000:flowdoc-textract',
+            'TEXTRACT_ROLE_ARN': 'arn:aws:iam::000000000000:role/flowdoc-textract',
+            'S3_BUCKET': self.buckets[0],
+            'SIGNATURE_BUCKET': self.buckets[1],
+            'FLOWDOC_S3_BUCKET': self.buckets[0],
+            'FLOWDOC_SIGNATURE_BUCKET': self.buckets[1],
+            'FLOWDOC_N8N_WEBHOOK_URL': f"{self.webhook.url}/webhook/flowdoc"
+        }
+
+    def apply(self):
+        """Set environ() on this process"""
+        os.environ.update(self.environ())
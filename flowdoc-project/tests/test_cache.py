@@ -0,0 +1,54 @@
+"""
+Flowdoc Document Cache
+"""
+from src.models.models import Document
+from src.services.cache import document_cache
+from src.services.events import document_status_changed, documents_status_changed
+
+OWNER_ID = 1
+
+def cached(redis_app, document_id, document):
+    """Fill the cache through a lookup and return the loader's call count"""
+    calls = []
+
+    def loader():
+        calls.append(document_id)
+        return document
+
+    document_cache.get(document_id, OWNER_ID, loader)
+    document_cache.get(document_id, OWNER_ID, loader)
+    return len(calls)
+
+def test_lookups_hit_after_first_load(redis_app):
+    assert cached(redis_app, 1, {'id': 1, 'status': 'uploaded'}) == 1
+    assert redis_app.redis.exists(document_cache.key(1))
+
+def test_other_users_get_nothing(redis_app):
+    cached(redis_app, 1, {'id': 1, 'status': 'uploaded'})
+
+    assert document_cache.get(1, OWNER_ID + 1, lambda: {'id': 1}) is None
+
+def test_missing_documents_are_not_cached(redis_app):
+    assert document_cache.get(1, OWNER_ID, lambda: None) is None
+    assert not redis_app.redis.exists(document_cache.key(1))
+
+def test_status_change_invalidates(redis_app):
+    cached(redis_app, 1, {'id': 1, 'status': 'uploaded'})
+
+    document_status_changed(Document(id=1, user_id=OWNER_ID, status='processing', ocr_status='pending'))
+
+    assert not redis_app.redis.exists(document_cache.key(1))
+    assert cached(redis_app, 1, {'id': 1, 'status': 'processing'}) == 1
+
+def test_batched_status_change_invalidates(redis_app):
+    for document_id in (1, 2, 3):
+        cached(redis_app, document_id, {'id': document_id, 'status': 'uploaded'})
+
+    documents_status_changed(OWNER_ID, [
+        {'id': document_id, 'status': 'uploaded', 'ocr_status': 'completed'}
+        for document_id in (1, 2)
+    ])
+
+    assert not redis_app.redis.exists(document_cache.key(1))
+    assert not redis_app.redis.exists(document_cache.key(2))
+    assert redis_app.redis.exists(document_cache.key(3))
@@ -0,0 +1,37 @@
+"""
+Flowdoc Status Counters
+"""
+import pytest
+from src import db
+from src.models.models import Document, StatusCounter, User
+from src.services.counters import ALL_USERS, CounterReconciler, user_counts
+
+OWNER_ID = 1
+
+@pytest.fixture
+def reconciler(db_app):
+    if db.engine.dialect.name != 'postgresql':
+        pytest.skip("The reconciler relies on Postgres advisory locks")
+    db.session.add(User(id=OWNER_ID, email='owner@example.com', password_hash='x', name='Owner'))
+    db.session.add_all([
+        Document(title='Form', filename='form.pdf', s3_key='blobs/form.pdf', status=status, user_id=OWNER_ID)
+        for status in ('uploaded', 'uploaded', 'processed')
+    ])
+    db.session.commit()
+    return CounterReconciler()
+
+def test_writes_keep_counters_current(reconciler):
+    assert user_counts(OWNER_ID)['documents'] == {'uploaded': 2, 'processed': 1}
+    assert reconciler.reconcile() == {}
+
+def test_reconcile_corrects_drift(reconciler):
+    # A change made behind the ORM's back, as from psql
+    db.session.execute(db.update(Document).values(status='archived'))
+    db.session.execute(db.delete(StatusCounter).where(StatusCounter.user_id == ALL_USERS))
+    db.session.commit()
+
+    assert reconciler.reconcile() == {'documents': 4}
+
+    assert user_counts(OWNER_ID)['documents'] == {'archived': 3}
+    assert user_counts(ALL_USERS)['documents'] == {'archived': 3}
+    assert reconciler.reconcile() == {}
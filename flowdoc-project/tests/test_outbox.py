@@ -0,0 +1,70 @@
+"""
+Flowdoc Workflow Outbox
+"""
+from datetime import datetime, timedelta
+import pytest
+from src import db
+from src.models.models import OutboxEvent
+from src.services.outbox import OutboxDispatcher, record_event
+
+class WorkflowService:
+    """Records workflow calls; raises while ``failing`` is set"""
+
+    def __init__(self):
+        self.calls = []
+        self.failing = False
+
+    def document_updated(self, **payload):
+        if self.failing:
+            raise RuntimeError("workflow engine unavailable")
+        self.calls.append(payload)
+
+@pytest.fixture
+def workflow_service():
+    return WorkflowService()
+
+@pytest.fixture
+def dispatcher(db_app, workflow_service):
+    return OutboxDispatcher(workflow_service=workflow_service)
+
+def test_events_for_one_aggregate_are_coalesced(dispatcher, workflow_service):
+    for version in (1, 2, 3):
+        record_event('document_updated', 'document', 1, {'document_id': 1, 'version': version})
+    record_event('document_updated', 'document', 2, {'document_id': 2, 'version': 1})
+    db.session.commit()
+
+    assert dispatcher.dispatch_batch() == 4
+
+    assert workflow_service.calls == [
+        {'document_id': 1, 'version': 3},
+        {'document_id': 2, 'version': 1}
+    ]
+    assert OutboxEvent.query.filter(OutboxEvent.dispatched_at.is_(None)).count() == 0
+    assert dispatcher.dispatch_batch() == 0
+
+def test_failed_events_back_off(dispatcher, workflow_service):
+    record_event('document_updated', 'document', 1, {'document_id': 1, 'version': 1})
+    db.session.commit()
+    workflow_service.failing = True
+
+    assert dispatcher.dispatch_batch() == 1
+
+    event = OutboxEvent.query.one()
+    assert event.attempts == 1
+    assert event.dispatched_at is None
+    assert event.available_at > datetime.utcnow()
+
+    # Not retried before it is due
+    workflow_service.failing = False
+    assert dispatcher.dispatch_batch() == 0
+    assert workflow_service.calls == []
+
+    event.available_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert dispatcher.dispatch_batch() == 1
+    assert workflow_service.calls == [{'document_id': 1, 'version': 1}]
+    assert OutboxEvent.query.one().dispatched_at is not None
+
+def test_backoff_is_capped(dispatcher):
+    assert dispatcher._backoff(1) == timedelta(seconds=2)
+    assert dispatcher._backoff(20) == timedelta(seconds=dispatcher.max_backoff)
@@ -0,0 +1,34 @@
+"""
+Flowdoc Keyset Cursors
+"""
+from datetime import datetime
+import importlib.util
+from pathlib import Path
+import pytest
+from src.utils.pagination import decode_cursor, encode_cursor
+
+BACKEND_PAGINATION = Path(__file__).resolve().parents[1] / 'backend' / 'app' / 'utils' / 'pagination.py'
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 3, 1, 12, 30, 45, 123456)
+    cursor = encode_cursor(created_at, 42)
+
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (created_at, 42)
+
+@pytest.mark.parametrize('cursor', ['', 'not-a-cursor', encode_cursor(datetime(2024, 1, 1), 1)[:-3]])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_backend_cursors_match():
+    # The backend image ships its own copy; a cursor from either must work with the other
+    spec = importlib.util.spec_from_file_location('backend_pagination', BACKEND_PAGINATION)
+    backend = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(backend)
+
+    created_at = datetime(2024, 3, 1, 12, 30, 45)
+    cursor = encode_cursor(created_at, 7)
+
+    assert backend.encode_cursor(created_at, 7) == cursor
+    assert backend.decode_cursor(cursor) == (created_at, 7)
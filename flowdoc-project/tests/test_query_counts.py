@@ -0,0 +1,87 @@
+"""
+Flowdoc Listing Query Counts
+"""
+from datetime import datetime, timedelta
+import pytest
+from src import db
+from src.models.models import Document, DocumentAssignment, DocumentSubmission, User
+
+OWNER_ID = 1
+ASSIGNEE_ID = 2
+
+@pytest.fixture
+def users(app):
+    db.session.add_all([
+        User(id=OWNER_ID, email='owner@example.com', password_hash='x', name='Owner'),
+        User(id=ASSIGNEE_ID, email='assignee@example.com', password_hash='x', name='Assignee')
+    ])
+    db.session.commit()
+
+@pytest.fixture
+def seed(users):
+    """Add n of the owner's documents, each with an assignment and a submission"""
+    def add(n):
+        for _ in range(n):
+            document = Document(
+                title='Form',
+                filename='form.pdf',
+                s3_key='blobs/form.pdf',
+                status='uploaded',
+                user_id=OWNER_ID
+            )
+            db.session.add(document)
+            db.session.flush()
+            db.session.add_all([
+                DocumentAssignment(
+                    document_id=document.id,
+                    user_id=ASSIGNEE_ID,
+                    due_date=datetime.utcnow() + timedelta(days=7)
+                ),
+                DocumentSubmission(
+                    document_id=document.id,
+                    user_id=ASSIGNEE_ID,
+                    form_data={'name': 'Assignee'}
+                )
+            ])
+        db.session.commit()
+        # Each request should load what it shows, not find it in the session
+        db.session.expunge_all()
+
+    return add
+
+@pytest.fixture
+def get(client, auth_headers):
+    """GET as the owner, once up front so the principal is already cached"""
+    headers = auth_headers(OWNER_ID)
+    client.get('/api/v1/documents/documents/stats', headers=headers)
+
+    def request(path):
+        response = client.get(path, headers=headers, query_string={'limit': 100})
+        assert response.status_code == 200, response.get_json()
+        return response.get_json()
+
+    return request
+
+def test_document_listing_queries_are_constant(seed, get, assert_constant_queries):
+    assert_constant_queries(seed, lambda: get('/api/v1/documents/documents'))
+
+def test_dashboard_queries_are_constant(seed, get, assert_constant_queries):
+    def dashboard():
+        documents = get('/api/v1/documents/documents/dashboard')['documents']
+        assert all(document['submission_count'] == 1 for document in documents)
+        assert all(len(document['assignees']) == 1 for document in documents)
+
+    assert_constant_queries(seed, dashboard)
+
+def test_dashboard_with_one_document_or_many(seed, get, query_counter):
+    seed(1)
+    query_counter.reset()
+    get('/api/v1/documents/documents/dashboard')
+    one = query_counter.count
+
+    seed(24)
+    query_counter.reset()
+    documents = get('/api/v1/documents/documents/dashboard')['documents']
+
+    assert len(documents) == 25
+    assert query_counter.count == one
@@ -0,0 +1,136 @@
+"""
+Flowdoc OCR Job Scheduler
+"""
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import pytest
+from botocore.exceptions import ClientError
+from src.services.scheduler import OCRScheduler
+
+class Textract:
+    """Stands in for AWSService.start_textract_job, tracking concurrent submissions"""
+
+    def __init__(self, error_code=None, delay=0.0):
+        self.error_code = error_code
+        self.delay = delay
+        self.submitted = []
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def start_textract_job(self, s3_key, document_id):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            time.sleep(self.delay)
+            if self.error_code:
+                raise ClientError({'Error': {'Code': self.error_code, 'Message': ''}}, 'StartDocumentAnalysis')
+            with self._lock:
+                self.submitted.append(document_id)
+            return {'job_id': f"job-{document_id}"}
+        finally:
+            with self._lock:
+                self.running -= 1
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setenv('FLOWDOC_OCR_SUBMIT_RATE', '1000')
+    monkeypatch.setenv('FLOWDOC_OCR_MAX_IN_FLIGHT', '5')
+
+@pytest.fixture
+def scheduler(redis_client, monkeypatch):
+    """A scheduler with its document updates recorded rather than written"""
+    def make(textract, scheduler_id='scheduler-1'):
+        scheduler = OCRScheduler(redis_client=redis_client, aws_service=textract)
+        scheduler.scheduler_id = scheduler_id
+        scheduler.marked_failed = []
+        monkeypatch.setattr(scheduler, '_mark_submitted', lambda job, job_id: None)
+        monkeypatch.setattr(scheduler, '_mark_failed', scheduler.marked_failed.append)
+        return scheduler
+
+    return make
+
+def in_flight(redis_client):
+    return redis_client.zrange('flowdoc:ocr:in_flight', 0, -1)
+
+def test_interactive_jobs_go_first(scheduler):
+    textract = Textract()
+    ocr = scheduler(textract)
+    ocr.enqueue_many([(1, 'a'), (2, 'b')], 'bulk')
+    ocr.enqueue(3, 'c')
+    ocr.enqueue_many([(4, 'd')], 'bulk')
+    ocr.enqueue(5, 'e')
+
+    assert ocr.dispatch() == 5
+    assert textract.submitted == [3, 5, 1, 2, 4]
+
+def test_failed_submission_releases_its_slot(scheduler, redis_client):
+    ocr = scheduler(Textract(error_code='InvalidS3ObjectException'))
+    ocr.enqueue_many([(1, 'a'), (2, 'b')], 'bulk')
+
+    assert ocr.dispatch() == 0
+
+    assert [job['document_id'] for job in ocr.marked_failed] == [1, 2]
+    assert in_flight(redis_client) == []
+    assert redis_client.llen('flowdoc:ocr:processing:scheduler-1') == 0
+    assert ocr.queue_lengths() == {'interactive': 0, 'bulk': 0, 'delayed': 0, 'in_flight': 0}
+
+def test_throttled_submission_releases_its_slot_and_retries(scheduler, redis_client):
+    ocr = scheduler(Textract(error_code='ThrottlingException'))
+    ocr.enqueue(1, 'a')
+
+    assert ocr.dispatch() == 0
+
+    assert ocr.marked_failed == []
+    assert in_flight(redis_client) == []
+    assert redis_client.llen('flowdoc:ocr:processing:scheduler-1') == 0
+    assert ocr.queue_lengths()['delayed'] == 1
+
+def test_concurrency_cap_holds_across_schedulers(scheduler, redis_client):
+    textract = Textract(delay=0.01)
+    schedulers = [scheduler(textract, f"scheduler-{n}") for n in range(8)]
+    schedulers[0].enqueue_many([(document_id, 'a') for document_id in range(40)], 'bulk')
+
+    with ThreadPoolExecutor(max_workers=len(schedulers)) as executor:
+        submitted = sum(executor.map(lambda ocr: ocr.dispatch(), schedulers))
+
+    assert submitted == 5
+    assert textract.peak <= 5
+    assert sorted(in_flight(redis_client)) == sorted(f"job-{document_id}" for document_id in textract.submitted)
+    # Jobs that found no free slot went back to their lane
+    assert schedulers[0].queue_lengths()['bulk'] == 35
+    assert not any(redis_client.llen(f"flowdoc:ocr:processing:{ocr.scheduler_id}") for ocr in schedulers)
+
+    # A finished job frees a slot for the next one
+    schedulers[0].release(f"job-{textract.submitted[0]}")
+    assert schedulers[0].dispatch() == 1
+    assert len(in_flight(redis_client)) == 5
+
+def test_jobs_of_a_dead_scheduler_are_requeued(scheduler, redis_client):
+    textract = Textract()
+    dead = scheduler(textract, 'scheduler-dead')
+    dead.heartbeat()
+    dead.enqueue_many([(1, 'a'), (2, 'b')], 'bulk')
+    # Taken, then the process died before submitting
+    dead._pop_next()
+    dead._pop_next()
+    redis_client.delete('flowdoc:ocr:scheduler:scheduler-dead')
+
+    alive = scheduler(textract, 'scheduler-alive')
+    alive.heartbeat()
+    assert alive.recover() == 2
+
+    assert redis_client.llen('flowdoc:ocr:processing:scheduler-dead') == 0
+    assert alive.dispatch() == 2
+    assert textract.submitted == [1, 2]
+
+def test_live_schedulers_keep_their_jobs(scheduler, redis_client):
+    busy = scheduler(Textract(), 'scheduler-busy')
+    busy.heartbeat()
+    busy.enqueue(1, 'a')
+    busy._pop_next()
+
+    assert scheduler(Textract(), 'scheduler-other').recover() == 0
+    assert redis_client.llen('flowdoc:ocr:processing:scheduler-busy') == 1